@@ -5,17 +5,25 @@
 # standard libs
 from __future__ import annotations
 
-from typing import Any, Dict, Optional
+from time import time
+from typing import Any, Dict, List, Optional, Set
 
 # plugin libs
 import Domoticz
 import helpers
-from app.devices.devices import DzDevices
+from app.devices.devices import GROUP_DEVICE_ID, DzDevices
 from app.html.html import HtmlPage
+from app.mqtt.burst import RetainedBurst
 from app.mqtt.mqtt import Mqtt, MQTTResponse
+from app.mqtt.outbound import Priority
+from app.mqtt.router import TopicRouter
 from app.plan.plan import PlanAutomation
-from app.zwave.soundswitch import CCSSEndpoint, CCSSNodes
-from app.zwave.zwave import ZwaveGateway
+from app.zwave.correlator import CommandCorrelator, GatewayCall
+from app.zwave.discovery import ToneDiscovery
+from app.zwave.soundswitch import (ENDPOINT_PROPERTIES, CCSSEndpoint, CCSSNode,
+                                  CCSSNodes, NodeState)
+from app.zwave.tones_cache import ToneCatalogueCache
+from app.zwave.zwave import SendCommandResult, ZwaveGateway, ZwaveTopic
 from domoticz.parameters import PluginParameters
 from domoticz.responses import OnCommandResponse as OCDR
 from domoticz.responses import OnConnectResponse as OCTR
@@ -27,6 +35,11 @@ __version__ = "2.0.1"
 __version_info__ = (2, 0, 1)
 __author__ = "Laurent aka Myriades"
 
+HEARTBEAT = 1  # seconds; flushes the coalesced publishes
+IDENTIFICATION_TIMEOUT = 5  # seconds before discovering an unidentified node
+SUBSCRIPTIONS_SETTLE = 10  # seconds without new node before narrowing the subscriptions
+SOUNDSWITCH_WILDCARD = 'zwave/+/121/+/#'
+
 
 class App2:
     """The core V2"""
@@ -36,23 +49,56 @@ class App2:
         self._mqtt = Mqtt()
         self._zwave_gateway = ZwaveGateway()
         self._soundswitches = CCSSNodes()
+        self._commands = CommandCorrelator(self._send_gateway_call)
+        self._discovery = ToneDiscovery(
+            self._commands, self._on_discovery_result, self._on_discovery_failed
+        )
+        self._tones_cache = ToneCatalogueCache()
         self._dz_devices = DzDevices()
+        self._burst = RetainedBurst(self._apply_burst)
+        self._known_nodes: Set[int] = set()
+        self._narrowed = False
+        self._widened_at = 0.0
         self._plan = PlanAutomation()
         self._html = HtmlPage()
+        self._router = TopicRouter(ZwaveTopic.from_levels)
+        self._router.register(
+            'zwave/_CLIENTS/+/api/sendCommand', self._on_command_result
+        )
+        self._router.register(
+            'zwave/_CLIENTS/+/api/writeMulticast', self._on_multicast_result
+        )
+        self._router.register('zwave/_CLIENTS/+/status', self._on_gateway_infos)
+        self._router.register('zwave/_CLIENTS/+/version', self._on_gateway_infos)
+        self._router.register('zwave/+/status', self._on_node_status)
+        self._router.register('zwave/+/121/+/+', self._on_soundswitch_value)
+        self._router.register('zwave/+/114/0/+', self._on_node_metadata)
+        self._router.register(
+            'zwave/+/134/0/firmwareVersions', self._on_node_metadata
+        )
 
     def on_start(
             self: App2, parameters: Dict[str, Any],
             devices: Dict[int, Domoticz.Device]) -> None:
         """place this in `onStart`"""
         plugin_parameters = PluginParameters(**parameters)
+        Domoticz.Heartbeat(HEARTBEAT)
+        helpers.status(f'JSON codec: {helpers.codec.BACKEND}')
         self._mqtt.on_start(parameters)
-        self._dz_devices.on_start(devices)
-        self._plan.on_start(parameters)
+        self._discovery.on_start(parameters)
+        self._tones_cache.on_start(parameters)
+        self._dz_devices.on_start(parameters, devices)
+        self._router.prepare(self._known_topics())
+        self._plan.on_start(parameters, self._dz_devices.get_unit_ids_list())
         self._html.on_start(plugin_parameters)
 
     def on_stop(self: App2) -> None:
         """place this in `onStop`"""
+        self._burst.check(force=True)
         self._mqtt.on_stop()
+        helpers.status(self._burst)
+        helpers.status(f'Gateway commands: {self._commands}')
+        self._dz_devices.on_stop()
         self._html.on_stop()
 
     def on_connect(self: App2, octr: OCTR) -> None:
@@ -67,16 +113,45 @@ class App2:
 
     def on_command(self: App2, ocdr: OCDR) -> None:
         """place this in `onConnect`"""
+        device_id = self._dz_devices.get_device_from_unit_id(ocdr.unit).DeviceID
+        if device_id == GROUP_DEVICE_ID:
+            self._on_group_command(ocdr)
+            return
         command = self._soundswitches.send_command(
-            self._dz_devices.get_device_from_unit_id(ocdr.unit).DeviceID,
-            ocdr
+            device_id,
+            ocdr,
+            self._zwave_gateway.command_topic
         )
-        if command is not None:
+        if command is None:
+            return
+        if command['topic'] == self._zwave_gateway.command_topic:
+            # play: tagged, a newer play of the endpoint supersedes it
+            self._commands.call(command['payload'], key=command['key'], max_retries=0)
+        else:
+            # slider/selector bursts: only the last value reaches the node
+            self._commands.cancel(command['key'])
+            self._mqtt.publish(**command, coalesce=True)
+
+    def _on_group_command(self: App2, ocdr: OCDR) -> None:
+        """`All sirens`: default tone on every endpoint at once, or stop"""
+        tone_id = 255 if ocdr.command == 'On' else 0
+        commands = self._soundswitches.group_command(tone_id, self._zwave_gateway)
+        for command in commands:
             self._mqtt.publish(**command)
+        helpers.status(f'All sirens: tone {tone_id}, {len(commands)} request(s)')
+        self._dz_devices.update_group(tone_id > 0)
 
     def on_heartbeat(self: App2) -> None:
         """place this in `onHeartbeat`"""
         self._mqtt.on_heartbeat()
+        self._dz_devices.on_heartbeat()
+        self._plan.on_heartbeat()
+        for cur_node in self._soundswitches.identifying_nodes():
+            if cur_node.identification_time + IDENTIFICATION_TIMEOUT < time():
+                self._identify(cur_node, force=True)
+        self._commands.check_timeouts()
+        self._burst.check()
+        self._narrow_subscriptions()
 
     def on_message(self: App2, omer: OMER) -> None:
         """place this in `onMessage`
@@ -91,58 +166,221 @@ class App2:
                     self._on_publish(message)
             else:
                 helpers.error(message.Error)
+        self._dz_devices.flush_updates()
 
     def _on_publish(self: App2, response: MQTTResponse) -> None:
         """Recieve message from broker
         #ignore_self_arg
         """
-        if response.Topic.startswith("zwave/_CLIENTS/"):
-            if response.Topic.endswith("sendCommand"):
-                self._soundswitches.update(response.Topic, response.Payload)
-                cur_node = self._soundswitches.get_cur_node()
-                next_tone_id = self._soundswitches.need_tone_info()
-                if next_tone_id:  # next tone info
-                    self._mqtt.publish(
-                        self._zwave_gateway.command_topic,
-                        self._soundswitches.get_tone_info(next_tone_id)
-                    )
-                else:
-                    helpers.status(f'Node {cur_node.node_id} is complete')
-                    if self._soundswitches.is_complete():
-                        for endpoint in self._soundswitches:
-                            self._dz_devices.update(endpoint)
-                        self._plan.add_device(
-                            self._dz_devices.get_unit_ids_list()
-                        )
-            elif not self._zwave_gateway.is_complete():
-                self._zwave_gateway.update(response.Topic, response.Payload)
-                if self._zwave_gateway.is_complete():
-                    helpers.status(
-                        f'Zwave Gateway found: {self._zwave_gateway.response_topic}'
-                    )
-                    # unsubscribe to global gateway
-                    self._mqtt.unsubscribe("zwave/_CLIENTS/#")
-                    # subscribe to specific gateway command topic response (sendCommand)
-                    self._mqtt.subscribe(self._zwave_gateway.response_topic)
-                    # now searching for nodes that have soundswitch endpoints
-                    self._mqtt.subscribe('zwave/+/121/+/#')
-        else:
-            endpoint = self._soundswitches.update(
-                response.Topic, response.Payload
+        self._router.route(response.Topic, response)
+
+    def _on_command_result(self: App2, _topic: ZwaveTopic, response: MQTTResponse) -> None:
+        """gateway `sendCommand` results"""
+        results = SendCommandResult.from_data(response.json)
+        if not self._commands.resolve(results):
+            helpers.debug(
+                f'Unexpected sendCommand result: {results.command}{results.command_args}'
+            )
+
+    def _on_multicast_result(self: App2, _topic: ZwaveTopic, response: MQTTResponse) -> None:
+        """gateway `writeMulticast` results; on error, unicast from now on"""
+        results = response.json
+        if not isinstance(results, dict) or results.get('success'):
+            return
+        helpers.error(
+            f'Zwave Gateway multicast failed ({results.get("message")}); unicast from now on'
+        )
+        self._zwave_gateway.multicast = False
+        try:
+            nodes, value_id, tone_id = results['args']
+            commands = self._soundswitches.unicast_commands(nodes, value_id['endpoint'], tone_id)
+        except (KeyError, TypeError, ValueError):
+            helpers.error(f'Unexpected writeMulticast result: {response.json}')
+            return
+        for command in commands:
+            self._mqtt.publish(**command)
+
+    def _send_gateway_call(self: App2, call: GatewayCall) -> None:
+        """publish a `sendCommand` call; discovery traffic in the background"""
+        self._mqtt.publish(
+            self._zwave_gateway.command_topic,
+            call.payload,
+            coalesce=call.key is not None,
+            priority=Priority.BACKGROUND if call.background else Priority.INTERACTIVE,
+            key=call.key
+        )
+
+    def _on_discovery_result(self: App2, results: SendCommandResult, discovered: bool) -> None:
+        """tones count/info of a node; cache the catalogue once discovered"""
+        completed = self._soundswitches.update_node_infos(results)
+        cur_node = self._soundswitches.get_node(results.node_id)
+        if discovered and cur_node is not None and cur_node.model_key():
+            self._tones_cache.put(cur_node.model_key(), cur_node.tones, cur_node.tones_count)
+        self._on_node_complete(completed)
+
+    def _on_discovery_failed(self: App2, node_id: int) -> None:
+        """no tones after the retries: identified again on a later heartbeat"""
+        cur_node = self._soundswitches.get_node(node_id)
+        if cur_node is not None:
+            cur_node.retry_identification()
+
+    def _on_gateway_infos(self: App2, topic: ZwaveTopic, response: MQTTResponse) -> None:
+        """gateway `status` and `version`"""
+        if self._zwave_gateway.is_complete():
+            return
+        self._zwave_gateway.update(topic, response.json)
+        if self._zwave_gateway.is_complete():
+            helpers.status(
+                f'Zwave Gateway found: {self._zwave_gateway.response_topic}'
             )
-            if self._soundswitches.is_new():
-                cur_node = self._soundswitches.get_cur_node()
-                # subscribing node status
-                self._mqtt.subscribe(f'zwave/{cur_node.node_id}/status')
-                # send the getToneCount command
-                self._mqtt.publish(
-                    self._zwave_gateway.command_topic,
-                    self._soundswitches.get_tone_count()
-                )
-            elif self._soundswitches.is_complete():
-                if isinstance(endpoint, CCSSEndpoint):
-                    self._dz_devices.update(endpoint)
+            subscriptions = self._mqtt.subscriptions
+            # unsubscribe to global gateway
+            subscriptions.discard('zwave/_CLIENTS/#')
+            # subscribe to specific gateway command topic response (sendCommand)
+            subscriptions.add(self._zwave_gateway.response_topic)
+            # and to the multicast results: a gateway without the api answers an error
+            subscriptions.add(self._zwave_gateway.multicast_response_topic)
+            # every node status: a new node widens the subscriptions again
+            subscriptions.add('zwave/+/status')
+            # now searching for nodes that have soundswitch endpoints; sends all
+            self._widen_subscriptions()
+
+    def _widen_subscriptions(self: App2) -> None:
+        """listen to every soundswitch value, to find the new endpoints"""
+        subscriptions = self._mqtt.subscriptions
+        subscriptions.discard(*self._endpoints_topics())
+        subscriptions.add(SOUNDSWITCH_WILDCARD)
+        subscriptions.apply()
+        self._narrowed = False
+        self._widened_at = time()
+
+    def _narrow_subscriptions(self: App2) -> None:
+        """once every node is complete, listen to the known values only"""
+        if self._narrowed or not self._soundswitches or not self._soundswitches.is_complete():
+            return
+        if self._widened_at + SUBSCRIPTIONS_SETTLE > time():
+            return
+        subscriptions = self._mqtt.subscriptions
+        subscriptions.add(*self._endpoints_topics())
+        subscriptions.discard(SOUNDSWITCH_WILDCARD)
+        subscriptions.apply()
+        self._narrowed = True
+        helpers.status('Subscriptions narrowed to the known endpoints')
+
+    def _endpoints_topics(self: App2) -> list:
+        """the exact value topics of the known endpoints"""
+        return [
+            f'zwave/{node_id}/121/{endpoint_id}/{property_}'
+            for node_id, endpoint_id in self._soundswitches.endpoint_ids()
+            for property_ in ENDPOINT_PROPERTIES
+        ]
+
+    def _on_node_status(self: App2, topic: ZwaveTopic, response: MQTTResponse) -> None:
+        """node `status`"""
+        if topic.node_id not in self._known_nodes:
+            self._known_nodes.add(topic.node_id)
+            if self._narrowed:
+                helpers.status(f'New node {topic.node_id}: looking for soundswitch endpoints')
+                self._widen_subscriptions()
+            else:
+                self._widened_at = time()
+        self._on_node_complete(self._soundswitches.update_status(response.json))
+
+    def _on_soundswitch_value(self: App2, topic: ZwaveTopic, response: MQTTResponse) -> None:
+        """soundswitch (121) endpoint values"""
+        cur_node, endpoint = self._soundswitches.update_endpoint(
+            topic, response.json
+        )
+        if cur_node.state is NodeState.NEW:
+            cur_node.start_identification()
+            # subscribing node identification
+            self._mqtt.subscriptions.add(*self._identification_topics(cur_node.node_id))
+            self._mqtt.subscriptions.apply()
+        elif cur_node.is_complete() and isinstance(endpoint, CCSSEndpoint):
+            if response.Retain:
+                # (re)subscription burst: one update per endpoint at its end
+                self._burst.hold((endpoint.node_id, endpoint.endpoint_id), endpoint)
+            else:
+                self._dz_devices.update(endpoint)
+
+    def _apply_burst(self: App2, endpoints: List[CCSSEndpoint]) -> None:
+        """final state of the endpoints after a retained burst"""
+        for endpoint in endpoints:
+            # known states: no event scripts nor notifications
+            self._dz_devices.update(endpoint, suppress_triggers=True)
+        helpers.debug(f'Retained burst applied to {len(endpoints)} endpoint(s)')
+
+    def _known_topics(self: App2) -> List[str]:
+        """topics of the endpoints known from the devices mapping; their
+        routes are compiled at start rather than during the first retained burst
+        """
+        topics = []
+        for node_id, endpoint_id, topic in self._dz_devices.get_locations():
+            if node_id:  # not `All sirens`
+                topics.append(f'zwave/{node_id}/121/{endpoint_id}/{topic}')
+                topics.append(f'zwave/{node_id}/status')
+        return topics
+
+    @staticmethod
+    def _identification_topics(node_id: int) -> list:
+        """manufacturer (114) and version (134) topics of `node_id`"""
+        return [
+            f'zwave/{node_id}/114/0/+',
+            f'zwave/{node_id}/134/0/firmwareVersions'
+        ]
+
+    def _on_node_metadata(self: App2, topic: ZwaveTopic, response: MQTTResponse) -> None:
+        """node manufacturer (114) and version (134) values"""
+        cur_node = self._soundswitches.update_metadata(topic, response.json)
+        if cur_node is not None and cur_node.state is NodeState.IDENTIFYING:
+            self._identify(cur_node)
+
+    def _identify(self: App2, cur_node: CCSSNode, force: bool = False) -> None:
+        """use the cached tones catalogue or start the tones discovery
+        @arg force (bool): start the discovery even if the model is unknown
+        """
+        key = cur_node.model_key()
+        if key:
+            tones = self._tones_cache.get(key)
+            if tones is not None:
+                cur_node.apply_catalogue(tones)
+                if cur_node.refresh_state():
+                    self._on_node_complete(cur_node)
+                return
+            if not self._tones_cache.claim(key):
+                # another hardware instance is discovering this model: wait for it
+                helpers.status(f'Node {cur_node.node_id}: waiting for the tones of {key}')
+                cur_node.identification_time = time()
+                return
+        if key or force:
+            cur_node.start_discovery()
+            self._discovery.start(cur_node.node_id)
+
+    def _on_node_complete(self: App2, cur_node: Optional[CCSSNode]) -> None:
+        """create/update the devices of a node that has just been completed"""
+        if cur_node is None:
+            return
+        helpers.status(f'Node {cur_node.node_id} is complete')
+        self._mqtt.subscriptions.discard(*self._identification_topics(cur_node.node_id))
+        self._mqtt.subscriptions.apply()
+        for endpoint in self._soundswitches.node_endpoints(cur_node.node_id):
+            self._dz_devices.update(endpoint)
+        self._dz_devices.update_group()
+        self._plan.add_device(
+            self._dz_devices.get_unit_ids_list()
+        )
 
     def on_device_removed(self: App2, odrr: ODRR) -> None:
         """on_device_removed"""
-        self._dz_devices.remove_device(odrr)
+        deleted = self._dz_devices.remove_device(odrr)
+        if deleted is not None:
+            self._plan.sync_devices(self._dz_devices.get_unit_ids_list())
+        if deleted is not None and deleted.topic == 'toneId':
+            # deleting a tone device rebuilds its tones catalogue
+            cur_node = self._soundswitches.get_node(deleted.node_id)
+            if cur_node is not None and cur_node.model_key():
+                self._tones_cache.invalidate(cur_node.model_key())
+            if cur_node is not None and cur_node.state in (NodeState.DISCOVERED, NodeState.COMPLETE):
+                helpers.status(f'Node {cur_node.node_id} - tones discovery restarted')
+                cur_node.restart_discovery()
+                self._discovery.start(cur_node.node_id)
@@ -43,3 +43,23 @@ class ZW164Config(AppConfig):
             # Mise à jour interne
             debug(f'Mise à jour - mqtt_id: {type(value)}{value}')
             self._config.update({'mqtt_id': value})
+
+    @property
+    def plan_name(self: ZW164Config) -> str:
+        """plan_name getter; the name of the cached `plan_id`"""
+        if self._config is None:
+            return ""
+        if 'plan_name' not in self._config:
+            self._config.update({'plan_name': ''})
+        return self._config['plan_name']
+
+    @plan_name.setter
+    def plan_name(self: ZW164Config, value: str) -> None:
+        """plan_name setter"""
+        # type check
+        if self._config is None:
+            return
+        if isinstance(value, str):
+            # Mise à jour interne
+            debug(f'Mise à jour - plan_name: {type(value)}{value}')
+            self._config.update({'plan_name': value})
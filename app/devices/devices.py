@@ -4,101 +4,170 @@
 # standard libs
 from __future__ import annotations
 
+from heapq import heapify, heappop, heappush
 from re import sub
-from typing import Any, Dict, List, Optional
+from time import time
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
 
 # plugin libs
 import Domoticz
 import helpers
 from app.config import ZW164Config
+from app.devices.sharding import ShardRegistry
 from app.zwave.soundswitch import CCSSEndpoint
 from domoticz.responses import OnDeviceRemovedResponse as ODRR
 from helpers.app_config import DeviceMappingDatas
 
 
+DEVICES_PER_ENDPOINT = 3  # defaultVolume, volume, toneId
+GROUP_DEVICE_ID = '0_0_group'  # `All sirens`, on the first shard only
+MAX_UNIT = 254
+UPDATE_TICK = 0.2  # seconds a device update is staged before being written
+
+
+class _UnitAllocator:
+    """Free-list of Domoticz units; a min-heap with lazy deletion"""
+
+    def __init__(self: _UnitAllocator) -> None:
+        """initialisation de la classe"""
+        self._free: List[int] = []
+        self._used: Set[int] = set()
+
+    def reset(self: _UnitAllocator, used: Iterable[int]) -> None:
+        """rebuild the free-list from the `used` units"""
+        self._used = set(used)
+        self._free = [
+            unit for unit in range(1, MAX_UNIT + 1) if unit not in self._used
+        ]
+        heapify(self._free)
+
+    def peek(self: _UnitAllocator) -> int:
+        """@return the lowest free unit; -1 if none"""
+        while self._free and self._free[0] in self._used:
+            heappop(self._free)
+        return self._free[0] if self._free else -1
+
+    def take(self: _UnitAllocator, unit: int) -> None:
+        """mark `unit` as used"""
+        self._used.add(unit)
+
+    def release(self: _UnitAllocator, unit: int) -> None:
+        """give `unit` back to the free-list"""
+        if unit in self._used:
+            self._used.discard(unit)
+            heappush(self._free, unit)
+
+
 class _DeviceMapping:
-    """Device mapping"""
+    """Device mapping
+
+    The mapping is read once at start; afterwards the in-memory dict is the
+    source of truth and changes are written behind by `flush_mapping`.
+    Reverse indexes (unit -> device_id, (node, endpoint, topic) -> device_id)
+    are maintained incrementally by `_index`/`_unindex`.
+    """
 
     def __init__(self: _DeviceMapping) -> None:
         """initialisation de la classe"""
-        self._devices_ids = set()
         self._devices_mapping: Dict[str, DeviceMappingDatas] = {}
         self._devices: Dict[int, Domoticz.Device] = {}
+        self._devices_cache: Dict[str, Domoticz.Device] = {}
+        self._dirty = False
+        self._locations_index: Dict[Tuple[int, int, str], str] = {}
         self._next_unit_id = -1
-        self._units_ids = set()
+        self._units = _UnitAllocator()
+        self._units_index: Dict[int, str] = {}
+        self._views: Dict[str, List[Any]] = {}
 
     def init_mapping(self: _DeviceMapping) -> None:
         """Acquisition du mapping"""
         with ZW164Config() as pcf:
-            self._devices_mapping = pcf.device_mapping
-        self._devices_ids = set(self._devices_mapping.keys())
-        for key, item in self._devices_mapping.items():
-            # convert model data
-            if isinstance(item, str):
-                item = eval(item)  # pylint:disable=eval-used
-            self._devices_mapping.update({key: item})
-            self._units_ids.add(item.unit)
+            mapping = pcf.device_mapping
+        self._devices_mapping = {}
+        self._locations_index.clear()
+        self._units_index.clear()
+        for device_id, datas in mapping.items():
+            self._index(device_id, datas)
+        self._units.reset(self._units_index)
+        self._dirty = False
         self.get_next_unit_id()
 
+    def _index(self: _DeviceMapping, device_id: str, datas: DeviceMappingDatas) -> None:
+        """add `datas` to the mapping and its indexes"""
+        self._devices_mapping[device_id] = datas
+        self._units_index[datas.unit] = device_id
+        self._units.take(datas.unit)
+        self._locations_index[(datas.node_id, datas.endpoint_id, datas.topic)] = device_id
+        self._invalidate_views()
+
+    def _unindex(self: _DeviceMapping, device_id: str) -> Optional[DeviceMappingDatas]:
+        """remove `device_id` from the mapping and its indexes"""
+        datas = self._devices_mapping.pop(device_id, None)
+        if datas is not None:
+            self._units_index.pop(datas.unit, None)
+            self._units.release(datas.unit)
+            self._locations_index.pop(
+                (datas.node_id, datas.endpoint_id, datas.topic), None
+            )
+            self._devices_cache.pop(device_id, None)
+            self._invalidate_views()
+        return datas
+
+    def _invalidate_views(self: _DeviceMapping) -> None:
+        """forget the cached lists"""
+        self._views.clear()
+
     def _save_mapping(self: _DeviceMapping) -> None:
         """save device mapping"""
         with ZW164Config() as pcf:
             pcf.device_mapping = self._devices_mapping
 
+    def flush_mapping(self: _DeviceMapping) -> None:
+        """write the mapping to Domoticz if it has changed"""
+        if self._dirty:
+            self._save_mapping()
+            self._dirty = False
+
     def update_mapping(
         self: _DeviceMapping, device_id: str, node_id: int,
         endpoint_id: int, topic: str
     ) -> None:
         """_update_mapping"""
-        unit_id = self.get_next_unit_id()
-        self._devices_mapping.update(
-            {
-                device_id: DeviceMappingDatas(
-                    endpoint_id,
-                    node_id,
-                    topic,
-                    unit_id
-                )
-            }
+        self._unindex(device_id)
+        self._index(
+            device_id,
+            DeviceMappingDatas(
+                endpoint_id,
+                node_id,
+                topic,
+                self.get_next_unit_id()
+            )
         )
-        self._units_ids.add(unit_id)
-        self._save_mapping()
-        self.init_mapping()
+        self._dirty = True
 
     def remove_from_mapping(self: _DeviceMapping, unit_id: int) -> Optional[DeviceMappingDatas]:
         """remove_from_mapping"""
-        tmp = self._devices_mapping.copy()
-        for key, value in tmp.items():
-            if value.unit == unit_id:
-                del self._devices_mapping[key]
-                self._save_mapping()
-                self.init_mapping()
-                return value
-        return None
+        device_id = self._units_index.get(unit_id)
+        if device_id is None:
+            return None
+        self._dirty = True
+        return self._unindex(device_id)
 
     def index_of_unit(self: _DeviceMapping, search_unit: int) -> Optional[str]:
         """search index of `search` in device mapping"""
-        for key, value in self._devices_mapping.items():
-            if value.unit == search_unit:
-                return key
-        return None
+        return self._units_index.get(search_unit)
 
     def clean_mapping(self: _DeviceMapping) -> None:
         """clean_mapping"""
-        tmp = self._devices_mapping.copy()
-        for device_id, datas in tmp.items():
-            device = self._devices.get(datas.unit)
-            if device is None:
-                del self._devices_mapping[device_id]
-        self._save_mapping()
-        self.init_mapping()
+        for unit_id, device_id in list(self._units_index.items()):
+            if unit_id not in self._devices:
+                self._unindex(device_id)
+                self._dirty = True
 
     def get_next_unit_id(self: _DeviceMapping) -> int:
         """get_next_unit_id"""
-        try:
-            self._next_unit_id: int = min(set(range(1, 255)) - self._units_ids)
-        except ValueError:
-            self._next_unit_id = -1
+        self._next_unit_id = self._units.peek()
+        if self._next_unit_id < 0:
             helpers.error('No more unit avaible')
         return self._next_unit_id
 
@@ -107,86 +176,226 @@ class _DeviceMapping:
         """
         @return Device if device_id exists, else `None`
         """
-        mapping = self._devices_mapping.get(device_id)
-        if mapping is not None:
-            return self._devices.get(mapping.unit)
-        return None
+        device = self._devices_cache.get(device_id)
+        if device is None:
+            mapping = self._devices_mapping.get(device_id)
+            if mapping is None:
+                return None
+            device = self._devices.get(mapping.unit)
+            if device is not None:
+                self._devices_cache[device_id] = device
+        return device
+
+    def get_device_from_location(
+            self: _DeviceMapping, node_id: int,
+            endpoint_id: int, topic: str) -> Optional[Domoticz.Device]:
+        """
+        @return Device mapped to (node_id, endpoint_id, topic), else `None`
+        """
+        device_id = self._locations_index.get((node_id, endpoint_id, topic))
+        if device_id is None:
+            return None
+        return self.get_device_from_device_id(device_id)
 
     def get_device_from_unit_id(self: _DeviceMapping, unit_id: int) -> Optional[Domoticz.Device]:
         """return the device"""
         return self._devices.get(unit_id)
 
+    def get_locations(self: _DeviceMapping) -> List[Tuple[int, int, str]]:
+        """@return the (node_id, endpoint_id, topic) of the mapped devices"""
+        return list(self._locations_index)
+
     def get_unit_ids_list(self: _DeviceMapping) -> List[int]:
         """get_unit_ids"""
-        return [device.ID for device in self._devices.values()]
+        if 'unit_ids' not in self._views:
+            self._views['unit_ids'] = [
+                self._devices[unit].ID for unit in self._units_index
+                if unit in self._devices
+            ]
+        return self._views['unit_ids']
 
     def get_device_idxs_list(self: _DeviceMapping) -> List[int]:
         """get_device_idxs_list"""
-        return [device.DeviceID for device in self._devices.values()]
+        if 'device_idxs' not in self._views:
+            self._views['device_idxs'] = [
+                device.DeviceID for device in self._devices.values()
+            ]
+        return self._views['device_idxs']
 
 
 class DzDevices(_DeviceMapping):
     """Domoticz devices"""
 
-    def on_start(self: DzDevices, devices: Dict[int, Domoticz.Device]) -> None:
+    def __init__(self: DzDevices) -> None:
+        """initialisation de la classe"""
+        _DeviceMapping.__init__(self)
+        self._shards = ShardRegistry(MAX_UNIT // DEVICES_PER_ENDPOINT)
+        self._options_cache: Dict[Tuple[Any, ...], Dict[str, str]] = {}
+        self._options_fingerprints: Dict[int, Tuple[Any, ...]] = {}
+        self._staged: Dict[int, Tuple[Domoticz.Device, Dict[str, Any]]] = {}
+        self._staged_at = 0.0
+        self.updates_saved = 0  # writes without staging - writes done
+        self.updates_written = 0
+
+    def on_start(
+            self: DzDevices, parameters: Dict[str, Any],
+            devices: Dict[int, Domoticz.Device]) -> None:
         """onStart event"""
+        self._shards.on_start(parameters)
         self._devices = devices
         self.init_mapping()
         self.clean_mapping()
+        self.remove_moved_devices()
+        self.flush_mapping()
 
-    def remove_device(self: DzDevices, odrr: ODRR) -> None:
-        """remove_device"""
+    def on_heartbeat(self: DzDevices) -> None:
+        """onHeartbeat event"""
+        self.flush_updates(force=True)
+        self.flush_mapping()
+
+    def on_stop(self: DzDevices) -> None:
+        """onStop event"""
+        self.flush_updates(force=True)
+        self.flush_mapping()
+        helpers.status(
+            f'Device updates: {self.updates_written} written, {self.updates_saved} saved'
+        )
+
+    def flush_updates(self: DzDevices, force: bool = False) -> None:
+        """write the staged device updates, once the tick is over"""
+        if not self._staged or (not force and self._staged_at + UPDATE_TICK > time()):
+            return
+        staged = self._staged
+        self._staged = {}
+        for device, datas in staged.values():
+            device.Update(**datas)
+        self.updates_written += len(staged)
+
+    def _stage(self: DzDevices, device: Domoticz.Device, datas: Dict[str, Any]) -> bool:
+        """stage the latest nValue/sValue of `device`; the last one wins
+        @return `True` if the device will change
+        """
+        staged = self._staged.pop(device.Unit, None)
+        if staged is not None:
+            self.updates_saved += 1
+        if datas.get('nValue') == device.nValue and datas.get('sValue') == device.sValue:
+            if staged is not None:  # back to the written value: nothing to write
+                self.updates_saved += 1
+            return False
+        if not self._staged:
+            self._staged_at = time()
+        self._staged[device.Unit] = (device, datas)
+        return True
+
+    def remove_moved_devices(self: DzDevices) -> None:
+        """remove the devices of the endpoints handled by another shard
+        the shard capacity (units per endpoint) or `Mode3` has changed;
+        the owning shard creates its own devices
+        """
+        for device_id, datas in list(self._devices_mapping.items()):
+            if datas.node_id == 0:  # `All sirens`
+                continue
+            shard = self._shards.shard_of(datas.node_id, datas.endpoint_id)
+            if shard == self._shards.shard:
+                continue
+            device = self._devices.get(datas.unit)
+            self._options_fingerprints.pop(datas.unit, None)
+            self._staged.pop(datas.unit, None)
+            self.remove_from_mapping(datas.unit)
+            if device is not None:
+                device.Delete()
+            helpers.status(f'Device {device_id} moved to shard {shard}: removed')
+
+    def remove_device(self: DzDevices, odrr: ODRR) -> Optional[DeviceMappingDatas]:
+        """remove_device
+        @return the deleted mapping or `None`
+        """
         index = self.index_of_unit(odrr.unit)
         if index is not None:
+            self._options_fingerprints.pop(odrr.unit, None)
+            self._staged.pop(odrr.unit, None)
             deleted = self.remove_from_mapping(odrr.unit)
             helpers.status(f'Deleted device: {deleted}')
+            return deleted
+        return None
 
-    def update(self: DzDevices, endpoint: CCSSEndpoint) -> None:
+    def update(self: DzDevices, endpoint: CCSSEndpoint, suppress_triggers: bool = False) -> None:
         """update or create devices
+        @arg suppress_triggers (bool): no events nor notifications for these updates
         #ignore_self_arg
         """
-        self.init_mapping()
+        if not self._shards.is_local(endpoint.node_id, endpoint.endpoint_id):
+            return
         base_device_id = f'{endpoint.node_id}_{endpoint.endpoint_id}_'
 
-        # defaultVolume
-        device_id = base_device_id + 'defaultVolume'
-        device = self.get_device_from_device_id(device_id)
-        if device is None:  # create
-            device = self._create_default_volume(
-                endpoint.node_id,
-                endpoint.endpoint_id,
-                'defaultVolume',
-                device_id
-            )
-            # update @ creation
-            device.Update(**self._update_at_creation(device.Name))
-        # update defaultVolume
-        datas = self._update_default_volume(endpoint.defaultVolume)
-        if datas.get('nValue') != device.nValue or datas.get('sValue') != device.sValue:
-            device.Update(**datas)
-            helpers.log(
-                f'Mise à jour volume: ({endpoint.node_id}-{endpoint.endpoint_id}){datas}'
+        # defaultVolume and play volume
+        for topic, label in (('defaultVolume', 'volume'), ('volume', 'play volume')):
+            device = self.get_device_from_location(
+                endpoint.node_id, endpoint.endpoint_id, topic
             )
+            if device is None:  # create
+                device = self._create_default_volume(
+                    endpoint.node_id,
+                    endpoint.endpoint_id,
+                    topic,
+                    base_device_id + topic,
+                    label
+                )
+                # update @ creation
+                device.Update(**self._update_at_creation(device.Name))
+            # update volume
+            datas = self._update_default_volume(getattr(endpoint, topic))
+            if self._stage(device, {**datas, **self._triggers(suppress_triggers)}):
+                helpers.log(
+                    f'Mise à jour {label}: ({endpoint.node_id}-{endpoint.endpoint_id}){datas}'
+                )
 
         # toneId
-        device_id = base_device_id + 'toneId'
-        device = self.get_device_from_device_id(device_id)
+        device = self.get_device_from_location(
+            endpoint.node_id, endpoint.endpoint_id, 'toneId'
+        )
         if device is None:  # create
             device = self._create_default_tone(
                 endpoint,
                 'toneId',
-                device_id
+                base_device_id + 'toneId'
             )
             # update @ creation
             device.Update(**self._update_at_creation(device.Name))
+        elif endpoint.tones:
+            self._refresh_tone_options(device, endpoint)
         # update toneId
         datas = self._update_default_tone(len(endpoint.tones), endpoint.toneId)
-        if datas.get('nValue') != device.nValue or datas.get('sValue') != device.sValue:
-            device.Update(**datas)
+        if self._stage(device, {**datas, **self._triggers(suppress_triggers)}):
             helpers.log(
                 f'Mise à jour son: ({endpoint.node_id}-{endpoint.endpoint_id}){datas}'
             )
 
+    def update_group(self: DzDevices, state: Optional[bool] = None) -> None:
+        """create the `All sirens` device; update its state"""
+        if self._shards.shard != 1:
+            return
+        device = self.get_device_from_device_id(GROUP_DEVICE_ID)
+        if device is None:  # create
+            device = Domoticz.Device(
+                Name='All sirens',
+                Unit=self.get_next_unit_id(),
+                DeviceID=GROUP_DEVICE_ID,
+                TypeName='Switch',
+                Image=8  # speaker
+            )
+            device.Create()
+            self.update_mapping(GROUP_DEVICE_ID, 0, 0, 'group')
+            helpers.status(f'Device created: {device.Name}')
+            device.Update(**self._update_at_creation(device.Name))
+        if state is not None and int(state) != device.nValue:
+            device.Update(nValue=int(state), sValue='On' if state else 'Off')
+
+    @staticmethod
+    def _triggers(suppress_triggers: bool) -> Dict[str, Any]:
+        """`Device.Update` triggers option"""
+        return {'SuppressTriggers': True} if suppress_triggers else {}
+
     @staticmethod
     def _update_at_creation(device_name: str) -> Dict[str, Any]:
         """_update_at_creation"""
@@ -202,10 +411,11 @@ class DzDevices(_DeviceMapping):
             node_id: int,
             endpoint_id: int,
             topic: str,
-            device_id: str) -> Domoticz.Device:
-        """creates a toneId device"""
+            device_id: str,
+            label: str = 'volume') -> Domoticz.Device:
+        """creates a volume device"""
         my_dev = Domoticz.Device(
-            Name=f'N{node_id}E{endpoint_id}: volume',
+            Name=f'N{node_id}E{endpoint_id}: {label}',
             Unit=self.get_next_unit_id(),
             DeviceID=device_id,
             TypeName='Dimmer',
@@ -232,27 +442,43 @@ class DzDevices(_DeviceMapping):
             )
         return kwargs
 
+    def _tone_options(
+            self: DzDevices, endpoint: CCSSEndpoint) -> Tuple[Tuple[Any, ...], Dict[str, str]]:
+        """selector options of the endpoint tones catalogue
+        built once per distinct catalogue and shared by the endpoints
+        @return (catalogue fingerprint, options)
+        """
+        fingerprint = endpoint.tones.fingerprint
+        options = self._options_cache.get(fingerprint)
+        if options is None:
+            options = {
+                "LevelActions": '|' * (len(fingerprint) - 1),
+                "LevelNames": '|'.join(
+                    f'{name} ({duration}s)' if duration > 0 else name
+                    for _tone_id, name, duration in fingerprint
+                ),
+                "LevelOffHidden": "false",
+                "SelectorStyle": "1"  # drop down
+            }
+            self._options_cache[fingerprint] = options
+        return fingerprint, options
+
+    def _refresh_tone_options(
+            self: DzDevices, device: Domoticz.Device, endpoint: CCSSEndpoint) -> None:
+        """update the selector levels in place when the tones catalogue has changed"""
+        fingerprint, options = self._tone_options(endpoint)
+        if self._options_fingerprints.get(device.Unit) == fingerprint:
+            return
+        if device.Options != options:
+            device.Update(nValue=device.nValue, sValue=device.sValue, Options=options)
+            helpers.status(f'Tones list updated: {device.Name}')
+        self._options_fingerprints[device.Unit] = fingerprint
+
     def _create_default_tone(
             self: DzDevices, endpoint: CCSSEndpoint,
             topic: str, device_id: str) -> Domoticz.Device:
         """creates a toneId device"""
-        # preparing device options
-        tones = dict(sorted(endpoint.tones.items()))
-        names = ''
-        actions = '|' * (len(tones) - 1)
-        for values in tones.values():
-            names += f'{values.name}'
-            if values.duration > 0:
-                names += f' ({values.duration}s)'
-            names += '|'
-        names = names[:-1]
-        # creating device options
-        options = {
-            "LevelActions": actions,
-            "LevelNames": names,
-            "LevelOffHidden": "false",
-            "SelectorStyle": "1"  # drop down
-        }
+        fingerprint, options = self._tone_options(endpoint)
         # create the device
         my_dev = Domoticz.Device(
             Name=f'N{endpoint.node_id}E{endpoint.endpoint_id}: tone',
@@ -264,6 +490,7 @@ class DzDevices(_DeviceMapping):
             Options=options
         )
         my_dev.Create()
+        self._options_fingerprints[my_dev.Unit] = fingerprint
         self.update_mapping(
             device_id,
             endpoint.node_id,
@@ -0,0 +1,92 @@
+# -*- coding: UTF-8 -*-
+"""Endpoints sharding between hardware instances"""
+
+# standard libs
+from __future__ import annotations
+
+import os
+from typing import Any, Dict, List
+
+# plugin libs
+import helpers
+
+
+class ShardRegistry:
+    """Spread the endpoints across several hardware instances
+
+    Every instance of the plugin shares the same registry file, where the
+    endpoints are appended in discovery order. The endpoint at `position`
+    belongs to the shard `position // capacity + 1`, so the first `capacity`
+    endpoints stay on shard 1 and only the next ones overflow to shard 2, ...
+
+    The registry is append only: a position never changes once written.
+    Endpoints are registered under an exclusive lock, merged with the file
+    and written atomically, so every instance sees the same positions.
+
+    File format:
+    {
+        "version": 1,
+        "endpoints": ["<node_id>_<endpoint_id>", ...]
+    }
+    """
+    VERSION = 1
+    FILE_NAME = 'endpoints_registry.json'
+
+    def __init__(self: ShardRegistry, capacity: int) -> None:
+        """initialisation de la classe"""
+        self.capacity = capacity
+        self.shard = 1
+        self._endpoints: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self._path = ''
+
+    def on_start(self: ShardRegistry, parameters: Dict[str, Any]) -> None:
+        """on_start"""
+        try:
+            self.shard = max(1, int(parameters.get('Mode3') or self.shard))
+        except ValueError:
+            helpers.error(f'Invalid shard: {parameters.get("Mode3")}; using {self.shard}')
+        self._path = os.path.join(parameters.get('HomeFolder', ''), self.FILE_NAME)
+        self._load()
+
+    def shard_of(self: ShardRegistry, node_id: int, endpoint_id: int) -> int:
+        """@return the shard of the endpoint; registered if unknown"""
+        key = f'{node_id}_{endpoint_id}'
+        position = self._positions.get(key)
+        if position is None:
+            position = self._register(key)
+        return position // self.capacity + 1
+
+    def is_local(self: ShardRegistry, node_id: int, endpoint_id: int) -> bool:
+        """is the endpoint handled by this instance"""
+        return self.shard_of(node_id, endpoint_id) == self.shard
+
+    def _register(self: ShardRegistry, key: str) -> int:
+        """@return the position of `key`; appended to the registry if unknown"""
+        with helpers.shared_file.locked(self._path):
+            # other instances may have registered endpoints meanwhile
+            self._load()
+            position = self._positions.get(key)
+            if position is None:
+                position = len(self._endpoints)
+                self._endpoints.append(key)
+                self._positions[key] = position
+                self._save()
+        return position
+
+    def _load(self: ShardRegistry) -> None:
+        """read the registry file; the endpoints missing from it are appended"""
+        datas = helpers.shared_file.read(self._path, self.VERSION)
+        if datas is None:
+            return
+        endpoints = datas.get('endpoints', [])
+        known = set(endpoints)
+        endpoints.extend(key for key in self._endpoints if key not in known)
+        self._endpoints = endpoints
+        self._positions = {key: index for index, key in enumerate(self._endpoints)}
+
+    def _save(self: ShardRegistry) -> None:
+        """write the registry file"""
+        helpers.shared_file.write(
+            self._path, {'version': self.VERSION, 'endpoints': self._endpoints}, self
+        )
@@ -0,0 +1,251 @@
+# -*- coding: UTF-8 -*-
+"""HTTP helpers pour le client Domoticz JSON/API"""
+
+# standard libs
+from __future__ import annotations
+
+import re
+import zlib
+from codecs import getincrementaldecoder
+from dataclasses import dataclass, field
+from json import JSONDecodeError, JSONDecoder
+from typing import Any, Callable, Dict, Iterator, Optional
+
+# plugin libs
+from helpers import DATACLASS_SLOTS, codec, error
+
+ResultFilter = Callable[[Dict[str, Any]], Optional[Any]]
+
+_WHITESPACES = re.compile(r'[ \t\n\r]*')
+
+STREAM_THRESHOLD = 4 << 20  # decompressed bytes
+
+
+class _StreamDecoder:
+    """Incremental gzip + JSON decoder for a JSON/API answer
+
+    The body is decompressed and decoded by chunks; the entries of the
+    `result` list are decoded one at a time and passed through `keep`,
+    so only the needed entries are kept. Used for the answers bigger than
+    `STREAM_THRESHOLD`.
+    """
+    CHUNK_SIZE = 65536
+
+    def __init__(
+            self: _StreamDecoder, raw_data: bytes, encoded: str,
+            keep: Optional[ResultFilter] = None) -> None:
+        """initialisation de la classe"""
+        self._buffer = ''
+        self._chunks = self._iter_chunks(raw_data, encoded)
+        self._raw_decode = JSONDecoder().raw_decode
+        self._keep = keep
+        self._pos = 0
+
+    def _iter_chunks(self: _StreamDecoder, raw_data: bytes, encoded: str) -> Iterator[str]:
+        """decompressed and decoded text chunks"""
+        text_decoder = getincrementaldecoder('utf-8')()
+        gzip_decoder = zlib.decompressobj(16 + zlib.MAX_WBITS) if encoded == 'gzip' else None
+        for index in range(0, len(raw_data), self.CHUNK_SIZE):
+            chunk = raw_data[index:index + self.CHUNK_SIZE]
+            if gzip_decoder is not None:
+                chunk = gzip_decoder.decompress(chunk)
+            yield text_decoder.decode(chunk)
+        tail = gzip_decoder.flush() if gzip_decoder is not None else b''
+        yield text_decoder.decode(tail, final=True)
+
+    def _more(self: _StreamDecoder) -> bool:
+        """read the next chunk; drop the consumed text
+        @return `False` at the end of the body
+        """
+        for chunk in self._chunks:
+            self._buffer = self._buffer[self._pos:] + chunk
+            self._pos = 0
+            return True
+        return False
+
+    def _peek(self: _StreamDecoder) -> str:
+        """@return the next non blank char; empty at the end of the body"""
+        while True:
+            if self._pos < len(self._buffer) and self._buffer[self._pos] not in ' \t\n\r':
+                return self._buffer[self._pos]
+            self._pos = _WHITESPACES.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._more():
+                return ''
+
+    def _expect(self: _StreamDecoder, char: str) -> None:
+        """consume `char`"""
+        if self._peek() != char:
+            raise JSONDecodeError(f'Expecting {char!r}', self._buffer, self._pos)
+        self._pos += 1
+
+    def _value(self: _StreamDecoder) -> Any:
+        """decode the next value, reading more chunks if needed"""
+        self._peek()
+        while True:
+            try:
+                value, end = self._raw_decode(self._buffer, self._pos)
+            except JSONDecodeError:
+                if not self._more():
+                    raise
+                continue
+            if end == len(self._buffer) and self._more():
+                # a number may continue in the next chunk
+                continue
+            self._pos = end
+            return value
+
+    def _results(self: _StreamDecoder) -> list:
+        """decode the `result` list, entry by entry"""
+        results = []
+        keep = self._keep
+        raw_decode = self._raw_decode
+        self._expect('[')
+        if self._peek() == ']':
+            self._pos += 1
+            return results
+        while True:
+            try:  # fast path: the whole entry is in the buffer
+                entry, end = raw_decode(self._buffer, self._pos)
+            except JSONDecodeError:
+                end = -1
+            if 0 <= end < len(self._buffer):
+                self._pos = end
+            else:
+                entry = self._value()
+            if keep is not None:
+                entry = keep(entry)
+            if entry is not None:
+                results.append(entry)
+            separator = self._peek()
+            self._pos += 1
+            if separator == ']':
+                return results
+            if separator != ',':
+                raise JSONDecodeError("Expecting ','", self._buffer, self._pos - 1)
+            self._peek()
+
+    def decode(self: _StreamDecoder) -> Dict[str, Any]:
+        """@return the decoded top level object"""
+        decoded = {}
+        self._expect('{')
+        if self._peek() == '}':
+            return decoded
+        while True:
+            key = self._value()
+            self._expect(':')
+            if key == 'result' and self._peek() == '[':
+                decoded[key] = self._results()
+            else:
+                decoded[key] = self._value()
+            if self._peek() == '}':
+                return decoded
+            self._expect(',')
+
+
+def _inflate(raw_data: bytes, encoded: str) -> bytes:
+    """@return the decompressed body"""
+    if encoded == 'gzip':
+        return zlib.decompress(raw_data, 16 + zlib.MAX_WBITS)
+    return raw_data
+
+
+def _body_size(raw_data: bytes, encoded: str) -> int:
+    """@return the decompressed size; read from the gzip trailer (ISIZE)"""
+    if encoded == 'gzip' and len(raw_data) >= 4:
+        return int.from_bytes(raw_data[-4:], 'little')
+    return len(raw_data)
+
+
+def _decode(raw_data: bytes, encoded: str, keep: Optional[ResultFilter]) -> Dict[str, Any]:
+    """decode a JSON/API answer
+    decoded in one call, `keep` applied afterwards; streamed above
+    `STREAM_THRESHOLD` (the one call is about twice as fast, the stream keeps
+    the peak memory low)
+    """
+    if keep is not None and _body_size(raw_data, encoded) > STREAM_THRESHOLD:
+        return _StreamDecoder(raw_data, encoded, keep).decode()
+    decoded = codec.loads(_inflate(raw_data, encoded))
+    if keep is not None and isinstance(decoded.get('result'), list):
+        decoded['result'] = [
+            entry for entry in map(keep, decoded['result']) if entry is not None
+        ]
+    return decoded
+
+
+@dataclass(**DATACLASS_SLOTS)
+class HData:
+    """HTTPData"""
+    raw_data: bytes
+    encoded: str
+    keep: Optional[ResultFilter] = field(default=None, repr=False)
+    result: list = field(default_factory=list, init=False)
+    status: str = field(default_factory=str, init=False)
+    title: str = field(default_factory=str, init=False)
+
+    def __post_init__(self: HData) -> None:
+        """post init"""
+        try:
+            results = _decode(self.raw_data, self.encoded, self.keep)
+        except (codec.DecodeError, UnicodeDecodeError, zlib.error) as exc:
+            error(f'<HData.__post_init__> {exc}')
+            results = {}
+        for key, value in results.items():
+            if key in ('result', 'status', 'title'):
+                setattr(self, key, value)
+        if not self:
+            error('<HData.__post_init__>')
+            error(
+                status=self.status,
+                title=self.title,
+                result=self.result
+            )
+
+    def __bool__(self: HData) -> bool:
+        """bool wrapper
+        ne fonctionne qu'après le post init!
+        """
+        return self.status == 'OK'
+# pylint:disable=invalid-name
+
+
+@dataclass(**DATACLASS_SLOTS)
+class Response:
+    """HTTPResponse
+    `headers` keys are lower cased; missing headers are tolerated
+    """
+    Data: bytes
+    Headers: Dict[str, Any]
+    Status: str
+    keep: Optional[ResultFilter] = field(default=None, repr=False)
+    datas: HData = field(default=None, init=False)
+    headers: Dict[str, str] = field(default_factory=dict, init=False)
+
+    def __post_init__(self: Response) -> None:
+        """post init"""
+        if self:
+            self.headers = {
+                key.lower(): value for key, value in (self.Headers or {}).items()
+            }
+            self.datas = HData(
+                raw_data=self.Data or b'',
+                encoded=self.header('Content-Encoding'),
+                keep=self.keep
+            )
+        else:
+            error('<HTTPResponse.__post_init__>')
+            error(
+                Status=self.Status,
+                Headers=self.Headers,
+                Data=self.Data
+            )
+
+    def header(self: Response, name: str, default: str = '') -> str:
+        """case insensitive header"""
+        return self.headers.get(name.lower(), default)
+
+    def __bool__(self: Response) -> bool:
+        """bool test wrapper"""
+        return self.Status == '200'
+
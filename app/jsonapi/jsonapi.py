@@ -0,0 +1,177 @@
+# -*- coding: UTF-8 -*-
+"""Domoticz JSON/API client"""
+
+# standard libs
+from __future__ import annotations
+
+from collections import deque
+from dataclasses import dataclass, field
+from time import time
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+from urllib.parse import quote, urlencode
+
+# plugin libs
+from app.jsonapi import http
+from Domoticz import Connection
+from domoticz.responses import OnConnectResponse as OCTR
+from domoticz.responses import OnDisconnectResponse as ODTR
+from domoticz.responses import OnMessageResponse as OMER
+from helpers import error
+from helpers.plugin_config import PluginConfig
+
+ApiCallback = Callable[[http.HData], None]
+ApiErrback = Callable[['ApiRequest'], None]
+
+DEFAULT_ENDPOINT = '127.0.0.1:8080'
+
+
+def parse_endpoint(value: Optional[str]) -> Tuple[str, str]:
+    """@return (address, port) of the Domoticz JSON/API `<address>:<port>`"""
+    address, _, port = (value or DEFAULT_ENDPOINT).strip().rpartition(':')
+    if not address or not port.isdigit():
+        error(f'Invalid Domoticz address: {value}; using {DEFAULT_ENDPOINT}')
+        address, _, port = DEFAULT_ENDPOINT.rpartition(':')
+    return address, port
+
+
+@dataclass
+class ApiRequest:
+    """A JSON/API request and its callbacks"""
+    params: Dict[str, Any]
+    callback: Optional[ApiCallback] = field(default=None)
+    on_error: Optional[ApiErrback] = field(default=None)
+    keep: Optional[http.ResultFilter] = field(default=None)
+    retries: int = field(default=0)
+    sent_at: float = field(default=0.0)
+
+    @property
+    def url(self: ApiRequest) -> str:
+        """the request url"""
+        return '/json.htm?' + urlencode(self.params, quote_via=quote)
+
+
+class JsonApiClient:
+    """Domoticz JSON/API client
+
+    One kept-alive connection; the requests are queued and up to `pipeline`
+    of them are sent without waiting. HTTP answers in order, so every
+    response is matched to the oldest request in flight.
+
+    Usage:
+        client.call({'type': 'plans'}, callback)
+    and forward the `on_connect`, `on_message`, `on_disconnect` and
+    `on_heartbeat` events.
+    """
+
+    def __init__(
+            self: JsonApiClient, name: str, address: str,
+            port: str, pipeline: int = 8,
+            timeout: float = 10.0, max_retries: int = 2) -> None:
+        """initialisation de la classe"""
+        self.pipeline = pipeline
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self._con = Connection(name, 'TCP/IP', 'HTTP', Address=address, Port=port)
+        self._headers = {
+            'Accept': 'application/json',
+            'Accept-Charset': 'utf-8',
+            'Accept-Encoding': 'gzip',
+            'Connection': 'keep-alive',
+            'Host': address,
+            'User-Agent': f'Domoticz/{PluginConfig.domoticz_version}'
+        }
+        self._in_flight: Deque[ApiRequest] = deque()
+        self._queue: Deque[ApiRequest] = deque()
+
+    def call(
+            self: JsonApiClient, params: Dict[str, Any],
+            callback: Optional[ApiCallback] = None,
+            on_error: Optional[ApiErrback] = None,
+            keep: Optional[http.ResultFilter] = None) -> None:
+        """queue a request; `callback(HData)` on success, `on_error(ApiRequest)` on failure
+        @arg keep: filter/transform of the `result` entries; `None` drops the entry
+        """
+        self._queue.append(ApiRequest(params, callback, on_error, keep))
+        self._send_next()
+
+    def is_idle(self: JsonApiClient) -> bool:
+        """no request queued nor in flight"""
+        return not self._queue and not self._in_flight
+
+    def on_connect(self: JsonApiClient, octr: OCTR) -> bool:
+        """place this in `on_connect`
+        @return `True` if the event is for this client
+        """
+        if octr.connection is not self._con:
+            return False
+        self._send_next()
+        return True
+
+    def on_message(self: JsonApiClient, omer: OMER) -> bool:
+        """place this in `on_message`
+        @return `True` if the event is for this client
+        """
+        if omer.connection is not self._con:
+            return False
+        if not self._in_flight:
+            error('<JsonApiClient.on_message> Unexpected response')
+            return True
+        request = self._in_flight.popleft()
+        http_response = http.Response(**omer.data, keep=request.keep)
+        if http_response and http_response.datas:
+            if callable(request.callback):
+                request.callback(http_response.datas)
+        else:
+            self._failed(request)
+        self._send_next()
+        return True
+
+    def on_disconnect(self: JsonApiClient, odtr: ODTR) -> bool:
+        """place this in `on_disconnect`
+        @return `True` if the event is for this client
+        """
+        if odtr.connection is not self._con:
+            return False
+        # the requests in flight are lost with the connection
+        self._requeue_in_flight()
+        self._send_next()
+        return True
+
+    def on_heartbeat(self: JsonApiClient) -> None:
+        """place this in `on_heartbeat`; checks the timeouts"""
+        if self._in_flight and self._in_flight[0].sent_at + self.timeout < time():
+            error(f'<JsonApiClient> Timeout: {self._in_flight[0].url}')
+            # responses come in order: the whole pipeline is lost
+            self._requeue_in_flight()
+            self._con.Disconnect()
+
+    def _send_next(self: JsonApiClient) -> None:
+        """send the queued requests, connecting if needed"""
+        if not self._queue:
+            return
+        if not self._con.Connected():
+            if not self._con.Connecting():
+                self._con.Connect()
+            return
+        while self._queue and len(self._in_flight) < self.pipeline:
+            request = self._queue.popleft()
+            request.sent_at = time()
+            self._in_flight.append(request)
+            self._con.Send({'Verb': 'GET', 'URL': request.url, 'Headers': self._headers})
+
+    def _requeue_in_flight(self: JsonApiClient) -> None:
+        """retry the requests in flight, first"""
+        while self._in_flight:
+            request = self._in_flight.pop()
+            if request.retries >= self.max_retries:
+                self._failed(request)
+                continue
+            request.retries += 1
+            self._queue.appendleft(request)
+
+    @staticmethod
+    def _failed(request: ApiRequest) -> None:
+        """the request has failed"""
+        error(f'<JsonApiClient> Request failed: {request.url}')
+        if callable(request.on_error):
+            request.on_error(request)
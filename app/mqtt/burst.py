@@ -0,0 +1,49 @@
+# -*- coding: UTF-8 -*-
+"""MQTT retained messages burst"""
+
+# standard libs
+from __future__ import annotations
+
+from time import time
+from typing import Any, Callable, Dict, Hashable, List
+
+
+class RetainedBurst:
+    """Buffer the retained messages pushed by the broker at (re)subscription
+
+    The items are held by key, the last one wins; once no retained message
+    has come for `idle` seconds the burst is over and `apply` receives the
+    final item of every key, once.
+    """
+
+    def __init__(
+            self: RetainedBurst, apply: Callable[[List[Any]], None],
+            idle: float = 0.5) -> None:
+        """initialisation de la classe"""
+        self.idle = idle
+        self.bursts = 0
+        self.messages = 0
+        self._apply = apply
+        self._last_message = 0.0
+        self._pending: Dict[Hashable, Any] = {}
+
+    def __str__(self: RetainedBurst) -> str:
+        """str() wrapper"""
+        return f'retained bursts: {self.bursts}, {self.messages} messages'
+
+    def hold(self: RetainedBurst, key: Hashable, item: Any) -> None:
+        """buffer `item` until the end of the burst"""
+        self._pending[key] = item
+        self._last_message = time()
+        self.messages += 1
+
+    def check(self: RetainedBurst, force: bool = False) -> None:
+        """apply the buffered items if the burst is over; place this in `on_heartbeat`"""
+        if not self._pending:
+            return
+        if not force and self._last_message + self.idle > time():
+            return
+        items = list(self._pending.values())
+        self._pending.clear()
+        self.bursts += 1
+        self._apply(items)
@@ -5,21 +5,24 @@
 # standard libs
 from __future__ import annotations
 
-from dataclasses import asdict, astuple, dataclass, field
-from json import dumps
+from dataclasses import asdict, astuple, dataclass, field, fields
 from time import time, time_ns
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, FrozenSet, List, Optional, Sequence, Union
 
 # App libs
 import Domoticz
 import helpers
 from app.config import ZW164Config
+from app.mqtt.outbound import Priority, PublishScheduler
+from app.mqtt.subscriptions import SubscriptionManager
 from domoticz.responses import OnConnectResponse as OCTR
 from domoticz.responses import OnDisconnectResponse as ODTR
 from domoticz.responses import OnMessageResponse as OMER
 
+_UNDECODED = object()  # `MQTTResponse.json` not decoded yet
 
-@dataclass(frozen=True)
+
+@dataclass(frozen=True, **helpers.DATACLASS_SLOTS)
 class MQTTResponse:
     """Réponse MQTT"""
     # pylint:disable=invalid-name
@@ -33,13 +36,31 @@ class MQTTResponse:
     Retain: bool = field(default=False)
     Status: int = field(default=-1)
     Topic: str = field(default="")
-    Topics: List[str] = field(default_factory=list)
+    Topics: Sequence[str] = field(default=())  # no list allocated per message
     # pylint:enable=invalid-name
+    _json: Any = field(default=_UNDECODED, init=False, repr=False, compare=False)
+
+    @classmethod
+    def from_data(cls: type, data: Dict[str, Any]) -> MQTTResponse:
+        """build from `onMessage` datas; the unknown keys are ignored"""
+        return cls(**{key: value for key, value in data.items() if key in _RESPONSE_KEYS})
+
+    @property
+    def json(self: MQTTResponse) -> Any:
+        """the decoded `Payload`; decoded once, on first access"""
+        if self._json is _UNDECODED:
+            object.__setattr__(self, '_json', helpers.codec.loads(self.Payload))  # frozen
+        return self._json
 
     def is_success(self: MQTTResponse) -> bool:
         """check if message is success"""
         return not bool(self.Error)
 
+
+_RESPONSE_KEYS: FrozenSet[str] = frozenset(
+    response_field.name for response_field in fields(MQTTResponse) if response_field.init
+)
+
 # region - Mqtt command datas
 # pylint:disable=invalid-name
 
@@ -67,9 +88,9 @@ class _MqttBaseCommand:
         """
         return list(self.as_tuple())
 
-    def as_json(self: _MqttBaseCommand) -> str:
+    def as_json(self: _MqttBaseCommand) -> bytes:
         """return self as json"""
-        return dumps(self.as_dict())
+        return helpers.codec.dumps(self.as_dict())
 
 
 @dataclass
@@ -137,7 +158,7 @@ class MqttUnsubscribe(_MqttBaseCommand):
 class MqttPublish(_MqttBaseCommand):
     """MqttPublish"""
     Topic: str
-    Payload: str
+    Payload: bytes
     QoS: int = field(default=0)
 
     def __post_init__(self: MqttPublish) -> None:
@@ -152,14 +173,19 @@ class MqttPublish(_MqttBaseCommand):
 class Mqtt:
     """Les fonctions de base du serveur MQTT"""
 
-    def __init__(self: Mqtt) -> None:
-        """Initialisation de la classe"""
+    def __init__(self: Mqtt, latency: float = 0.5) -> None:
+        """Initialisation de la classe
+        @arg latency (float): delay of a coalesced publish, in seconds; plus up to
+        one heartbeat on a quiet bus (see `PublishScheduler`)
+        """
         self._conn: Optional[Domoticz.Connection] = None
         self._last_request_time = 0
         self._mqtt_connected = False
         self._mqtt_id = ''
         self._name = 'MQTT_ZW164'
         self._mqtt_error = False
+        self._outbound = PublishScheduler(latency)
+        self.subscriptions = SubscriptionManager(self.subscribe, self.unsubscribe)
         self._mqtt_conn = {
             'Name': self._name,
             **helpers.transport_protocol.TCP_IP_MQTT
@@ -195,7 +221,9 @@ class Mqtt:
         """place this in `on_stop`"""
         if isinstance(self._conn, Domoticz.Connection):
             if self._conn.Connected():
+                self.flush(flush_all=True)
                 self._conn.Send(MqttDisconnect().as_dict())
+        helpers.status(self._outbound)
 
     def on_connect(self: Mqtt, octr: OCTR) -> None:
         """place this in `on_connect`"""
@@ -208,19 +236,25 @@ class Mqtt:
     def on_message(self: Mqtt, omer: OMER) -> Optional[Any]:
         """place this in `on_message`"""
         self._last_request_time = time()
+        self.flush()
         if omer.connection is self._conn:
-            response = MQTTResponse(**omer.data)
+            response = MQTTResponse.from_data(omer.data)
             if response.Verb == 'CONNACK':  # follow CONNECT
                 if self._on_connack(response):
                     helpers.status('MQTT connection successfull!')
-                    # searching for zwave-js-ui command topic
-                    self.subscribe('zwave/_CLIENTS/#')
+                    # new session: subscribe again to the wanted topics
+                    self.subscriptions.reset()
+                    if not self.subscriptions:
+                        # searching for zwave-js-ui command topic
+                        self.subscriptions.add('zwave/_CLIENTS/#')
+                    self.subscriptions.apply()
             elif response.Verb == 'PUBLISH':  # server send message
                 return response
         return None
 
     def on_heartbeat(self: Mqtt) -> None:
         """place this in `on_heartbeat`"""
+        self.flush()
         if self._mqtt_connected and self._last_request_time + 5 < time():
             self._send_domoticz(MqttPing())
 
@@ -231,9 +265,27 @@ class Mqtt:
             if not self._mqtt_error:
                 self._conn.Connect()
 
-    def publish(self: Mqtt, topic: str, payload: Any) -> None:
-        """Publish new message on broker"""
-        self._send_domoticz(MqttPublish(topic, dumps(payload)))
+    def publish(
+            self: Mqtt, topic: str, payload: Any, coalesce: bool = False,
+            priority: Priority = Priority.INTERACTIVE, key: Optional[str] = None) -> None:
+        """Publish new message on broker
+        @arg coalesce (bool): last-write-wins; a burst on `topic` sends only its last value
+        @arg priority (Priority): `BACKGROUND` publishes are queued and rate limited
+        @arg key (str): coalescing key when several targets share `topic`
+        """
+        if coalesce or priority is Priority.BACKGROUND:
+            self._outbound.put(topic, payload, priority, key)
+            self.flush()
+        else:
+            self._outbound.send_now()
+            self._send_domoticz(MqttPublish(topic, helpers.codec.dumps(payload)))
+
+    def flush(self: Mqtt, flush_all: bool = False) -> None:
+        """publish the queued messages that are ready, interactive ones first"""
+        if not self._outbound:
+            return
+        for topic, payload in self._outbound.pop_ready(flush_all):
+            self._send_domoticz(MqttPublish(topic, helpers.codec.dumps(payload)))
 
     def subscribe(self: Mqtt, topic: Union[str, List[str]], qos: int = 0) -> None:
         """Subscribe to topic"""
@@ -256,10 +308,12 @@ class Mqtt:
             return
         self._send_domoticz(MqttSubscribe(topic_list))
 
-    def unsubscribe(self: Mqtt, topic: str) -> None:
+    def unsubscribe(self: Mqtt, topic: Union[str, List[str]]) -> None:
         """Unsubscribe topic from broker"""
         topic_list = []
-        if isinstance(topic, str):
+        if isinstance(topic, list):
+            topic_list.extend(topic)
+        elif isinstance(topic, str):
             topic_list.append(topic)
         else:
             helpers.error(
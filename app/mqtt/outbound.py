@@ -0,0 +1,174 @@
+# -*- coding: UTF-8 -*-
+"""MQTT outbound queue"""
+
+# standard libs
+from __future__ import annotations
+
+from collections import deque
+from dataclasses import dataclass, field
+from enum import IntEnum
+from time import time
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+
+class CoalescingQueue:
+    """Last-write-wins publish queue
+
+    A topic (or key) is published at most once per `latency` seconds: the first
+    publish goes out at once, the next ones wait for the end of the budget
+    and replace each other, so only the last value of a burst is sent.
+    """
+
+    def __init__(self: CoalescingQueue, latency: float = 0.5) -> None:
+        """initialisation de la classe"""
+        self.latency = latency
+        self.coalesced = 0
+        self.sent = 0
+        self._last_sent: Dict[str, float] = {}
+        # key: (due, topic, payload, first queued)
+        self._pending: Dict[str, Tuple[float, str, Any, float]] = {}
+
+    def __len__(self: CoalescingQueue) -> int:
+        """len() wrapper"""
+        return len(self._pending)
+
+    def __str__(self: CoalescingQueue) -> str:
+        """str() wrapper"""
+        return f'publish queue: {self.sent} sent, {self.coalesced} coalesced'
+
+    def put(
+            self: CoalescingQueue, topic: str, payload: Any,
+            key: Optional[str] = None) -> None:
+        """queue `payload` for `topic`; replaces the pending one
+        @arg key (str): coalescing key, `topic` by default
+        """
+        key = key or topic
+        pending = self._pending.get(key)
+        if pending is not None:
+            self._pending[key] = (pending[0], topic, payload, pending[3])
+            self.coalesced += 1
+            return
+        now = time()
+        due = self._last_sent.get(key, 0.0) + self.latency
+        self._pending[key] = (max(due, now), topic, payload, now)
+
+    def pop_due(
+            self: CoalescingQueue, flush_all: bool = False) -> List[Tuple[str, Any, float]]:
+        """@return the (topic, payload, queued time) to publish now"""
+        now = time()
+        due = [
+            key for key, pending in self._pending.items()
+            if flush_all or pending[0] <= now
+        ]
+        for key in due:
+            self._last_sent[key] = now
+        self.sent += len(due)
+        return [self._pending.pop(key)[1:] for key in due]
+
+
+class Priority(IntEnum):
+    """Publish priority classes"""
+    INTERACTIVE = 0  # user commands
+    BACKGROUND = 1  # discovery traffic
+
+
+class TokenBucket:
+    """`rate` tokens per second, up to `burst` tokens"""
+
+    def __init__(self: TokenBucket, rate: float, burst: int) -> None:
+        """initialisation de la classe"""
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time()
+
+    def take(self: TokenBucket) -> bool:
+        """@return `True` if a token was available (and taken)"""
+        now = time()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+
+@dataclass
+class WaitStats:
+    """Queue wait of a priority class"""
+    count: int = field(default=0)
+    total: float = field(default=0.0)
+    worst: float = field(default=0.0)
+
+    def add(self: WaitStats, wait: float) -> None:
+        """record a wait, in seconds"""
+        self.count += 1
+        self.total += wait
+        self.worst = max(self.worst, wait)
+
+    def __str__(self: WaitStats) -> str:
+        """str() wrapper"""
+        mean = self.total / self.count if self.count else 0.0
+        return f'{self.count} sent, wait mean {mean * 1000:.0f}ms max {self.worst * 1000:.0f}ms'
+
+
+class PublishScheduler:
+    """Priority aware publish scheduler
+
+    The interactive publishes always go first; the background ones wait in
+    a FIFO and are released by a token bucket, so a discovery burst can't
+    delay a user command nor flood the link.
+
+    The plugin has no timer finer than its heartbeat (1s): `pop_ready` runs
+    on every incoming message, publish and heartbeat. A queued publish goes
+    out at the first of them after it is due, so on a quiet bus a coalesced
+    publish waits up to `latency` + 1s, and the background traffic is capped
+    at `background_burst` per heartbeat. During a discovery every gateway
+    reply triggers a flush, and the `background_rate` applies.
+    """
+
+    def __init__(
+            self: PublishScheduler, latency: float = 0.5,
+            background_rate: float = 10.0, background_burst: int = 8) -> None:
+        """initialisation de la classe"""
+        self.interactive = CoalescingQueue(latency)
+        self.stats: Dict[Priority, WaitStats] = {prio: WaitStats() for prio in Priority}
+        self._background: Deque[Tuple[float, str, Any]] = deque()
+        self._bucket = TokenBucket(background_rate, background_burst)
+
+    def __len__(self: PublishScheduler) -> int:
+        """len() wrapper"""
+        return len(self.interactive) + len(self._background)
+
+    def __str__(self: PublishScheduler) -> str:
+        """str() wrapper"""
+        return ', '.join([
+            str(self.interactive),
+            *(f'{prio.name.lower()}: {stats}' for prio, stats in self.stats.items())
+        ])
+
+    def send_now(self: PublishScheduler) -> None:
+        """an interactive publish sent without queueing"""
+        self.stats[Priority.INTERACTIVE].add(0.0)
+
+    def put(
+            self: PublishScheduler, topic: str, payload: Any,
+            priority: Priority = Priority.INTERACTIVE, key: Optional[str] = None) -> None:
+        """queue a publish; interactive ones are coalesced per topic (or `key`)"""
+        if priority is Priority.INTERACTIVE:
+            self.interactive.put(topic, payload, key)
+        else:
+            self._background.append((time(), topic, payload))
+
+    def pop_ready(self: PublishScheduler, flush_all: bool = False) -> List[Tuple[str, Any]]:
+        """@return the (topic, payload) to publish now, by priority"""
+        now = time()
+        ready = []
+        for topic, payload, queued_at in self.interactive.pop_due(flush_all):
+            self.stats[Priority.INTERACTIVE].add(now - queued_at)
+            ready.append((topic, payload))
+        while self._background and (flush_all or self._bucket.take()):
+            queued_at, topic, payload = self._background.popleft()
+            self.stats[Priority.BACKGROUND].add(now - queued_at)
+            ready.append((topic, payload))
+        return ready
@@ -0,0 +1,120 @@
+# -*- coding: UTF-8 -*-
+"""MQTT topic router"""
+
+# standard libs
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# plugin libs
+import helpers
+
+TopicParser = Callable[[str, List[str]], Any]
+TopicHandler = Callable[[Any, Any], None]
+
+ROUTES_CACHE_SIZE = 4096  # topics; the retained values of ~300 endpoints
+
+
+class _TrieNode:
+    """Noeud de l'arbre des abonnements"""
+    __slots__ = ('children', 'handlers', 'multi_handlers')
+
+    def __init__(self: _TrieNode) -> None:
+        """initialisation de la classe"""
+        self.children: Dict[str, _TrieNode] = {}
+        self.handlers: List[TopicHandler] = []
+        self.multi_handlers: List[TopicHandler] = []
+
+
+class TopicRouter:
+    """Compiled MQTT subscription patterns
+
+    Patterns (with `+` and `#` wildcards) are compiled into a trie; each
+    incoming topic is split once, parsed once by `parser` into a typed
+    record, and sent to every matching handler as `handler(record, message)`.
+    The handlers and the (immutable) record are then cached per topic: the
+    same topics come back at every value change and retained replay.
+    """
+
+    def __init__(self: TopicRouter, parser: Optional[TopicParser] = None) -> None:
+        """initialisation de la classe"""
+        self._root = _TrieNode()
+        self._parser = parser
+        self._routes: Dict[str, Tuple[List[TopicHandler], Any]] = {}
+
+    def register(self: TopicRouter, pattern: str, handler: TopicHandler) -> None:
+        """register `handler` for the subscription `pattern`"""
+        levels = pattern.split('/')
+        node = self._root
+        for index, level in enumerate(levels):
+            if level == '#':
+                if index != len(levels) - 1:
+                    raise ValueError(f"'#' must be the last level: {pattern}")
+                node.multi_handlers.append(handler)
+                self._routes.clear()
+                return
+            child = node.children.get(level)
+            if child is None:
+                child = node.children[level] = _TrieNode()
+            node = child
+        node.handlers.append(handler)
+        self._routes.clear()
+
+    def match(self: TopicRouter, levels: List[str]) -> List[TopicHandler]:
+        """@return the handlers matching the splitted topic `levels`"""
+        matches: List[TopicHandler] = []
+        stack: List[Tuple[_TrieNode, int]] = [(self._root, 0)]
+        depth = len(levels)
+        while stack:
+            node, index = stack.pop()
+            matches.extend(node.multi_handlers)
+            if index == depth:
+                matches.extend(node.handlers)
+                continue
+            child = node.children.get(levels[index])
+            if child is not None:
+                stack.append((child, index + 1))
+            child = node.children.get('+')
+            if child is not None:
+                stack.append((child, index + 1))
+        return matches
+
+    def route(self: TopicRouter, topic: str, message: Any) -> bool:
+        """dispatch `message` received on `topic`
+        @return `True` if at least one handler was called
+        """
+        route = self._routes.get(topic)
+        if route is None:
+            route = self._compile_route(topic)
+        handlers, record = route
+        if not handlers:
+            return False
+        for handler in handlers:
+            handler(record, message)
+        return True
+
+    def prepare(self: TopicRouter, topics: Iterable[str]) -> None:
+        """compile the routes of `topics` ahead of their first message"""
+        for topic in topics:
+            if topic not in self._routes:
+                self._compile_route(topic)
+
+    def _compile_route(
+            self: TopicRouter, topic: str) -> Tuple[List[TopicHandler], Any]:
+        """match and parse `topic`, then cache the result
+        @return (handlers, record); no handlers if the topic can't be parsed
+        """
+        levels = topic.split('/')
+        handlers = self.match(levels)
+        record = levels
+        if handlers and self._parser is not None:
+            try:
+                record = self._parser(topic, levels)
+            except ValueError as exc:
+                # logged once: cached below without handlers
+                helpers.error(f'<TopicRouter.route> Unexpected topic: {topic} ({exc})')
+                handlers, record = [], None
+        if len(self._routes) >= ROUTES_CACHE_SIZE:
+            self._routes.clear()
+        self._routes[topic] = (handlers, record)
+        return handlers, record
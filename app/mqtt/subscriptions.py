@@ -0,0 +1,57 @@
+# -*- coding: UTF-8 -*-
+"""MQTT subscriptions manager"""
+
+# standard libs
+from __future__ import annotations
+
+from typing import Callable, List, Set
+
+TopicsSender = Callable[[List[str]], None]
+
+
+class SubscriptionManager:
+    """Keep the broker subscriptions in line with the wanted topics
+
+    The changes are only recorded by `add`/`discard`; `apply` sends them
+    as one SUBSCRIBE and one UNSUBSCRIBE packet at most.
+    """
+
+    def __init__(
+            self: SubscriptionManager, subscribe: TopicsSender,
+            unsubscribe: TopicsSender) -> None:
+        """initialisation de la classe"""
+        self._subscribe = subscribe
+        self._unsubscribe = unsubscribe
+        self._subscribed: Set[str] = set()
+        self._wanted: Set[str] = set()
+
+    def __bool__(self: SubscriptionManager) -> bool:
+        """bool wrapper; `True` if some topics are wanted"""
+        return bool(self._wanted)
+
+    def __contains__(self: SubscriptionManager, topic: str) -> bool:
+        """in wrapper"""
+        return topic in self._wanted
+
+    def add(self: SubscriptionManager, *topics: str) -> None:
+        """want `topics`"""
+        self._wanted.update(topics)
+
+    def discard(self: SubscriptionManager, *topics: str) -> None:
+        """don't want `topics` anymore"""
+        self._wanted.difference_update(topics)
+
+    def apply(self: SubscriptionManager) -> None:
+        """send the pending changes to the broker"""
+        to_subscribe = sorted(self._wanted - self._subscribed)
+        to_unsubscribe = sorted(self._subscribed - self._wanted)
+        # subscribe first: no gap for the topics moving to a narrower filter
+        if to_subscribe:
+            self._subscribe(to_subscribe)
+        if to_unsubscribe:
+            self._unsubscribe(to_unsubscribe)
+        self._subscribed = set(self._wanted)
+
+    def reset(self: SubscriptionManager) -> None:
+        """new broker session: nothing is subscribed anymore"""
+        self._subscribed.clear()
@@ -5,17 +5,16 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Any, Callable, Dict, List, Optional, Union
-from urllib.parse import quote
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 # plugin libs
-from app.plan import http
-from Domoticz import Connection
+from app.config import ZW164Config
+from app.jsonapi.jsonapi import ApiRequest, JsonApiClient, parse_endpoint
+from app.jsonapi import http
 from domoticz.responses import OnConnectResponse as OCTR
 from domoticz.responses import OnDisconnectResponse as ODTR
 from domoticz.responses import OnMessageResponse as OMER
 from helpers import error, status
-from helpers.plugin_config import PluginConfig
 
 # pylint:disable=invalid-name
 
@@ -30,6 +29,15 @@ class GetPlanDevicesData:
     order: str  # "284"
     type: int  # 0
 
+    @staticmethod
+    def from_result(item: Dict[str, Any]) -> Optional[Tuple[int, int]]:
+        """`keep` filter for the getplandevices result
+        @return (devidx, idx) of the devices; `None` for the scenes
+        """
+        if int(item.get('type', 0)) != 0:
+            return None
+        return int(item['devidx']), int(item['idx'])
+
 
 @dataclass
 class PlanDatas:
@@ -46,22 +54,19 @@ class Plan:
     Use it as a class extension.
     Below you find see a functional automation class.
     """
-    HEADERS = {
-        'Accept': 'application/json',
-        'Accept-Charset': 'utf-8',
-        'Accept-Encoding': 'gzip',
-        'Connection': 'keep-alive',
-        'Host': '127.0.0.1',
-        'User-Agent': f'Domoticz/{PluginConfig.domoticz_version}'
-    }
 
     def __init__(self: Plan) -> None:
         """initialisation de la classe"""
-        self._con: Optional[Connection] = None
+        self._api: Optional[JsonApiClient] = None
+        self._confirming = False
         self._devices = set()
-        self._finished = False
-        self._plan_devices = set()
+        self._pending_responses = 0
+        self._plan_devices: Dict[int, int] = {}  # devidx: plan device idx
         self._plan_id = 0
+        self._plan_id_checked = False
+        self._resync = False
+        self._stale_devices = set()
+        self._syncing = False
         self.plan_name = ""
 
     def add_device(self: Plan, device_list: Union[List[int], int]) -> None:
@@ -69,58 +74,82 @@ class Plan:
         @arg device_list (List[int]): liste des device idx de Domoticz
         """
         if isinstance(device_list, int):
-            self._finished = False
             self._devices.add(device_list)
-            self._connect(self._getplandevices_call)
         elif isinstance(device_list, list):
-            self._finished = False
             self._devices.update(device_list)
-            self._connect(self._getplandevices_call)
         else:
             error(
                 '<Plan.add_device>',
                 f'Unknown model datas: ({type(device_list)}){device_list}'
             )
+            return
+        self._sync()
 
-    # region -> private methods
-    def _connect(self: Plan, allready_conneted_callback: Optional[Callable] = None) -> None:
-        """_connect"""
-        if self.plan_name:
-            if not self._con.Connected():
-                self._con.Connect()
-            elif callable(allready_conneted_callback):
-                allready_conneted_callback()
+    def sync_devices(self: Plan, device_list: List[int]) -> None:
+        """the plan must contain exactly the devices of `device_list`
+        the devices previously added and missing from `device_list` are removed
+        """
+        self._stale_devices |= self._devices - set(device_list)
+        self._devices = set(device_list)
+        self._sync()
 
-    def _check_con(self: Plan, connection: Connection) -> bool:
-        """_check_con"""
-        if self.plan_name:
-            if connection is self._con:
-                if self._con.Connected():
-                    return True
-        return False
-
-    def _call_response(self: Plan, http_datas: http.HData) -> None:
-        """_call_response"""
-        method_name = '_' + http_datas.title.lower() + '_response'
-        if hasattr(self, method_name):
-            getattr(self, method_name)(http_datas)
+    # region -> private methods
+    def _sync(self: Plan) -> None:
+        """start the plan synchronisation; queued if one is running"""
+        if self._api is None:
+            return
+        if self._syncing:
+            self._resync = True
+            return
+        self._syncing = True
+        if self._plan_id == 0:
+            self._plans_call()
         else:
-            error(
-                f'<Plan._call_response> Unknown method: {method_name}',
-                http_datas.result
-            )
+            self._getplandevices_call()
+
+    def _sync_finished(self: Plan) -> None:
+        """end of the synchronisation"""
+        self._confirming = False
+        self._syncing = False
+        self._stale_devices &= set(self._plan_devices)
+        if self._resync:
+            self._resync = False
+            self._sync()
+            return
+        if self._devices.issubset(self._plan_devices) and len(self._devices) > 0:
+            status(f'All devices added to {self.plan_name} location')
+
+    def _sync_failed(self: Plan, _request: ApiRequest) -> None:
+        """a request of the synchronisation has failed"""
+        self._confirming = False
+        self._pending_responses = 0
+        self._syncing = False
+        self._resync = False
+
+    def _load_plan_id(self: Plan) -> None:
+        """read the cached plan id; valid only for the same plan name"""
+        with ZW164Config() as pcf:
+            if self.plan_name and pcf.plan_name == self.plan_name:
+                self._plan_id = pcf.plan_id
+        self._plan_id_checked = False
+
+    def _set_plan_id(self: Plan, plan_id: int) -> None:
+        """set and cache the plan id"""
+        self._plan_id = plan_id
+        self._plan_id_checked = True
+        with ZW164Config() as pcf:
+            pcf.plan_id = plan_id
+            pcf.plan_name = self.plan_name if plan_id else ''
 
     def _plans_call(self: Plan) -> None:
         """_plans_call
-        # Headers = {"Connection": "keep-alive", "Accept": "Content-Type: text/html; charset=UTF-8"}
-        # myConn.Send({"Verb":"GET", "URL":"/page.html", "Headers": Headers})
+        /json.htm?type=plans
         """
-        self._con.Send(
-            {
-                'Verb': 'GET',
-                'URL': '/json.htm?type=plans',
-                'Headers': self.HEADERS
-            }
+        self._api.call(
+            {'type': 'plans'},
+            self._plans_response,
+            self._sync_failed,
+            keep=lambda plan: plan if plan.get('Name') == self.plan_name else None
         )
 
     def _plans_response(self: Plan, http_datas: http.HData) -> None:
@@ -128,7 +157,7 @@ class Plan:
         for plan in http_datas.result:
             plan = PlanDatas(**plan)
             if plan.Name == self.plan_name:
-                self._plan_id = plan.idx
+                self._set_plan_id(int(plan.idx))
                 status(
                     f'Plan id acquired: ({self._plan_id}){plan.Name}'
                 )
@@ -140,13 +169,13 @@ class Plan:
             self._getplandevices_call()
 
     def _addplan_call(self: Plan) -> None:
-        """_addplan_call"""
-        self._con.Send(
-            {
-                'Verb': 'GET',
-                "URL": f'/json.htm?name={quote(self.plan_name)}&param=addplan&type=command',
-                'Headers': self.HEADERS
-            }
+        """_addplan_call
+        /json.htm?name=<plan_name>&param=addplan&type=command
+        """
+        self._api.call(
+            {'name': self.plan_name, 'param': 'addplan', 'type': 'command'},
+            self._addplan_response,
+            self._sync_failed
         )
         status(f'Creating plan {self.plan_name}')
 
@@ -158,66 +187,96 @@ class Plan:
         """_deleteplan_call
         /json.htm?idx=<plan_id>&param=deleteplan&type=command
         """
-        self._con.Send(
-            {
-                'Verb': 'GET',
-                "URL": f'/json.htm?idx={self._plan_id}&param=deleteplan&type=command',
-                'Headers': self.HEADERS
-            }
+        self._api.call(
+            {'idx': self._plan_id, 'param': 'deleteplan', 'type': 'command'},
+            self._deleteplan_response
         )
 
     def _deleteplan_response(self: Plan, _http_datas: http.HData) -> None:
         """_deleteplan_response"""
-        self._plan_id = 0
+        self._set_plan_id(0)
         status(f'Plan deleted {self.plan_name}')
 
-    def _addplanactivedevice_call(self: Plan) -> None:
-        """_addplanactivedevice_add
+    def _addplanactivedevice_call(self: Plan, device_idx: int) -> None:
+        """_addplanactivedevice_call
         /json.htm?activeidx=1034&activetype=0&idx=21&param=addplanactivedevice&type=command
         """
-        next_devices = self._devices - self._plan_devices
-        if len(next_devices) > 0:
-            self._con.Send(
-                {
-                    'Verb': 'GET',
-                    "URL": ''.join([
-                        f'/json.htm?activeidx={min(next_devices)}',
-                        f'&activetype=0&idx={self._plan_id}',
-                        '&param=addplanactivedevice&type=command'
-                    ]),
-                    'Headers': self.HEADERS
-                }
-            )
-        else:  # finished
-            self._finished = True
-            self._con.Disconnect()
-            if self._devices == self._plan_devices and len(self._plan_devices) > 0:
-                status(f'All devices added to {self.plan_name} location')
+        self._api.call(
+            {
+                'activeidx': device_idx,
+                'activetype': 0,
+                'idx': self._plan_id,
+                'param': 'addplanactivedevice',
+                'type': 'command'
+            },
+            self._on_pipelined_response,
+            self._on_pipelined_response
+        )
+
+    def _deleteplandevice_call(self: Plan, plan_device_idx: int) -> None:
+        """_deleteplandevice_call
+        /json.htm?idx=278&param=deleteplandevice&type=command
+        """
+        self._api.call(
+            {'idx': plan_device_idx, 'param': 'deleteplandevice', 'type': 'command'},
+            self._on_pipelined_response,
+            self._on_pipelined_response
+        )
 
-    def _addplanactivedevice_response(self: Plan, _http_datas: http.HData) -> None:
-        """_addplanactivedevice_response"""
-        self._getplandevices_call()
+    def _on_pipelined_response(self: Plan, _response: Any) -> None:
+        """count the add/delete responses (or failures); confirm with a final read"""
+        self._pending_responses -= 1
+        if self._pending_responses <= 0:
+            self._pending_responses = 0
+            self._getplandevices_call()
 
     def _getplandevices_call(self: Plan) -> None:
         """_getplandevices_call
         /json.htm?idx=21&param=getplandevices&type=command
         """
-        self._con.Send(
-            {
-                'Verb': 'GET',
-                "URL": f'/json.htm?idx={self._plan_id}&param=getplandevices&type=command',
-                'Headers': self.HEADERS
-            }
+        self._api.call(
+            {'idx': self._plan_id, 'param': 'getplandevices', 'type': 'command'},
+            self._getplandevices_response,
+            self._sync_failed,
+            keep=GetPlanDevicesData.from_result
         )
 
+    def _is_own_plan(self: Plan, plan_devices: List[Tuple[int, int]]) -> bool:
+        """the plan holds one of our devices
+        JSON/API has no request giving the name of a single plan: the cached id
+        is trusted when its plan already holds one of the plugin devices
+        """
+        return any(devidx in self._devices for devidx, _idx in plan_devices)
+
     def _getplandevices_response(self: Plan, http_datas: http.HData) -> None:
-        """_getplandevices_response"""
-        for item in http_datas.result:
-            datas = GetPlanDevicesData(**item)
-            devidx = int(datas.devidx)
-            if devidx not in self._plan_devices:
-                self._plan_devices.add(int(devidx))
-        self._addplanactivedevice_call()
+        """_getplandevices_response
+        compute the add/remove diff and pipeline the requests on the connection
+        """
+        if not self._plan_id_checked:
+            if not self._is_own_plan(http_datas.result):
+                # no device of ours (empty, unknown or reused id): check the name
+                self._plan_id = 0
+                self._plans_call()
+                return
+            self._plan_id_checked = True
+            status(f'Plan id from cache: ({self._plan_id}){self.plan_name}')
+        self._plan_devices = dict(http_datas.result)
+        to_add = self._devices - set(self._plan_devices)
+        to_remove = self._stale_devices & set(self._plan_devices)
+        if self._confirming or not (to_add or to_remove):
+            if to_add or to_remove:
+                error(
+                    f'<Plan._getplandevices_response> {self.plan_name} not synchronised',
+                    f'missing: {sorted(to_add)}, stale: {sorted(to_remove)}'
+                )
+            self._sync_finished()
+            return
+        self._confirming = True
+        self._pending_responses = len(to_add) + len(to_remove)
+        for device_idx in sorted(to_add):
+            self._addplanactivedevice_call(device_idx)
+        for device_idx in sorted(to_remove):
+            self._deleteplandevice_call(self._plan_devices[device_idx])
     # endregion
 
 
@@ -228,41 +287,39 @@ class PlanAutomation(Plan):
         """initialisation de la classe"""
         Plan.__init__(self)
 
-    def on_start(self: PlanAutomation, parameters: Dict[str, Any]) -> None:
-        """on_start"""
+    def on_start(
+            self: PlanAutomation, parameters: Dict[str, Any],
+            device_list: Optional[List[int]] = None) -> None:
+        """on_start
+        @arg device_list (List[int]): the device idx already created
+        """
         self.plan_name = parameters.get('Mode1')
         if self.plan_name:
-            self._con = Connection(
-                self.plan_name + '_API_PLAN',
-                'TCP/IP',
-                'HTTP',
-                Address='127.0.0.1',
-                Port='8080'
+            self._devices.update(device_list or [])
+            self._load_plan_id()
+            self._api = JsonApiClient(
+                self.plan_name + '_API_PLAN', *parse_endpoint(parameters.get('Mode4'))
             )
-            self._connect()
+            self._sync()
         else:
             status("No plan! Don't forget to add your devices.")
 
     def on_connect(self: PlanAutomation, octr: OCTR) -> None:
         """on_connect"""
-        if self._check_con(octr.connection):
+        if self._api is not None and self._api.on_connect(octr):
             status('API plan connection successfull!')
-            if self._plan_id == 0:
-                self._plans_call()
-            else:
-                self._getplandevices_call()
 
     def on_disconnect(self: PlanAutomation, odtr: ODTR) -> None:
         """on_disconnect"""
-        if self._check_con(odtr.connection):
-            if not self._finished:
-                self._con.Connect()
+        if self._api is not None:
+            self._api.on_disconnect(odtr)
 
     def on_message(self: PlanAutomation, omer: OMER) -> None:
         """on_message"""
-        if self._check_con(omer.connection):
-            http_response = http.Response(**omer.data)
-            if http_response:
-                http_datas = http_response.datas
-                if http_datas:
-                    self._call_response(http_datas)
+        if self._api is not None:
+            self._api.on_message(omer)
+
+    def on_heartbeat(self: PlanAutomation) -> None:
+        """on_heartbeat"""
+        if self._api is not None:
+            self._api.on_heartbeat()
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+"""Zwave gateway `sendCommand` correlator"""
+
+# standard libs
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from time import time
+from typing import Any, Callable, Dict, List, Optional
+
+# plugin libs
+import helpers
+from app.zwave.zwave import SendCommandResult
+
+CALL_ID = 'callId'  # payload key; echoed back by the gateway in `origin`
+
+CallSender = Callable[['GatewayCall'], None]
+CallCallback = Callable[[SendCommandResult], None]
+CallErrback = Callable[['GatewayCall'], None]
+
+
+@dataclass
+class GatewayCall:
+    """A tagged `sendCommand` request"""
+    call_id: int
+    payload: Dict[str, Any]
+    callback: Optional[CallCallback] = field(default=None, repr=False)
+    on_error: Optional[CallErrback] = field(default=None, repr=False)
+    background: bool = field(default=False)
+    key: Optional[str] = field(default=None)
+    max_retries: int = field(default=0)
+    retries: int = field(default=0)
+    first_sent_at: float = field(default=0.0)
+    sent_at: float = field(default=0.0)
+
+    @property
+    def node_id(self: GatewayCall) -> int:
+        """target node"""
+        return self.payload['args'][0].get('nodeId')
+
+    @property
+    def command(self: GatewayCall) -> str:
+        """command name"""
+        return self.payload['args'][1]
+
+    @property
+    def args(self: GatewayCall) -> List[Any]:
+        """command arguments"""
+        return self.payload['args'][2]
+
+
+@dataclass
+class _CommandStats:
+    """Latency statistics of a gateway command"""
+    count: int = field(default=0)
+    total: float = field(default=0.0)
+    worst: float = field(default=0.0)
+    timeouts: int = field(default=0)
+    failures: int = field(default=0)
+
+    def add(self: _CommandStats, latency: float) -> None:
+        """record a reply latency, in seconds"""
+        self.count += 1
+        self.total += latency
+        self.worst = max(self.worst, latency)
+
+    def __str__(self: _CommandStats) -> str:
+        """str() wrapper"""
+        mean = self.total / self.count if self.count else 0.0
+        return (
+            f'{self.count} replies, latency mean {mean * 1000:.0f}ms'
+            f' max {self.worst * 1000:.0f}ms, {self.timeouts} timeouts,'
+            f' {self.failures} failures'
+        )
+
+
+class CommandCorrelator:
+    """Match the gateway `sendCommand` results to their requests
+
+    Every request is tagged with a `callId`, that the gateway echoes in the
+    result `origin`; untagged results are matched on (node, command, args).
+    The calls without reply are retried (or failed) by `check_timeouts`, as
+    are the unsuccessful results. A new call with the `key` of a pending one
+    supersedes it.
+    """
+
+    def __init__(
+            self: CommandCorrelator, send: CallSender,
+            timeout: float = 10.0, max_retries: int = 3) -> None:
+        """initialisation de la classe
+        @arg send: publish a call on the gateway command topic
+        """
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.stats: Dict[str, _CommandStats] = {}
+        self._by_key: Dict[str, int] = {}
+        self._in_flight: Dict[int, GatewayCall] = {}
+        self._next_id = 0
+        self._send = send
+
+    def __str__(self: CommandCorrelator) -> str:
+        """str() wrapper"""
+        return ', '.join(
+            f'{command}: {stats}' for command, stats in sorted(self.stats.items())
+        ) or 'no gateway command'
+
+    def __len__(self: CommandCorrelator) -> int:
+        """len() wrapper"""
+        return len(self._in_flight)
+
+    def call(
+            self: CommandCorrelator, payload: Dict[str, Any],
+            callback: Optional[CallCallback] = None,
+            on_error: Optional[CallErrback] = None,
+            background: bool = False, key: Optional[str] = None,
+            max_retries: Optional[int] = None) -> GatewayCall:
+        """tag and send a `sendCommand` payload (see `send_command_payload`)
+        @arg callback: called with the successful result
+        @arg on_error: called when the call has failed
+        """
+        self._next_id += 1
+        call = GatewayCall(
+            self._next_id,
+            {**payload, CALL_ID: self._next_id},
+            callback,
+            on_error,
+            background,
+            key,
+            self.max_retries if max_retries is None else max_retries
+        )
+        if key is not None:
+            superseded = self._by_key.get(key)
+            if superseded is not None:
+                self._in_flight.pop(superseded, None)
+            self._by_key[key] = call.call_id
+        self._in_flight[call.call_id] = call
+        call.first_sent_at = time()
+        self._transmit(call)
+        return call
+
+    def cancel(self: CommandCorrelator, key: str) -> None:
+        """forget the pending call of `key`; superseded by another publish"""
+        call_id = self._by_key.pop(key, None)
+        if call_id is not None:
+            self._in_flight.pop(call_id, None)
+
+    def resolve(self: CommandCorrelator, results: SendCommandResult) -> bool:
+        """handle a gateway `sendCommand` result
+        @return `True` if the result matched a call in flight
+        """
+        call = self._in_flight.get((results.origin or {}).get(CALL_ID))
+        if call is None:
+            call = self._match(results)
+        if call is None:
+            return False
+        if not results.success:
+            helpers.debug(f'{call.command}{call.args} on node {call.node_id}: {results.message}')
+            self._retry(call)
+            return True
+        self._forget(call)
+        self._stats(call.command).add(time() - call.first_sent_at)
+        if callable(call.callback):
+            call.callback(results)
+        return True
+
+    def check_timeouts(self: CommandCorrelator) -> None:
+        """retry the calls without reply; place this in `on_heartbeat`"""
+        deadline = time() - self.timeout
+        for call in list(self._in_flight.values()):
+            if call.sent_at < deadline:
+                self._stats(call.command).timeouts += 1
+                self._retry(call)
+
+    def _match(self: CommandCorrelator, results: SendCommandResult) -> Optional[GatewayCall]:
+        """match an untagged result on (node, command, args)"""
+        for call in self._in_flight.values():
+            if (call.node_id, call.command, call.args) == (
+                    results.node_id, results.command, results.command_args):
+                return call
+        return None
+
+    def _transmit(self: CommandCorrelator, call: GatewayCall) -> None:
+        """(re)send `call`"""
+        call.sent_at = time()
+        self._send(call)
+
+    def _retry(self: CommandCorrelator, call: GatewayCall) -> None:
+        """send `call` again or fail it"""
+        if call.retries < call.max_retries:
+            call.retries += 1
+            self._transmit(call)
+            return
+        self._forget(call)
+        self._stats(call.command).failures += 1
+        helpers.error(
+            f'Node {call.node_id} - {call.command}{call.args} failed'
+            f' after {call.retries} retries'
+        )
+        if callable(call.on_error):
+            call.on_error(call)
+
+    def _forget(self: CommandCorrelator, call: GatewayCall) -> None:
+        """remove `call` from the calls in flight"""
+        self._in_flight.pop(call.call_id, None)
+        if call.key is not None and self._by_key.get(call.key) == call.call_id:
+            del self._by_key[call.key]
+
+    def _stats(self: CommandCorrelator, command: str) -> _CommandStats:
+        """the statistics of `command`"""
+        return self.stats.setdefault(command, _CommandStats())
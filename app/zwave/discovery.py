@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+"""Zwave soundswitch tones discovery"""
+
+# standard libs
+from __future__ import annotations
+
+from collections import deque
+from dataclasses import dataclass, field
+from time import time
+from typing import Any, Callable, Deque, Dict, List, Set
+
+# plugin libs
+import helpers
+from app.zwave.correlator import CommandCorrelator, GatewayCall
+from app.zwave.zwave import SendCommandResult, send_command_payload
+
+DiscoveryCallback = Callable[[SendCommandResult, bool], None]
+DiscoveryErrback = Callable[[int], None]
+
+
+@dataclass
+class _DiscoveryRequest:
+    """A `getToneCount`/`getToneInfo` request"""
+    node_id: int
+    command: str
+    args: List[Any]
+
+
+@dataclass
+class _NodeDiscovery:
+    """Discovery progress of one node"""
+    node_id: int
+    started_at: float = field(default_factory=time)
+    tones_count: int = field(default=-1)
+    missing: Set[int] = field(default_factory=set)
+
+    def is_complete(self: _NodeDiscovery) -> bool:
+        """every tone info has been received"""
+        return self.tones_count >= 0 and not self.missing
+
+
+class ToneDiscovery:
+    """Pipelined tones discovery
+
+    Keeps up to `window` `getToneCount`/`getToneInfo` requests in flight,
+    for every node at once. The requests go through the gateway commands
+    correlator, which retries the missing replies.
+    """
+
+    def __init__(
+            self: ToneDiscovery, correlator: CommandCorrelator,
+            on_result: DiscoveryCallback, on_failed: DiscoveryErrback,
+            window: int = 8) -> None:
+        """initialisation de la classe
+        @arg on_result: called with every result and `True` if it completes the node
+        @arg on_failed: called with the node id of a given up discovery
+        """
+        self.window = window
+        self._correlator = correlator
+        self._in_flight = 0
+        self._nodes: Dict[int, _NodeDiscovery] = {}
+        self._on_failed_node = on_failed
+        self._on_result = on_result
+        self._queue: Deque[_DiscoveryRequest] = deque()
+
+    def on_start(self: ToneDiscovery, parameters: Dict[str, Any]) -> None:
+        """on_start"""
+        try:
+            self.window = max(1, int(parameters.get('Mode2') or self.window))
+        except ValueError:
+            helpers.error(
+                f'Invalid discovery window: {parameters.get("Mode2")}; using {self.window}'
+            )
+
+    def start(self: ToneDiscovery, node_id: int) -> None:
+        """start the discovery of `node_id`"""
+        if node_id in self._nodes:
+            return
+        self._nodes[node_id] = _NodeDiscovery(node_id)
+        self._queue.append(_DiscoveryRequest(node_id, 'getToneCount', []))
+        self._pump()
+
+    def is_running(self: ToneDiscovery, node_id: int) -> bool:
+        """is `node_id` under discovery"""
+        return node_id in self._nodes
+
+    def _pump(self: ToneDiscovery) -> None:
+        """send the queued requests to fill the window"""
+        while self._queue and self._in_flight < self.window:
+            request = self._queue.popleft()
+            if request.node_id not in self._nodes:  # given up
+                continue
+            self._in_flight += 1
+            self._correlator.call(
+                send_command_payload(request.node_id, request.command, request.args),
+                self._on_reply,
+                self._on_failed,
+                background=True
+            )
+
+    def _on_reply(self: ToneDiscovery, results: SendCommandResult) -> None:
+        """a `getToneCount`/`getToneInfo` result"""
+        self._in_flight -= 1
+        node = self._nodes.get(results.node_id)
+        completed = False
+        if node is not None:
+            if results.command == 'getToneCount' and isinstance(results.result, int):
+                node.tones_count = results.result
+                node.missing = set(range(1, results.result + 1))
+                for tone_id in sorted(node.missing):
+                    self._queue.append(
+                        _DiscoveryRequest(node.node_id, 'getToneInfo', [tone_id])
+                    )
+            elif results.command == 'getToneInfo' and isinstance(results.result, dict):
+                node.missing.discard(results.command_args[0])
+            if node.is_complete():
+                helpers.status(
+                    f'Node {node.node_id} - {node.tones_count} tones discovered'
+                    f' in {time() - node.started_at:.2f}s'
+                )
+                del self._nodes[node.node_id]
+                completed = True
+        self._pump()
+        self._on_result(results, completed)
+
+    def _on_failed(self: ToneDiscovery, call: GatewayCall) -> None:
+        """no reply after the retries: the node discovery is given up"""
+        self._in_flight -= 1
+        given_up = self._nodes.pop(call.node_id, None) is not None
+        if given_up:
+            helpers.error(f'Node {call.node_id} - tones discovery given up')
+        self._pump()
+        if given_up:
+            self._on_failed_node(call.node_id)
@@ -4,16 +4,22 @@
 # standard libs
 from __future__ import annotations
 
+from collections.abc import Mapping
 from dataclasses import dataclass, field
 from enum import Enum, unique
-from json import loads
-from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Union
+from time import time
+from typing import (Any, Dict, Iterable, Iterator, List, NamedTuple, Optional,
+                    Set, Tuple, Union)
 
 # plugin libs
 import helpers
-from app.zwave.zwave import SendCommandResult
+from app.zwave.zwave import (SendCommandResult, ZwaveGateway, ZwaveTopic,
+                             multicast_payload, send_command_payload)
 from domoticz.responses import OnCommandResponse as OCDR
 
+# soundswitch (121) values used by `CCSSEndpoint`
+ENDPOINT_PROPERTIES = ('defaultVolume', 'toneId', 'volume')
+
 
 class ZW164EnumMethods(Enum):
     """[DOCSTRING]"""
@@ -127,13 +133,58 @@ class ZW164PlayModes(ZW164EnumMethods):
     }
 
 
-@dataclass
-class SoundSwitchToneValues:
+class SoundSwitchToneValues(NamedTuple):
     """Sound switch tone values"""
     name: str = ""
     duration: int = -1
     tone_id: int = -1
 
+
+class ToneTable(Mapping):
+    """Immutable tones catalogue: tone_id -> SoundSwitchToneValues
+
+    The tables are interned: every node (and its endpoints) with the same
+    catalogue references the same instance; `fingerprint` identifies it.
+    """
+    __slots__ = ('_tones', 'fingerprint')
+    _interned: Dict[Tuple[Tuple[int, str, int], ...], ToneTable] = {}
+
+    def __init__(self: ToneTable, tones: Iterable[SoundSwitchToneValues] = ()) -> None:
+        """initialisation de la classe; use `ToneTable.intern`"""
+        self._tones = {tone.tone_id: tone for tone in sorted(tones, key=lambda tone: tone.tone_id)}
+        self.fingerprint = tuple(
+            (tone.tone_id, tone.name, tone.duration) for tone in self._tones.values()
+        )
+
+    @classmethod
+    def intern(cls: ToneTable, tones: Iterable[SoundSwitchToneValues]) -> ToneTable:
+        """@return the shared table of `tones`"""
+        table = cls(tones)
+        return cls._interned.setdefault(table.fingerprint, table)
+
+    def __getitem__(self: ToneTable, tone_id: int) -> SoundSwitchToneValues:
+        """[] wrapper"""
+        return self._tones[tone_id]
+
+    def __iter__(self: ToneTable) -> Iterator[int]:
+        """for ... in ... wrapper; tone ids in order"""
+        return iter(self._tones)
+
+    def __len__(self: ToneTable) -> int:
+        """len() wrapper"""
+        return len(self._tones)
+
+    def __hash__(self: ToneTable) -> int:
+        """hash() wrapper; immutable"""
+        return hash(self.fingerprint)
+
+    def __repr__(self: ToneTable) -> str:
+        """repr() wrapper"""
+        return f'ToneTable({len(self._tones)} tones)'
+
+
+NO_TONES = ToneTable()
+
 # pylint:disable=invalid-name
 
 
@@ -142,12 +193,11 @@ class CCSSEndpoint:
     """Endpoint manager"""
     node_id: int
     endpoint_id: int
-    tones: Dict[int, SoundSwitchToneValues] = field(
-        default_factory=dict, init=False)
+    tones: ToneTable = field(default=NO_TONES, init=False, repr=False)  # node's table
     # defaultToneId: int = field(default_factory=int, init=False)
     defaultVolume: int = field(default_factory=int, init=False)
     toneId: int = field(default_factory=int, init=False)
-    # volume: int = field(default_factory=int, init=False)
+    volume: int = field(default_factory=int, init=False)  # play volume; 0: default
 
     def update(
             self: CCSSEndpoint, node_id: int, endpoint_id: int,
@@ -163,25 +213,45 @@ class CCSSEndpoint:
 # pylint:enable=invalid-name
 
 
+@unique
+class NodeState(Enum):
+    """Node discovery state"""
+    NEW = 0  # endpoints found, discovery not started
+    IDENTIFYING = 1  # waiting for manufacturer/product/firmware
+    DISCOVERING = 2  # waiting for tones count and infos
+    DISCOVERED = 3  # tones known, waiting for the node to be alive
+    COMPLETE = 4  # alive and completely acquired
+
+
 @dataclass
 class CCSSNode:
     """Node manager"""
     node_id: int
     endpoints: Dict[int, CCSSEndpoint] = field(
         default_factory=dict, init=False)
+    state: NodeState = field(default=NodeState.NEW, init=False)
     status_value: bool = field(default=False, init=False)
     status: str = field(default_factory=str, init=False)
-    tones_count: int = field(default_factory=int, init=False)
-    tones: Dict[int, SoundSwitchToneValues] = field(
+    tones_count: int = field(default=-1, init=False)
+    # being discovered: a dict; afterwards the shared `ToneTable`
+    tones: Union[Dict[int, SoundSwitchToneValues], ToneTable] = field(
         default_factory=dict, init=False)
+    manufacturer_id: int = field(default=-1, init=False)
+    product_type: int = field(default=-1, init=False)
+    product_id: int = field(default=-1, init=False)
+    firmware_version: str = field(default_factory=str, init=False)
+    identification_time: float = field(default=0.0, init=False)
 
     def __post_init__(self: CCSSNode) -> None:
         """post init"""
-        # default class sound
-        self.tones.update({
+        self._default_tones()
+
+    def _default_tones(self: CCSSNode) -> None:
+        """tones being discovered: the default class sounds only"""
+        self.tones = {
             0: SoundSwitchToneValues('Off', 0, 0),
             255: SoundSwitchToneValues('Default', 0, 255)
-        })
+        }
 
     def update_endpoint(
             self: CCSSNode, node_id: int, endpoint_id: int,
@@ -192,6 +262,8 @@ class CCSSNode:
         cur_endpoint = self.endpoints.get(endpoint_id)
         if cur_endpoint is None:
             cur_endpoint = CCSSEndpoint(node_id, endpoint_id)
+            if isinstance(self.tones, ToneTable):
+                cur_endpoint.tones = self.tones
             self.endpoints.update({endpoint_id: cur_endpoint})
             helpers.status(
                 f'Node {self.node_id} - new endpoint found: {endpoint_id}'
@@ -201,7 +273,7 @@ class CCSSNode:
 
     def update_tone(self: CCSSNode, results: SendCommandResult) -> None:
         """update tones dict"""
-        if results.node_id != self.node_id:
+        if results.node_id != self.node_id or self.state is not NodeState.DISCOVERING:
             return
         tone_id = results.command_args[0]
         self.tones.update({
@@ -216,89 +288,198 @@ class CCSSNode:
         """get_endpoint"""
         return self.endpoints.get(endpoint_id)
 
+    def update_metadata(self: CCSSNode, topic: ZwaveTopic, payload: dict) -> None:
+        """update manufacturer (114) and version (134) values"""
+        value = payload.get('value')
+        if value is None:
+            return
+        if topic.property == 'manufacturerId':
+            self.manufacturer_id = int(value)
+        elif topic.property == 'productType':
+            self.product_type = int(value)
+        elif topic.property == 'productId':
+            self.product_id = int(value)
+        elif topic.property == 'firmwareVersions':
+            self.firmware_version = value[0] if isinstance(value, list) else str(value)
+
+    def model_key(self: CCSSNode) -> str:
+        """@return the manufacturer/product/firmware key; empty if unknown"""
+        if min(self.manufacturer_id, self.product_type, self.product_id) < 0:
+            return ''
+        if not self.firmware_version:
+            return ''
+        return '-'.join([
+            f'{self.manufacturer_id:04x}',
+            f'{self.product_type:04x}',
+            f'{self.product_id:04x}',
+            self.firmware_version
+        ])
+
+    def start_identification(self: CCSSNode) -> None:
+        """NEW -> IDENTIFYING"""
+        if self.state is NodeState.NEW:
+            self.state = NodeState.IDENTIFYING
+            self.identification_time = time()
+
+    def start_discovery(self: CCSSNode) -> None:
+        """NEW/IDENTIFYING -> DISCOVERING"""
+        if self.state in (NodeState.NEW, NodeState.IDENTIFYING):
+            self.state = NodeState.DISCOVERING
+
+    def retry_identification(self: CCSSNode) -> None:
+        """DISCOVERING -> IDENTIFYING: the discovery has been given up,
+        retried after `IDENTIFICATION_TIMEOUT`
+        """
+        if self.state is NodeState.DISCOVERING:
+            self.tones_count = -1
+            self.state = NodeState.IDENTIFYING
+            self.identification_time = time()
+
+    def restart_discovery(self: CCSSNode) -> None:
+        """DISCOVERED/COMPLETE -> DISCOVERING: the tones are acquired again
+        the endpoints keep the previous table until the new one is shared
+        """
+        if self.state in (NodeState.DISCOVERED, NodeState.COMPLETE):
+            self._default_tones()
+            self.tones_count = -1
+            self.state = NodeState.DISCOVERING
+
+    def apply_catalogue(self: CCSSNode, tones: Dict[int, SoundSwitchToneValues]) -> None:
+        """NEW/IDENTIFYING -> DISCOVERED with cached tones"""
+        if self.state in (NodeState.NEW, NodeState.IDENTIFYING):
+            self.tones.update(tones)
+            self.tones_count = len(tones)
+            self.state = NodeState.DISCOVERED
+            self._share_tones()
+
+    def _share_tones(self: CCSSNode) -> None:
+        """freeze the discovered tones into the shared table of the catalogue"""
+        self.tones = ToneTable.intern(self.tones.values())
+        for endpoint in self.endpoints.values():
+            endpoint.tones = self.tones
+
+    def missing_tones(self: CCSSNode) -> Set[int]:
+        """tones id without infos; empty until the tones count is known"""
+        return set(range(1, self.tones_count + 1)) - set(self.tones)
+
+    def refresh_state(self: CCSSNode) -> bool:
+        """move the state machine forward
+        @return `True` if the node has just been completed
+        """
+        if self.state is NodeState.DISCOVERING:
+            if self.tones_count >= 0 and not self.missing_tones():
+                self.state = NodeState.DISCOVERED
+                self._share_tones()
+        if self.state is NodeState.DISCOVERED and self.status_value:
+            self.state = NodeState.COMPLETE
+            return True
+        return False
+
+    def is_complete(self: CCSSNode) -> bool:
+        """Check if the node is alive and completely acquired"""
+        return self.state is NodeState.COMPLETE
+
 
 class CCSSNodes(Iterable):
-    """Nodes manager"""
-    _nodes: Dict[int, CCSSNode] = {}
-    _is_new = False
-    _cur_node: Optional[CCSSNode] = None
-
-    def update(self: CCSSNodes, topic: str, payload: bytes) -> Optional[CCSSEndpoint]:
-        """update node/endpoint"""
-        self._is_new = False
-        if '/121/' in topic:  # is soundswitch commandclass
-            return self._update_node_endpoint(topic, payload)
-        if topic.endswith("sendCommand"):
-            self._update_node_infos(payload)
-        elif topic.endswith("status"):
-            self._update_status(payload)
-        else:
-            helpers.error(f'Unexpected topic: {topic}')
-        return None
+    """Nodes manager
 
-    def _update_node_endpoint(
-            self: CCSSNodes, topic: str,
-            payload: bytes) -> Optional[CCSSEndpoint]:
-        """node update"""
-        topic_list = topic.split('/')
-        if len(topic_list) == 5:  # endpoint infos
-            zwave_node_id = int(topic_list[1])
-            self._cur_node = self._nodes.get(zwave_node_id)
-            if self._cur_node is None:  # create
-                self._is_new = True
-                self._cur_node = CCSSNode(zwave_node_id)
-                self._nodes.update({zwave_node_id: self._cur_node})
-                helpers.status(f'New node found: {zwave_node_id}')
-            # update now
-            return self._cur_node.update_endpoint(
-                zwave_node_id,
-                int(topic_list[3]),  # endpoint
-                topic_list[-1],  # last topic
-                loads(payload)  # converted payload
-            )
-        return None
+    Every node runs its own discovery state machine (see `NodeState`),
+    so many nodes can be interviewed at once.
+    """
+
+    def __init__(self: CCSSNodes) -> None:
+        """initialisation de la classe"""
+        self._nodes: Dict[int, CCSSNode] = {}
+        self._statuses: Dict[int, dict] = {}  # status of the nodes not yet known
 
-    def _update_node_infos(self: CCSSNodes, payload: bytes) -> None:
-        """Update node tones (count and infos)"""
-        results = SendCommandResult(**loads(payload))
-        self._cur_node = self._nodes.get(results.node_id)
+    def update_endpoint(
+            self: CCSSNodes, topic: ZwaveTopic,
+            payload: dict) -> Tuple[CCSSNode, Optional[CCSSEndpoint]]:
+        """node update from a soundswitch value topic"""
+        cur_node = self._nodes.get(topic.node_id)
+        if cur_node is None:  # create
+            cur_node = CCSSNode(topic.node_id)
+            self._nodes.update({topic.node_id: cur_node})
+            helpers.status(f'New node found: {topic.node_id}')
+            # its status may have come first
+            status = self._statuses.pop(topic.node_id, {})
+            cur_node.status_value = status.get('value', False)
+            cur_node.status = status.get('status', '')
+        # update now
+        return cur_node, cur_node.update_endpoint(
+            topic.node_id,
+            topic.endpoint,
+            topic.property,
+            payload
+        )
+
+    def update_node_infos(self: CCSSNodes, results: SendCommandResult) -> Optional[CCSSNode]:
+        """Update node tones (count and infos)
+        @return the node if it has just been completed
+        """
+        cur_node = self._nodes.get(results.node_id)
+        if cur_node is None:
+            return None
         if results.command == 'getToneCount' and isinstance(results.result, int):
-            if results.result > 0:
-                helpers.status(
-                    f'Node {self._cur_node.node_id} - update tones count: {results.result}'
-                )
-                self._cur_node.tones_count = results.result
+            helpers.status(
+                f'Node {cur_node.node_id} - update tones count: {results.result}'
+            )
+            cur_node.tones_count = results.result
         if results.command == 'getToneInfo' and isinstance(results.result, dict):
-            self._cur_node.update_tone(results)
+            cur_node.update_tone(results)
+        if cur_node.refresh_state():
+            return cur_node
+        return None
 
-    def _update_status(self: CCSSNodes, payload: bytes) -> None:
-        """Update node status"""
-        results: dict = loads(payload)
-        self._cur_node = self._nodes.get(results.get('nodeId'))
-        self._cur_node.status_value = results.get('value')
-        self._cur_node.status = results.get('status')
+    def update_status(self: CCSSNodes, payload: dict) -> Optional[CCSSNode]:
+        """Update node status
+        @return the node if it has just been completed
+        """
+        cur_node = self._nodes.get(payload.get('nodeId'))
+        if cur_node is None:  # kept until its first soundswitch value
+            self._statuses[payload.get('nodeId')] = payload
+            return None
+        cur_node.status_value = payload.get('value')
+        cur_node.status = payload.get('status')
+        if cur_node.refresh_state():
+            return cur_node
+        return None
 
-    def is_new(self: CCSSNodes) -> bool:
-        """check if the current node is new"""
-        return self._is_new
+    def update_metadata(
+            self: CCSSNodes, topic: ZwaveTopic,
+            payload: dict) -> Optional[CCSSNode]:
+        """Update node manufacturer/product/firmware values"""
+        cur_node = self._nodes.get(topic.node_id)
+        if cur_node is not None:
+            cur_node.update_metadata(topic, payload)
+        return cur_node
+
+    def endpoint_ids(self: CCSSNodes) -> List[Tuple[int, int]]:
+        """@return the (node_id, endpoint_id) of the complete nodes"""
+        return [
+            (cur_node.node_id, endpoint_id)
+            for cur_node in self._nodes.values() if cur_node.is_complete()
+            for endpoint_id in cur_node.endpoints
+        ]
+
+    def __len__(self: CCSSNodes) -> int:
+        """len() wrapper"""
+        return len(self._nodes)
+
+    def identifying_nodes(self: CCSSNodes) -> List[CCSSNode]:
+        """@return the nodes waiting for their identification"""
+        return [
+            cur_node for cur_node in self._nodes.values()
+            if cur_node.state is NodeState.IDENTIFYING
+        ]
+
+    def get_node(self: CCSSNodes, node_id: int) -> Optional[CCSSNode]:
+        """return the node"""
+        return self._nodes.get(node_id)
 
     def is_complete(self: CCSSNodes) -> bool:
-        """Check if the current node is alive and completely acquired"""
-        return self._cur_node.status_value and not self.need_tone_info()
-
-    def need_tone_info(self: CCSSNodes) -> int:
-        """Return the next tone_id; 0 if no more"""
-        tones_info_left: Set[int] = (
-            set(range(1, self._cur_node.tones_count + 1))
-            - set(self._cur_node.tones)
-        )
-        if len(tones_info_left) > 0:
-            return tones_info_left.pop()
-        return 0
-
-    def get_cur_node(self: CCSSNodes) -> CCSSNode:
-        """return the current node"""
-        return self._cur_node
+        """Check if every node is alive and completely acquired"""
+        return all(cur_node.is_complete() for cur_node in self._nodes.values())
 
     def __repr__(self: CCSSNodes) -> str:
         """repr() wrapper"""
@@ -306,60 +487,53 @@ class CCSSNodes(Iterable):
 
     def __iter__(self: CCSSNodes) -> Iterator[CCSSEndpoint]:
         """for ... in ... wrapper"""
-        for cur_node in self._nodes.values():
-            for endpoint in cur_node.endpoints.values():
-                endpoint.tones = cur_node.tones.copy()
-                yield endpoint
-                endpoint.tones.clear()
-
-    def get_tone_count(self: CCSSNodes) -> dict:
-        """return the getToneCount command"""
-        return {
-            "args": [
-                {
-                    "nodeId": self._cur_node.node_id,
-                    "commandClass": 121,
-                    "endpoint": 0
-                },
-                "getToneCount",
-                []
-            ]
-        }
+        for node_id in self._nodes:
+            yield from self.node_endpoints(node_id)
 
-    def get_tone_info(self: CCSSNodes, tone_id: int) -> dict:
-        """return the getToneInfo command"""
-        return {
-            "args": [
-                {
-                    "nodeId": self._cur_node.node_id,
-                    "commandClass": 121,
-                    "endpoint": 0
-                },
-                "getToneInfo",
-                [tone_id]
-            ]
-        }
+    def node_endpoints(self: CCSSNodes, node_id: int) -> Iterator[CCSSEndpoint]:
+        """iterate the endpoints of `node_id`"""
+        cur_node = self._nodes.get(node_id)
+        if cur_node is None:
+            return
+        # the endpoints reference the node tones table: nothing to copy
+        yield from cur_node.endpoints.values()
 
     def send_command(
-            self: CCSSNode, device_id: str, ocdr: OCDR) -> Optional[Dict[str, Any]]:
-        """send_command"""
+            self: CCSSNodes, device_id: str, ocdr: OCDR,
+            command_topic: str = '') -> Optional[Dict[str, Any]]:
+        """send_command
+        a tone is played with the gateway `play` command (tone and volume in
+        a single frame) when the gateway `command_topic` is known
+        """
         node_id, endpoint_id, topic = device_id.split('_')
-        self._cur_node = self._nodes.get(int(node_id))
-        if self._cur_node is not None:
-            endpoint = self._cur_node.get_endpoint(int(endpoint_id))
+        cur_node = self._nodes.get(int(node_id))
+        if cur_node is not None:
+            endpoint = cur_node.get_endpoint(int(endpoint_id))
             if endpoint is not None:
                 value = 0
                 if ocdr.command == 'Set Level':
-                    if topic == 'defaultVolume':
+                    if topic in ('defaultVolume', 'volume'):
                         value = ocdr.level
                     elif topic == 'toneId':
-                        if ocdr.level == (self._cur_node.tones_count + 1) * 10:
+                        if ocdr.level == (cur_node.tones_count + 1) * 10:
                             value = 255
                         else:
                             value = ocdr.level / 10
+                if topic == 'volume':
+                    endpoint.volume = int(value)
+                elif topic == 'toneId' and value > 0 and command_topic:
+                    return {
+                        'topic': command_topic,
+                        'payload': send_command_payload(
+                            int(node_id), 'play', [int(value), endpoint.volume],
+                            endpoint=int(endpoint_id)
+                        ),
+                        'key': device_id
+                    }
                 command = {
                     'topic': f'zwave/{node_id}/121/{endpoint_id}/{topic}/set',
-                    'payload': int(value)
+                    'payload': int(value),
+                    'key': device_id  # a stop replaces a pending play
                 }
                 return command
             helpers.error(
@@ -367,3 +541,45 @@ class CCSSNodes(Iterable):
             )
         helpers.error(f'<CCSSNode.send_command> Node {node_id} not found')
         return None
+
+    def group_command(
+            self: CCSSNodes, tone_id: int, gateway: ZwaveGateway,
+            pairs: Optional[Iterable[Tuple[int, int]]] = None) -> List[Dict[str, Any]]:
+        """play `tone_id` (0: stop) on many endpoints at once
+        @arg pairs: (node_id, endpoint_id) known endpoints; every complete endpoint by default
+        @return the publishes: one multicast per endpoint id while the gateway
+        `writeMulticast` api answers, else one unicast `toneId/set` per endpoint
+        """
+        if pairs is None:
+            pairs = self.endpoint_ids()
+        by_endpoint: Dict[int, List[int]] = {}
+        for node_id, endpoint_id in pairs:
+            cur_node = self._nodes.get(node_id)
+            if cur_node is None or cur_node.get_endpoint(endpoint_id) is None:
+                helpers.error(
+                    f'<CCSSNodes.group_command> Endpoint {endpoint_id} not found in node {node_id}'
+                )
+                continue
+            by_endpoint.setdefault(endpoint_id, []).append(node_id)
+        commands = []
+        multicast = gateway.supports_multicast()
+        for endpoint_id, nodes in sorted(by_endpoint.items()):
+            if multicast and len(nodes) > 1:
+                commands.append({
+                    'topic': gateway.multicast_topic,
+                    'payload': multicast_payload(sorted(nodes), endpoint_id, 'toneId', tone_id)
+                })
+                continue
+            commands.extend(self.unicast_commands(sorted(nodes), endpoint_id, tone_id))
+        return commands
+
+    @staticmethod
+    def unicast_commands(
+            nodes: Iterable[int], endpoint_id: int, tone_id: int) -> List[Dict[str, Any]]:
+        """@return one `toneId/set` publish per node; a refused multicast too"""
+        return [
+            {
+                'topic': f'zwave/{node_id}/121/{endpoint_id}/toneId/set',
+                'payload': tone_id
+            } for node_id in nodes
+        ]
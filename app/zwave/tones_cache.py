@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+"""Zwave soundswitch tones catalogue cache"""
+
+# standard libs
+from __future__ import annotations
+
+import os
+from time import time
+from typing import Any, Dict, List, Optional
+from uuid import uuid4
+
+# plugin libs
+import helpers
+from app.zwave.soundswitch import SoundSwitchToneValues
+
+
+class ToneCatalogueCache:
+    """On disk tones catalogue, keyed by manufacturer/product/firmware
+
+    A catalogue is only served if it holds every tone of its `count`.
+
+    The file is shared by the hardware instances: it is re-read on a miss,
+    and changed under a lock (re-read, merge, atomic replace). An instance
+    discovering a model claims it, so the others wait for its catalogue
+    instead of discovering the same model; a claim expires after
+    `CLAIM_TIMEOUT` (failed or stopped discovery).
+
+    File format:
+    {
+        "version": 2,
+        "catalogues": {
+            "<model key>": {"count": tones_count, "tones": [[tone_id, name, duration], ...]}
+        },
+        "claims": {"<model key>": ["<instance>", timestamp]}
+    }
+    """
+    VERSION = 2  # version 1 catalogues may miss their last tone
+    FILE_NAME = 'tones_cache.json'
+    CLAIM_TIMEOUT = 90.0  # seconds; a discovery with every retry of the gateway calls
+
+    def __init__(self: ToneCatalogueCache) -> None:
+        """initialisation de la classe"""
+        self._catalogues: Dict[str, Dict[str, Any]] = {}
+        self._claims: Dict[str, List[Any]] = {}
+        self._instance = uuid4().hex
+        self._path = ''
+        self.hits = 0
+        self.misses = 0
+
+    def on_start(self: ToneCatalogueCache, parameters: Dict[str, Any]) -> None:
+        """on_start"""
+        self._path = os.path.join(parameters.get('HomeFolder', ''), self.FILE_NAME)
+        self._load()
+
+    def get(self: ToneCatalogueCache, key: str) -> Optional[Dict[int, SoundSwitchToneValues]]:
+        """@return the tones of the model `key` or `None`"""
+        if key not in self._catalogues:  # another instance may have discovered it
+            self._load()
+        catalogue = self._catalogues.get(key)
+        if catalogue is not None and not self._is_complete(catalogue):
+            helpers.error(f'Tones cache: incomplete catalogue dropped: {key}')
+            self.invalidate(key)
+            catalogue = None
+        if catalogue is None:
+            self.misses += 1
+            helpers.status(
+                f'Tones cache miss: {key} (hits: {self.hits}, misses: {self.misses})'
+            )
+            return None
+        self.hits += 1
+        helpers.status(
+            f'Tones cache hit: {key} (hits: {self.hits}, misses: {self.misses})'
+        )
+        return {
+            tone_id: SoundSwitchToneValues(name, duration, tone_id)
+            for tone_id, name, duration in catalogue['tones']
+        }
+
+    def put(
+            self: ToneCatalogueCache, key: str,
+            tones: Dict[int, SoundSwitchToneValues], tones_count: int) -> None:
+        """store the `tones_count` tones of the model `key`; default tones excluded"""
+        catalogue = {
+            'count': tones_count,
+            'tones': [
+                [tone.tone_id, tone.name, tone.duration]
+                for tone_id, tone in sorted(tones.items())
+                if tone_id not in (0, 255)
+            ]
+        }
+        if not self._is_complete(catalogue):
+            helpers.error(f'Tones cache: incomplete catalogue not stored: {key}')
+            return
+        with helpers.shared_file.locked(self._path):
+            self._load()
+            self._catalogues[key] = catalogue
+            self._claims.pop(key, None)
+            self._save()
+
+    def claim(self: ToneCatalogueCache, key: str) -> bool:
+        """claim the discovery of the model `key`
+        @return `False` if another instance is discovering it, or has
+        just stored it (`get` it again later)
+        """
+        with helpers.shared_file.locked(self._path):
+            self._load()
+            owner, claimed_at = self._claims.get(key, ('', 0.0))
+            if key in self._catalogues or (
+                    owner != self._instance and claimed_at + self.CLAIM_TIMEOUT > time()):
+                return False
+            self._claims[key] = [self._instance, time()]
+            self._save()
+        return True
+
+    @staticmethod
+    def _is_complete(catalogue: Dict[str, Any]) -> bool:
+        """the catalogue holds the tones 1 to `count`"""
+        tone_ids = [tone[0] for tone in catalogue.get('tones', [])]
+        return tone_ids == list(range(1, catalogue.get('count', -1) + 1))
+
+    def invalidate(self: ToneCatalogueCache, key: Optional[str] = None) -> None:
+        """forget the model `key`; every model if `None`"""
+        with helpers.shared_file.locked(self._path):
+            self._load()
+            if key is None:
+                self._catalogues.clear()
+            elif self._catalogues.pop(key, None) is None:
+                return
+            self._save()
+        helpers.status(f'Tones cache invalidated: {key or "all"}')
+
+    def _load(self: ToneCatalogueCache) -> None:
+        """read the cache file; the file wins over the memory"""
+        datas = helpers.shared_file.read(self._path, self.VERSION)
+        if datas is None:
+            return
+        self._catalogues = datas.get('catalogues', {})
+        self._claims = datas.get('claims', {})
+
+    def _save(self: ToneCatalogueCache) -> None:
+        """write the cache file"""
+        helpers.shared_file.write(self._path, {
+            'version': self.VERSION, 'catalogues': self._catalogues, 'claims': self._claims
+        }, self)
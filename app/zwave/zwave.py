@@ -6,31 +6,63 @@
 # standard libs
 from __future__ import annotations
 
-from dataclasses import dataclass, field
-from json import loads
-from typing import Any, Dict
+from dataclasses import dataclass, field, fields
+from typing import Any, Dict, FrozenSet, List, Tuple
+
+# plugin libs
+from helpers.common import DATACLASS_SLOTS
 
 # pylint:disable=invalid-name
 
 
-@dataclass
+@dataclass(frozen=True)
+class ZwaveTopic:
+    """Parsed zwave-js-ui topic; immutable, shared by the messages of a topic
+    - gateway topics: `zwave/_CLIENTS/<gateway>/.../<property>`
+    - node topics: `zwave/<node>/<property>`
+    - value topics: `zwave/<node>/<command_class>/<endpoint>/<property>`
+    """
+    topic: str
+    gateway: str = field(default_factory=str)
+    node_id: int = field(default_factory=int)
+    command_class: int = field(default=-1)
+    endpoint: int = field(default=-1)
+    property: str = field(default_factory=str)  # pylint:disable=redefined-builtin
+
+    @classmethod
+    def from_levels(cls: ZwaveTopic, topic: str, levels: List[str]) -> ZwaveTopic:
+        """build the record from the `topic` splitted in `levels`
+        @raise ValueError on non numeric node, command class or endpoint
+        """
+        if len(levels) < 3:
+            return cls(topic, property=levels[-1])
+        if levels[1] == '_CLIENTS':
+            return cls(topic, gateway=levels[2], property=levels[-1])
+        if len(levels) == 5:
+            return cls(
+                topic, node_id=int(levels[1]), command_class=int(levels[2]),
+                endpoint=int(levels[3]), property=levels[-1]
+            )
+        return cls(topic, node_id=int(levels[1]), property=levels[-1])
+
+
+@dataclass(**DATACLASS_SLOTS)
 class ZwavePayloadDatas:
     """ZwavePayload"""
-    payload: bytes
     node_location: str = field(default_factory=str)
     node_name: str = field(default_factory=str)
     time: int = field(default_factory=int)
     value: Any = field(default=None)
 
-    def __post_init__(self: ZwavePayloadDatas) -> None:
-        """post init"""
-        decoded: Dict[str, Any] = loads(self.payload)
-        if 'nodeLocation' in decoded:
-            self.node_location = decoded.get("nodeLocation")
-        if 'nodeName' in decoded:
-            self.node_name = decoded.get("nodeName")
-        self.time = decoded.get("time")
-        self.value = decoded.get("value")
+    @classmethod
+    def from_json(cls: type, decoded: Dict[str, Any]) -> ZwavePayloadDatas:
+        """build from a decoded payload (`MQTTResponse.json`)"""
+        return cls(
+            decoded.get("nodeLocation", ""),
+            decoded.get("nodeName", ""),
+            decoded.get("time"),
+            decoded.get("value")
+        )
 
 
 @dataclass
@@ -40,27 +72,41 @@ class ZwaveGateway:
     command_topic: str = field(default_factory=str, init=False)
     status: bool = field(default=False, init=False)
     version: str = field(default_factory=str, init=False)
+    # `writeMulticast` api available; `False` after an error reply
+    multicast: bool = field(default=True, init=False)
 
-    def update(self: ZwaveGateway, topic: str, payload: bytes) -> None:
+    def update(self: ZwaveGateway, topic: ZwaveTopic, payload: Dict[str, Any]) -> None:
         """gateway update"""
-        if 'ZWAVE_GATEWAY' in topic:
-            path = topic.split(('/'))
-            cur_topic = path.pop(-1)
+        if 'ZWAVE_GATEWAY' in topic.gateway:
             if not bool(self.response_topic):
-                self.response_topic = '/'.join(path) + '/api/sendCommand'
+                self.response_topic = topic.topic.rsplit('/', 1)[0] + '/api/sendCommand'
                 self.command_topic = self.response_topic + '/set'
-            decoded_payload = ZwavePayloadDatas(payload)
-            if cur_topic == 'status':
+            decoded_payload = ZwavePayloadDatas.from_json(payload)
+            if topic.property == 'status':
                 self.status = decoded_payload.value
-            elif cur_topic == 'version':
+            elif topic.property == 'version':
                 self.version = decoded_payload.value
 
     def is_complete(self: ZwaveGateway) -> bool:
         """check if gateway is functionnal"""
         return bool(self.command_topic) and self.status and bool(self.version)
 
+    @property
+    def multicast_response_topic(self: ZwaveGateway) -> str:
+        """the gateway `writeMulticast` api results topic"""
+        return self.response_topic.rsplit('/', 1)[0] + '/writeMulticast'
 
-@dataclass
+    @property
+    def multicast_topic(self: ZwaveGateway) -> str:
+        """the gateway `writeMulticast` api topic"""
+        return self.multicast_response_topic + '/set'
+
+    def supports_multicast(self: ZwaveGateway) -> bool:
+        """the gateway is known and its `writeMulticast` api has not failed"""
+        return bool(self.response_topic) and self.multicast
+
+
+@dataclass(**DATACLASS_SLOTS)
 class SendCommandResult:
     """Send command result"""
     args: list
@@ -83,3 +129,47 @@ class SendCommandResult:
             self.endpoint = target.get('endpoint')
             self.command = self.args[1]
             self.command_args = self.args[2]
+
+    @classmethod
+    def from_data(cls: type, data: Dict[str, Any]) -> SendCommandResult:
+        """build from a decoded result; the unknown keys are ignored"""
+        return cls(**{key: value for key, value in data.items() if key in _RESULT_KEYS})
+
+
+_RESULT_KEYS: FrozenSet[str] = frozenset(
+    result_field.name for result_field in fields(SendCommandResult) if result_field.init
+)
+
+
+def send_command_payload(
+        node_id: int, command: str, args: List[Any],
+        command_class: int = 121, endpoint: int = 0) -> Dict[str, Any]:
+    """@return the gateway `sendCommand` payload"""
+    return {
+        "args": [
+            {
+                "nodeId": node_id,
+                "commandClass": command_class,
+                "endpoint": endpoint
+            },
+            command,
+            args
+        ]
+    }
+
+
+def multicast_payload(
+        nodes: List[int], endpoint: int, property_: str, value: Any,
+        command_class: int = 121) -> Dict[str, Any]:
+    """@return the gateway `writeMulticast` api payload"""
+    return {
+        "args": [
+            nodes,
+            {
+                "commandClass": command_class,
+                "endpoint": endpoint,
+                "property": property_
+            },
+            value
+        ]
+    }
@@ -0,0 +1,16 @@
+# -*- coding: UTF-8 -*-
+"""Benchmarks environment: the plugin sources and the `Domoticz` stub"""
+
+# standard libs
+import os
+import sys
+import timeit
+from typing import Callable
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'tests', 'stubs')]
+
+
+def best_of(func: Callable[[], object], number: int = 100, repeat: int = 5) -> float:
+    """@return the best time of one `func` call, in seconds"""
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
@@ -0,0 +1,68 @@
+# -*- coding: UTF-8 -*-
+"""JSON codec: the backends on plugin shaped traffic
+
+Inbound: zwave-js-ui values, node status and `sendCommand` results.
+Outbound: `<property>/set` small integers and `sendCommand` requests.
+Every backend runs in its own interpreter, the faster ones blocked; the
+backends not installed are skipped. The first row is the former direct
+stdlib calls (`json.loads`, `json.dumps(...).encode()`).
+
+    python benchmarks/bench_codec.py
+"""
+
+# standard libs
+import json
+import subprocess
+import sys
+from typing import Any, Callable, List
+
+from _env import best_of
+
+BACKENDS = ('orjson', 'ujson', 'json')
+
+INBOUND: List[bytes] = [
+    b'{"time":1697000000000,"value":%d}' % (index % 100) for index in range(50)
+] + [
+    b'{"success":true,"message":"OK","result":{"name":"01 Beep","duration":3},'
+    b'"args":[{"nodeId":5,"commandClass":121,"endpoint":0},"getToneInfo",[%d]],'
+    b'"origin":{"callId":%d}}' % (index, index) for index in range(30)
+] + [
+    b'{"time":1697000000000,"value":true,"nodeId":5,"status":"Alive",'
+    b'"nodeName":"siren","nodeLocation":"hall"}'
+] * 20
+OUTBOUND: List[Any] = [index % 256 for index in range(60)] + [
+    {'args': [{'nodeId': 5, 'commandClass': 121, 'endpoint': 1}, 'play', [3, 40]], 'callId': index}
+    for index in range(40)
+]
+
+
+def report(name: str, loads: Callable[[bytes], Any], dumps: Callable[[Any], bytes]) -> None:
+    """print the time per message"""
+    decode = best_of(lambda: [loads(payload) for payload in INBOUND], number=200)
+    encode = best_of(lambda: [dumps(payload) for payload in OUTBOUND], number=200)
+    print(f'{name:8}: decode {decode / len(INBOUND) * 1e6:5.2f} us, '
+          f'encode {encode / len(OUTBOUND) * 1e6:5.2f} us')
+
+
+def run(backend: str) -> None:
+    """measure `helpers.codec` with `backend`"""
+    for blocked in BACKENDS[:BACKENDS.index(backend)]:
+        sys.modules[blocked] = None  # ImportError
+    from helpers import codec  # pylint:disable=import-outside-toplevel
+    if codec.BACKEND == backend:
+        report(backend, codec.loads, codec.dumps)
+
+
+def main() -> None:
+    """run the benchmark"""
+    print(f'{len(INBOUND)} inbound, {len(OUTBOUND)} outbound messages; per message')
+    report('former', json.loads, lambda obj: json.dumps(obj).encode())
+    for backend in BACKENDS:
+        subprocess.run([sys.executable, __file__, backend], check=True)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        run(sys.argv[1])
+    else:
+        main()
@@ -0,0 +1,68 @@
+# -*- coding: UTF-8 -*-
+"""Device mapping: load/save of 250 mappings, legacy repr/eval vs versioned lists
+
+The Domoticz `Configuration()` round trip is left out: both forms go
+through it the same way; only the encoding and decoding are measured.
+
+    python benchmarks/bench_mapping.py
+"""
+
+# standard libs
+from typing import Dict
+
+from _env import best_of
+
+# plugin libs
+from helpers.app_config import AppConfig, DeviceMappingDatas  # pylint:disable=wrong-import-order
+
+COUNT = 250
+TOPICS = ('defaultVolume', 'volume', 'toneId')
+MAPPING: Dict[str, DeviceMappingDatas] = {
+    f'{2 + index // 6}_{1 + index // 3 % 2}_{TOPICS[index % 3]}': DeviceMappingDatas(
+        1 + index // 3 % 2, 2 + index // 6, TOPICS[index % 3], index + 1
+    ) for index in range(COUNT)
+}
+LEGACY = {device_id: repr(datas) for device_id, datas in MAPPING.items()}
+
+
+def legacy_load() -> Dict[str, DeviceMappingDatas]:
+    """the former `init_mapping` decoding"""
+    return {device_id: eval(item) for device_id, item in LEGACY.items()}  # pylint:disable=eval-used
+
+
+def legacy_save() -> Dict[str, str]:
+    """the former encoding"""
+    return {device_id: repr(datas) for device_id, datas in MAPPING.items()}
+
+
+def main() -> None:
+    """run the benchmark"""
+    config = AppConfig()
+    config.device_mapping = MAPPING
+    stored = config._config  # pylint:disable=protected-access
+
+    def load() -> Dict[str, DeviceMappingDatas]:
+        """versioned lists decoding"""
+        config._config = stored  # pylint:disable=protected-access
+        return config.device_mapping
+
+    def save() -> None:
+        """versioned lists encoding"""
+        config.device_mapping = MAPPING
+
+    def migrate() -> Dict[str, DeviceMappingDatas]:
+        """one time migration from the repr strings, without eval"""
+        config._config = {'device_mapping': dict(LEGACY)}  # pylint:disable=protected-access
+        return config.device_mapping
+
+    assert load() == legacy_load() == migrate() == MAPPING
+    print(f'{COUNT} mappings')
+    print(f'legacy load (eval)   : {best_of(legacy_load) * 1e3:7.3f} ms')
+    print(f'legacy save (repr)   : {best_of(legacy_save) * 1e3:7.3f} ms')
+    print(f'load (lists, checked): {best_of(load) * 1e3:7.3f} ms')
+    print(f'save (lists)         : {best_of(save) * 1e3:7.3f} ms')
+    print(f'migration, once (ast): {best_of(migrate, number=10) * 1e3:7.3f} ms')
+
+
+if __name__ == '__main__':
+    main()
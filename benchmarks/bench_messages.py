@@ -0,0 +1,123 @@
+# -*- coding: UTF-8 -*-
+"""Message types: memory and time per message, slotted vs `__dict__`
+
+Replays a retained burst of 5000 zwave-js-ui messages (the values, status
+and identification of 200 nodes, as sent at (re)connection) through the
+message types of the plugin. tracemalloc measures the memory held per
+message, every object kept alive. The "dict" rows use the same classes
+rebuilt without slots.
+
+    python benchmarks/bench_messages.py
+"""
+
+# standard libs
+import json
+import tracemalloc
+from dataclasses import field, fields, make_dataclass
+from typing import Any, Callable, Dict, List
+
+from _env import best_of
+
+# plugin libs
+from app.jsonapi import http  # pylint:disable=wrong-import-order
+from app.mqtt.mqtt import MQTTResponse  # pylint:disable=wrong-import-order
+from app.zwave.zwave import SendCommandResult, ZwavePayloadDatas  # pylint:disable=wrong-import-order
+from domoticz.responses import OnMessageResponse  # pylint:disable=wrong-import-order
+from helpers import codec  # pylint:disable=wrong-import-order
+
+COUNT = 5000
+CONNECTION = object()
+GENERATED = {
+    '__slots__', '__dict__', '__weakref__', '__init__', '__repr__', '__eq__',
+    '__hash__', '__setattr__', '__delattr__', '__getstate__', '__setstate__',
+    '__match_args__', '__dataclass_fields__', '__dataclass_params__'
+}
+
+
+def unslotted(cls: type) -> type:
+    """the dataclass `cls` rebuilt without slots: the former layout"""
+    namespace = {
+        name: value for name, value in vars(cls).items()
+        if name not in GENERATED and name not in cls.__dataclass_fields__
+    }
+    return make_dataclass(cls.__name__, [
+        (item.name, item.type, field(
+            default=item.default, default_factory=item.default_factory,
+            init=item.init, repr=item.repr, compare=item.compare
+        )) for item in fields(cls)
+    ], namespace=namespace, frozen=cls.__dataclass_params__.frozen)
+
+
+def burst() -> List[Dict[str, Any]]:
+    """a retained burst, as received by `onMessage`"""
+    messages = []
+    index = 0
+    while len(messages) < COUNT:
+        node_id = 2 + index % 200
+        if index < 200:
+            topic, value = f'zwave/{node_id}/status', True
+        elif index < 1000:
+            topic, value = f'zwave/{node_id}/114/0/' + (
+                'manufacturerId', 'productType', 'productId', 'firmwareVersions'
+            )[index // 200 - 1], 881
+        else:
+            topic, value = f'zwave/{node_id}/121/{index // 200 % 2 + 1}/' + (
+                'defaultVolume', 'toneId', 'volume'
+            )[index // 400 % 3], index % 100
+        messages.append({
+            'Verb': 'PUBLISH', 'Topic': topic, 'Retain': True, 'QoS': 0, 'DUP': False,
+            'PacketIdentifier': '', 'Payload': json.dumps({
+                'time': 1700000000000 + index, 'value': value,
+                'nodeName': f'siren {node_id}', 'nodeLocation': 'home'
+            }).encode()
+        })
+        index += 1
+    return messages
+
+
+def measure(name: str, build: Callable[[Any], Any], items: List[Any]) -> None:
+    """print the memory held and the time, per item"""
+    tracemalloc.start()
+    kept = [build(item) for item in items]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    seconds = best_of(lambda: [build(item) for item in items], number=1)
+    print(f'{name:28}: {size / len(items):6.0f} B, {seconds / len(items) * 1e6:5.2f} us')
+
+
+def main() -> None:
+    """run the benchmark"""
+    messages = burst()
+    reply = json.dumps({
+        'success': True, 'message': 'OK', 'result': {'name': '01 Tone1', 'duration': 1},
+        'args': [{'nodeId': 5, 'commandClass': 121, 'endpoint': 0}, 'getToneInfo', [1]],
+        'origin': {}
+    }).encode()
+    body = json.dumps({'status': 'OK', 'title': 'GetPlanDevices', 'result': []}).encode()
+    answers = [body] * COUNT
+    replies = [reply] * COUNT
+    print(f'{COUNT} messages, per message')
+    for label, omer_cls, response_cls, payload_cls, result_cls, http_cls in (
+            ('dict', unslotted(OnMessageResponse), unslotted(MQTTResponse),
+             unslotted(ZwavePayloadDatas), unslotted(SendCommandResult), unslotted(http.Response)),
+            ('slots', OnMessageResponse, MQTTResponse, ZwavePayloadDatas,
+             SendCommandResult, http.Response)):
+
+        def message(data: Dict[str, Any], omer_cls: type = omer_cls,
+                    response_cls: type = response_cls, payload_cls: type = payload_cls) -> Any:
+            """the path of a retained value"""
+            response = response_cls.from_data(omer_cls(CONNECTION, data).data)
+            return response, payload_cls.from_json(response.json)
+
+        measure(f'{label} burst message', message, messages)
+        measure(f'{label} SendCommandResult', lambda raw, cls=result_cls: cls.from_data(codec.loads(raw)), replies)
+        measure(
+            f'{label} http.Response',
+            lambda raw, cls=http_cls: cls(raw, {'Content-Type': 'application/json'}, '200'),
+            answers
+        )
+
+
+if __name__ == '__main__':
+    main()
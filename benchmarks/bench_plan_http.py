@@ -0,0 +1,78 @@
+# -*- coding: UTF-8 -*-
+"""JSON/API answers: a synthetic gzip getplandevices answer of 5000 devices
+
+Time and peak memory of the decoding, with the `getplandevices` filter:
+former decoding (decompress + json.loads, then filter), `HData` (one call
+below `STREAM_THRESHOLD`) and the streamed decoding.
+
+    python benchmarks/bench_plan_http.py
+"""
+
+# standard libs
+import gzip
+import json
+import tracemalloc
+from typing import Any, Callable, Dict
+
+from _env import best_of
+
+# plugin libs
+from app.jsonapi import http  # pylint:disable=wrong-import-order
+from app.plan.plan import GetPlanDevicesData  # pylint:disable=wrong-import-order
+
+COUNT = 5000
+
+
+def answer(count: int) -> bytes:
+    """a gzip getplandevices answer of `count` devices"""
+    return gzip.compress(json.dumps({
+        'result': [
+            {
+                'DevSceneRowID': str(1000 + index), 'Name': f'N{index // 6}E{index % 2 + 1}: tone',
+                'devidx': str(1000 + index), 'idx': str(200 + index), 'order': str(200 + index),
+                'type': 1 if index % 50 == 0 else 0
+            } for index in range(count)
+        ],
+        'status': 'OK', 'title': 'GetPlanDevices'
+    }, indent=1).encode())
+
+
+def peak(func: Callable[[], Any]) -> float:
+    """@return the peak memory of one `func` call, in MB"""
+    tracemalloc.start()
+    func()
+    peak_size = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak_size / 1e6
+
+
+def main() -> None:
+    """run the benchmark"""
+    raw_data = answer(COUNT)
+    keep = GetPlanDevicesData.from_result
+
+    def former() -> Dict[str, Any]:
+        """decompress + json.loads, then filter"""
+        decoded = json.loads(gzip.decompress(raw_data))
+        decoded['result'] = [
+            entry for entry in map(keep, decoded['result']) if entry is not None
+        ]
+        return decoded
+
+    def hdata() -> http.HData:
+        """`HData`, as the plugin decodes it"""
+        return http.HData(raw_data, 'gzip', keep)
+
+    def streamed() -> Dict[str, Any]:
+        """the incremental decoder"""
+        return http._StreamDecoder(raw_data, 'gzip', keep).decode()  # pylint:disable=protected-access
+
+    assert former()['result'] == hdata().result == streamed()['result']
+    print(f'{COUNT} devices: {len(raw_data) / 1e3:.0f} KB gzip, '
+          f'{len(gzip.decompress(raw_data)) / 1e3:.0f} KB JSON')
+    for name, func in (('former', former), ('HData', hdata), ('streamed', streamed)):
+        print(f'{name:9}: {best_of(func, number=10) * 1e3:6.2f} ms, peak {peak(func):5.2f} MB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+# -*- coding: UTF-8 -*-
+"""Topic dispatch: compiled `TopicRouter` vs the former startswith/endswith chain
+
+Replays a retained burst (200 nodes, 2 endpoints, 3 soundswitch values each,
+plus the node status) through both paths; the handlers do nothing, only the
+dispatch and the topic parsing are measured. `cold` is the first burst after
+start (empty routes cache), `warm` the next ones (reconnections, live values).
+`prepare` is the cost moved to `App2.on_start`, which compiles the routes
+of the endpoints known from the devices mapping: their first burst is warm.
+
+    python benchmarks/bench_router.py
+"""
+
+# standard libs
+from typing import Any, List
+
+from _env import best_of
+
+# plugin libs
+from app.mqtt.router import TopicRouter  # pylint:disable=wrong-import-order
+from app.zwave.zwave import ZwaveTopic  # pylint:disable=wrong-import-order
+
+NODES = 200
+TOPICS: List[str] = [
+    f'zwave/{node}/121/{endpoint}/{property_}'
+    for node in range(2, NODES + 2)
+    for endpoint in (1, 2)
+    for property_ in ('defaultVolume', 'toneId', 'volume')
+] + [f'zwave/{node}/status' for node in range(2, NODES + 2)] + [
+    'zwave/_CLIENTS/ZWAVE_GATEWAY-zw/api/sendCommand',
+    'zwave/_CLIENTS/ZWAVE_GATEWAY-zw/status',
+]
+
+
+def _handler(_record: Any, _message: Any) -> None:
+    """no-op handler"""
+
+
+def legacy_dispatch(topic: str) -> None:
+    """the dispatch of `App2._on_publish` + `CCSSNodes.update` before the router"""
+    if topic.startswith('zwave/_CLIENTS/'):
+        if topic.endswith('sendCommand'):
+            _handler(topic, None)
+        else:
+            _handler(topic, None)
+    elif '/121/' in topic:
+        topic_list = topic.split('/')
+        if len(topic_list) == 5:
+            _handler((int(topic_list[1]), int(topic_list[3]), topic_list[4]), None)
+    elif topic.endswith('sendCommand'):
+        _handler(topic, None)
+    elif topic.endswith('status'):
+        _handler(topic, None)
+
+
+def new_router() -> TopicRouter:
+    """the router as built by `App2`"""
+    router = TopicRouter(ZwaveTopic.from_levels)
+    for pattern in (
+            'zwave/_CLIENTS/+/api/sendCommand', 'zwave/_CLIENTS/+/status',
+            'zwave/_CLIENTS/+/version', 'zwave/+/status', 'zwave/+/121/+/+',
+            'zwave/+/114/0/+', 'zwave/+/134/0/firmwareVersions'):
+        router.register(pattern, _handler)
+    return router
+
+
+def cold_burst() -> None:
+    """a burst through a new router"""
+    router = new_router()
+    for topic in TOPICS:
+        router.route(topic, None)
+
+
+def prepare() -> None:
+    """the routes compiled at start"""
+    new_router().prepare(TOPICS)
+
+
+def main() -> None:
+    """run the benchmark"""
+    router = new_router()
+    legacy = best_of(lambda: [legacy_dispatch(topic) for topic in TOPICS])
+    cold = best_of(cold_burst, number=20)
+    warm = best_of(lambda: [router.route(topic, None) for topic in TOPICS])
+    at_start = best_of(prepare, number=20)
+    count = len(TOPICS)
+    print(f'{count} topics per burst')
+    print(f'legacy chain      : {legacy * 1e6 / count:6.2f} us/topic (untyped split, 3 patterns)')
+    print(f'TopicRouter, cold : {cold * 1e6 / count:6.2f} us/topic (typed ZwaveTopic, 7 patterns)')
+    print(f'TopicRouter, warm : {warm * 1e6 / count:6.2f} us/topic')
+    print(f'prepare at start  : {at_start * 1e6 / count:6.2f} us/topic, '
+          f'{at_start * 1e3:.1f} ms; the first burst then runs warm')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+# -*- coding: UTF-8 -*-
+"""Tones catalogues: 200 nodes x 2 endpoints x 30 tones
+
+Memory held by the tones (tracemalloc) and time of a full endpoint
+iteration: interned `ToneTable` shared by the nodes and their endpoints,
+vs the former layout (a dict of plain dataclasses per node, copied into
+every endpoint before each yield and cleared afterwards).
+
+    python benchmarks/bench_tones.py
+"""
+
+# standard libs
+import tracemalloc
+from dataclasses import make_dataclass
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+from _env import best_of
+
+# plugin libs
+from app.zwave.soundswitch import CCSSNodes  # pylint:disable=wrong-import-order
+from app.zwave.zwave import SendCommandResult, ZwaveTopic  # pylint:disable=wrong-import-order
+
+NODES = range(2, 202)
+ENDPOINTS = (1, 2)
+TONES = range(1, 31)
+
+LegacyToneValues = make_dataclass(
+    'SoundSwitchToneValues', [('name', str), ('duration', int), ('tone_id', int)]
+)
+
+
+class LegacyEndpoint:  # pylint:disable=too-few-public-methods
+    """the former endpoint: its own tones dict"""
+
+    def __init__(self) -> None:
+        """initialisation de la classe"""
+        self.tones: Dict[int, Any] = {}
+
+
+def build() -> CCSSNodes:
+    """the nodes, discovered the way the plugin does"""
+    nodes = CCSSNodes()
+    for node_id in NODES:
+        for endpoint_id in ENDPOINTS:
+            nodes.update_endpoint(ZwaveTopic(
+                topic=f'zwave/{node_id}/121/{endpoint_id}/toneId', node_id=node_id,
+                command_class=121, endpoint=endpoint_id, property='toneId'
+            ), {'time': 1, 'value': 0})
+        cur_node = nodes.get_node(node_id)
+        cur_node.start_discovery()
+        cur_node.tones_count = len(TONES)
+        for tone_id in TONES:
+            cur_node.update_tone(SendCommandResult(
+                args=[{'nodeId': node_id}, 'getToneInfo', [tone_id]], message='',
+                origin={}, success=True,
+                result={'name': f'{tone_id:02d} Tone{tone_id}', 'duration': tone_id}
+            ))
+        cur_node.status_value = True
+        cur_node.refresh_state()
+    return nodes
+
+
+def legacy_build() -> List[Tuple[Dict[int, Any], List[LegacyEndpoint]]]:
+    """the former layout"""
+    return [
+        (
+            {tone_id: LegacyToneValues(f'Tone{tone_id}', tone_id, tone_id) for tone_id in TONES},
+            [LegacyEndpoint() for _endpoint_id in ENDPOINTS]
+        ) for _node_id in NODES
+    ]
+
+
+def legacy_iter(nodes: List[Tuple[Dict[int, Any], List[LegacyEndpoint]]]) -> Iterator[LegacyEndpoint]:
+    """the former `CCSSNodes.__iter__`"""
+    for tones, endpoints in nodes:
+        for endpoint in endpoints:
+            endpoint.tones = tones.copy()
+            yield endpoint
+            endpoint.tones.clear()
+
+
+def held(func: Callable[[], Any]) -> Tuple[Any, float]:
+    """@return the result of `func` and the memory it holds, in KiB"""
+    tracemalloc.start()
+    result = func()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size / 1024
+
+
+def iteration_peak(iterate: Callable[[], Any]) -> float:
+    """@return the memory allocated during a full iteration, in KiB"""
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    iterate()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return (peak - base) / 1024
+
+
+def main() -> None:
+    """run the benchmark"""
+    nodes, size = held(build)
+    legacy, legacy_size = held(legacy_build)
+
+    def iterate() -> None:
+        """a full endpoint iteration"""
+        for _endpoint in nodes:
+            pass
+
+    def legacy_iterate() -> None:
+        """a full endpoint iteration, former layout"""
+        for _endpoint in legacy_iter(legacy):
+            pass
+
+    assert sum(1 for _endpoint in nodes) == len(NODES) * len(ENDPOINTS)
+    print(f'{len(NODES)} nodes x {len(ENDPOINTS)} endpoints x {len(TONES)} tones')
+    print(f'former : tones {legacy_size:7.0f} KiB, iteration {best_of(legacy_iterate) * 1e3:5.2f} ms, '
+          f'+{iteration_peak(legacy_iterate):.1f} KiB')
+    print(f'shared : nodes {size:7.0f} KiB, iteration {best_of(iterate) * 1e3:5.2f} ms, '
+          f'+{iteration_peak(iterate):.1f} KiB')
+
+
+if __name__ == '__main__':
+    main()
@@ -9,6 +9,7 @@ from typing import Any, Callable
 
 # app libs
 import Domoticz
+from helpers.common import DATACLASS_SLOTS
 
 __all__ = [
     'on_event',
@@ -25,7 +26,7 @@ __all__ = [
 ]
 
 
-@dataclass
+@dataclass(**DATACLASS_SLOTS)
 class BaseConnectionReponse:
     """BaseConnectionReponse"""
     connection: Domoticz.Connection
@@ -49,7 +50,7 @@ class OnConnectResponse(BaseConnectionReponse):
         return not self.status
 
 
-@dataclass
+@dataclass(**DATACLASS_SLOTS)
 class OnMessageResponse(BaseConnectionReponse):
     """OnMessageResponse"""
     data: dict = field(default_factory=dict)
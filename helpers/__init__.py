@@ -3,6 +3,8 @@
 """Initialisation module"""
 
 # Module libs
+import helpers.codec
+import helpers.shared_file
 import helpers.transport_protocol
 from helpers.app_config import AppConfig
 from helpers.common import *
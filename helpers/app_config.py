@@ -6,13 +6,16 @@
 # standard libs
 from __future__ import annotations
 
+import ast
 from dataclasses import dataclass
-from typing import Dict, Union
+from typing import Any, Dict, List, Optional, Union
 
 # plugin libs
 import Domoticz
 from helpers.common import debug, error
 
+DEVICE_MAPPING_VERSION = 1
+
 
 @dataclass
 class DeviceMappingDatas:
@@ -22,6 +25,41 @@ class DeviceMappingDatas:
     topic: str
     unit: int
 
+    def as_list(self: DeviceMappingDatas) -> list:
+        """@return the compact stored form"""
+        return [self.endpoint_id, self.node_id, self.topic, self.unit]
+
+    @classmethod
+    def from_list(cls: DeviceMappingDatas, value: List[Any]) -> Optional[DeviceMappingDatas]:
+        """build from the compact stored form
+        @return `None` if `value` does not match the schema
+        """
+        if not isinstance(value, list) or len(value) != 4:
+            return None
+        endpoint_id, node_id, topic, unit = value
+        if not all(isinstance(item, int) for item in (endpoint_id, node_id, unit)):
+            return None
+        if not isinstance(topic, str):
+            return None
+        return cls(endpoint_id, node_id, topic, unit)
+
+    @classmethod
+    def from_repr(cls: DeviceMappingDatas, value: str) -> Optional[DeviceMappingDatas]:
+        """build from the legacy `repr()` stored form; no eval
+        @return `None` if `value` is not a `DeviceMappingDatas(...)` repr
+        """
+        try:
+            call = ast.parse(value, mode='eval').body
+            if not isinstance(call, ast.Call) or getattr(call.func, 'id', '') != cls.__name__:
+                return None
+            kwargs = {
+                keyword.arg: ast.literal_eval(keyword.value)
+                for keyword in call.keywords
+            }
+            return cls(**kwargs)
+        except (SyntaxError, TypeError, ValueError):
+            return None
+
 
 class AppConfig:
     """Classe de définition des propriétés
@@ -64,11 +102,41 @@ class AppConfig:
 
     @property
     def device_mapping(self: AppConfig) -> Dict[str, DeviceMappingDatas]:
-        """Renvoie le device_mapping"""
+        """Renvoie le device_mapping
+
+        Stored as `{'version': 1, 'items': {device_id: [endpoint_id, node_id, topic, unit]}}`;
+        the legacy `{device_id: repr(DeviceMappingDatas)}` form is migrated once.
+        """
         # set default value if not exists
         if 'device_mapping' not in self._config:
-            self._config.update({'device_mapping': {}})
-        return self._config['device_mapping']
+            self.device_mapping = {}
+        stored = self._config['device_mapping']
+        if stored.get('version') == DEVICE_MAPPING_VERSION:
+            items = stored.get('items', {})
+            decoder = DeviceMappingDatas.from_list
+        else:  # legacy
+            items = stored
+            decoder = self._decode_legacy_mapping
+        mapping = {}
+        for device_id, item in items.items():
+            datas = decoder(item)
+            if datas is None:
+                error(f'Invalid device mapping dropped: {device_id}: {item}')
+                continue
+            mapping[device_id] = datas
+        if decoder is not DeviceMappingDatas.from_list:
+            debug(f'Migration du device_mapping: {len(mapping)} devices')
+            self.device_mapping = mapping
+        return mapping
+
+    @staticmethod
+    def _decode_legacy_mapping(item: Any) -> Optional[DeviceMappingDatas]:
+        """legacy device mapping item: repr string"""
+        if isinstance(item, DeviceMappingDatas):
+            return item
+        if isinstance(item, str):
+            return DeviceMappingDatas.from_repr(item)
+        return None
 
     @device_mapping.setter
     def device_mapping(self: AppConfig, value: Dict[str, DeviceMappingDatas]) -> None:
@@ -79,7 +147,15 @@ class AppConfig:
             )
         # debug(f'Mise à jour - device_mapping: {type(value)}{value}')
         # Mise à jour interne
-        self._config.update({'device_mapping': value})
+        self._config.update({
+            'device_mapping': {
+                'version': DEVICE_MAPPING_VERSION,
+                'items': {
+                    device_id: datas.as_list()
+                    for device_id, datas in value.items()
+                }
+            }
+        })
 
     @property
     def plan_id(self: AppConfig) -> int:
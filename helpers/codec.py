@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+"""JSON codec
+
+`orjson`, then `ujson`, are used when installed; stdlib `json` otherwise.
+`dumps` always returns compact utf-8 `bytes`, `loads` accepts `bytes` or `str`.
+"""
+
+# standard libs
+import json
+from typing import Any, Tuple, Union
+
+# every backend raises a `ValueError` (sub)class on invalid documents
+DecodeError = ValueError
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+if orjson is not None:
+    BACKEND = 'orjson'
+    _loads = orjson.loads
+
+    def _dumps(obj: Any) -> bytes:
+        """orjson encoder; non str keys converted, as stdlib does"""
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+elif ujson is not None:
+    BACKEND = 'ujson'
+    _loads = ujson.loads
+
+    def _dumps(obj: Any) -> bytes:
+        """ujson encoder"""
+        return ujson.dumps(obj, escape_forward_slashes=False).encode()
+else:
+    BACKEND = 'json'
+    _loads = json.loads
+
+    def _dumps(obj: Any) -> bytes:
+        """stdlib encoder"""
+        return json.dumps(obj, separators=(',', ':')).encode()
+
+# `<property>/set` payloads: volumes (0-100) and tone ids (0-255)
+_SMALL_INTS: Tuple[bytes, ...] = tuple(str(value).encode() for value in range(256))
+
+
+def dumps(obj: Any) -> bytes:
+    """@return `obj` encoded; the small integers are pre-encoded"""
+    if type(obj) is int and 0 <= obj <= 255:  # not bool
+        return _SMALL_INTS[obj]
+    return _dumps(obj)
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """@return the decoded `data`
+    @raise DecodeError: invalid JSON document
+    """
+    return _loads(data)
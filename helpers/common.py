@@ -3,6 +3,7 @@
 """Utilitaires"""
 
 # standards libs
+import sys
 from datetime import datetime
 from time import strptime
 
@@ -10,6 +11,9 @@ from time import strptime
 # Domoticz lib
 import Domoticz
 
+# `@dataclass(**DATACLASS_SLOTS)`: slotted dataclasses, python >= 3.10 only
+DATACLASS_SLOTS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
 
 def debug(*args: tuple, **kwargs: dict) -> None:
     """Extended log Debug"""
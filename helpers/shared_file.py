@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+"""Files shared by the hardware instances of the plugin
+
+Every change is done under an exclusive lock: re-read the file, merge,
+then replace it atomically, so an instance never loses the changes of
+another one and a reader never sees a half written file.
+"""
+
+# standard libs
+import os
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+
+# plugin libs
+from helpers import codec
+from helpers.common import error, status
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows: unlocked files
+    fcntl = None
+
+
+@contextmanager
+def locked(path: str) -> Iterator[None]:
+    """exclusive access to `path`, between the hardware instances"""
+    if fcntl is None or not path:
+        yield
+        return
+    try:
+        lock = open(path + '.lock', 'a', encoding='utf-8')  # pylint:disable=consider-using-with
+    except OSError as exc:
+        error(f'{path} not lockable: {exc}')
+        yield
+        return
+    with lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def read(path: str, version: int) -> Optional[Any]:
+    """@return the decoded `path`; `None` if missing, unreadable or of another version"""
+    if not path or not os.path.isfile(path):
+        return None
+    try:
+        with open(path, 'rb') as file:
+            datas = codec.loads(file.read())
+    except (OSError, codec.DecodeError) as exc:
+        error(f'{path} not readable: {exc}')
+        return None
+    if not isinstance(datas, dict) or datas.get('version') != version:
+        status(f'{path}: version changed; ignored')
+        return None
+    return datas
+
+
+def write(path: str, datas: Any, owner: object) -> None:
+    """replace `path` with `datas` encoded; atomic: never read half written
+    @arg owner (object): the writer, for a temporary file of its own
+    """
+    if not path:
+        return
+    temporary = f'{path}.{os.getpid()}.{id(owner)}'
+    try:
+        with open(temporary, 'wb') as file:
+            file.write(codec.dumps(datas))
+        os.replace(temporary, path)
+    except OSError as exc:
+        error(f'{path} not writable: {exc}')
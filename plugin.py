@@ -10,6 +10,9 @@
         <param field="Username" label="MQTT login" width="150px"/>
         <param field="Password" label="MQTT password" width="150px" password="true"/>
         <param field="Mode1" label="Plan name" width="100px"/>
+        <param field="Mode2" label="Discovery requests in flight" width="50px" default="8"/>
+        <param field="Mode3" label="Shard (1 for the first 84 endpoints, 2 for the next ones, ...)" width="50px" default="1"/>
+        <param field="Mode4" label="Domoticz JSON/API (address:port)" width="150px" default="127.0.0.1:8080"/>
         <param field="Mode6" label="Debugging">
             <options>
                 <option label="Nothing" value="0" default="true" />
@@ -89,9 +92,8 @@ def onDisconnect(odtr: domoticz.OnDisconnectResponse) -> None:  # pylint: disabl
     APP2.on_disconnect(odtr)
 
 
-@helpers.log_func('debug', separator_line=True)
 def onHeartbeat() -> None:  # pylint: disable=invalid-name
-    """onHeartbeat"""
+    """onHeartbeat; every second: not logged"""
     APP2.on_heartbeat()
 
 
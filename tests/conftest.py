@@ -0,0 +1,123 @@
+# -*- coding: UTF-8 -*-
+"""Tests environment: the plugin runs against `tests/stubs/Domoticz.py`"""
+
+# standard libs
+import json
+import os
+import sys
+from typing import Any, Dict, List
+
+# pytest
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'tests', 'stubs')]
+
+# plugin libs
+import Domoticz  # noqa: E402 pylint:disable=wrong-import-position
+from app.app2 import App2  # noqa: E402 pylint:disable=wrong-import-position
+from domoticz.responses import OnMessageResponse  # noqa: E402 pylint:disable=wrong-import-position
+
+GATEWAY = 'zwave/_CLIENTS/ZWAVE_GATEWAY-test'
+
+
+def parameters(home: str, **modes: str) -> Dict[str, Any]:
+    """the hardware `Parameters` given by Domoticz to `onStart`"""
+    return {
+        'Address': '127.0.0.1', 'Port': '1883', 'Username': '', 'Password': '',
+        'Mode1': '', 'Mode2': '', 'Mode3': '', 'Mode4': '', 'Mode5': '', 'Mode6': '0',
+        'Author': '', 'Database': '', 'DomoticzBuildTime': '', 'DomoticzHash': '',
+        'DomoticzVersion': '2023.1', 'HardwareID': 1, 'HomeFolder': home, 'Key': '',
+        'Language': 'fr', 'Name': 'ZW164', 'SerialPort': '', 'StartupFolder': home,
+        'UserDataFolder': home, 'Version': '2.2.0', 'WebRoot': '',
+        **modes
+    }
+
+
+class Broker:
+    """Plays zwave-js-ui and the MQTT broker for an `App2` instance"""
+
+    def __init__(self, home: str, **modes: str) -> None:
+        """initialisation de la classe"""
+        self.app2 = App2()
+        self.app2.on_start(parameters(home, **modes), Domoticz.DEVICES)
+        self.conn = self.app2._mqtt._conn  # pylint:disable=protected-access
+        # no rate limit on the discovery requests
+        self.app2._mqtt._outbound._bucket.rate = 1e9  # pylint:disable=protected-access
+        self.receive({'Verb': 'CONNACK', 'Description': 'Connection Accepted', 'Status': 0})
+
+    def receive(self, data: Dict[str, Any]) -> None:
+        """a message from the broker"""
+        self.app2.on_message(OnMessageResponse(self.conn, data))
+
+    def publish(self, topic: str, payload: Dict[str, Any], retain: bool = True) -> None:
+        """a PUBLISH from zwave-js-ui"""
+        self.receive({
+            'Verb': 'PUBLISH', 'Topic': topic, 'Retain': retain,
+            'Payload': json.dumps(payload).encode()
+        })
+
+    def value(self, topic: str, value: Any, retain: bool = True) -> None:
+        """a zwave-js-ui value (`time`/`value` payload)"""
+        self.publish(topic, {'time': 1, 'value': value}, retain)
+
+    def start_gateway(self, version: str = '9.0.0') -> None:
+        """the gateway `status` and `version`"""
+        self.value(GATEWAY + '/status', True)
+        self.value(GATEWAY + '/version', version)
+
+    def sent(self, suffix: str = '') -> List[Dict[str, Any]]:
+        """pop the PUBLISH sent by the plugin, on topics ending with `suffix`"""
+        sent = [
+            message for message in self.conn.sent
+            if message.get('Verb') == 'PUBLISH' and message['Topic'].endswith(suffix)
+        ]
+        self.conn.sent[:] = [message for message in self.conn.sent if message not in sent]
+        return sent
+
+    def commands(self) -> List[Dict[str, Any]]:
+        """pop the gateway `sendCommand` requests"""
+        return [json.loads(message['Payload']) for message in self.sent('/sendCommand/set')]
+
+    def reply(self, request: Dict[str, Any], result: Any, success: bool = True) -> None:
+        """the gateway `sendCommand` result of `request`; with a key the plugin ignores"""
+        self.publish(GATEWAY + '/api/sendCommand', {
+            'success': success, 'message': 'OK', 'result': result,
+            'args': request['args'], 'origin': request, 'time': 1
+        }, retain=False)
+
+
+def discover(broker: Broker, count: int, prefix: str = 'Tone') -> None:
+    """answer the pending tones discovery requests"""
+    while True:
+        requests = broker.commands()
+        if not requests:
+            return
+        for request in requests:
+            command, args = request['args'][1:]
+            if command == 'getToneCount':
+                broker.reply(request, count)
+            else:
+                broker.reply(request, {'name': f'{args[0]:02d} {prefix}{args[0]}', 'duration': 1})
+
+
+def identify(broker: Broker) -> None:
+    """the values and identification of node 2"""
+    broker.value('zwave/2/121/1/toneId', 0)
+    for property_, value in (
+            ('114/0/manufacturerId', 881), ('114/0/productType', 3),
+            ('114/0/productId', 164), ('134/0/firmwareVersions', ['1.6'])):
+        broker.value(f'zwave/2/{property_}', value)
+    broker.publish('zwave/2/status', {'time': 1, 'value': True, 'status': 'Alive', 'nodeId': 2})
+
+
+@pytest.fixture(autouse=True)
+def domoticz_reset() -> None:
+    """every test starts with an empty Domoticz"""
+    Domoticz.reset()
+
+
+@pytest.fixture
+def broker(tmp_path: Any) -> Broker:
+    """a started plugin, connected to the broker"""
+    return Broker(str(tmp_path) + os.sep)
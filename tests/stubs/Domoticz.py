@@ -0,0 +1,120 @@
+# -*- coding: UTF-8 -*-
+"""Minimal stand-in for the `Domoticz` module embedded by Domoticz
+
+Only what the plugin uses: logs, configuration, connections and devices.
+"""
+
+# standard libs
+import json
+from typing import Any, Dict, List, Tuple
+
+LOG: List[Tuple[str, str]] = []
+DEVICES: Dict[int, 'Device'] = {}
+_CONFIGURATION: Dict[str, Any] = {}
+
+
+def Debug(message: str) -> None:  # pylint:disable=invalid-name
+    """Domoticz.Debug"""
+    LOG.append(('debug', message))
+
+
+def Status(message: str) -> None:  # pylint:disable=invalid-name
+    """Domoticz.Status"""
+    LOG.append(('status', message))
+
+
+def Log(message: str) -> None:  # pylint:disable=invalid-name
+    """Domoticz.Log"""
+    LOG.append(('log', message))
+
+
+def Error(message: str) -> None:  # pylint:disable=invalid-name
+    """Domoticz.Error"""
+    LOG.append(('error', message))
+
+
+def Debugging(_level: int) -> None:  # pylint:disable=invalid-name
+    """Domoticz.Debugging"""
+
+
+def Heartbeat(_seconds: int) -> None:  # pylint:disable=invalid-name
+    """Domoticz.Heartbeat"""
+
+
+def Configuration(config: Dict[str, Any] = None) -> Dict[str, Any]:  # pylint:disable=invalid-name
+    """Domoticz.Configuration; stored as JSON, as Domoticz does"""
+    global _CONFIGURATION  # pylint:disable=global-statement
+    if config is not None:
+        _CONFIGURATION = json.loads(json.dumps(config, default=str))
+    return json.loads(json.dumps(_CONFIGURATION))
+
+
+def reset() -> None:
+    """forget the logs, devices and configuration"""
+    global _CONFIGURATION  # pylint:disable=global-statement
+    LOG.clear()
+    DEVICES.clear()
+    _CONFIGURATION = {}
+
+
+class Connection:
+    """Domoticz.Connection; the sent messages are kept in `sent`"""
+
+    def __init__(
+            self, Name: str = '', Transport: str = '',  # pylint:disable=invalid-name
+            Protocol: str = '', **kwargs: Any) -> None:  # pylint:disable=invalid-name
+        """initialisation de la classe"""
+        self.Name = Name  # pylint:disable=invalid-name
+        self.Transport = Transport  # pylint:disable=invalid-name
+        self.Protocol = Protocol  # pylint:disable=invalid-name
+        self.kwargs = kwargs
+        self.sent: List[Dict[str, Any]] = []
+        self._connected = False
+
+    def Connect(self) -> None:  # pylint:disable=invalid-name
+        """Connection.Connect"""
+        self._connected = True
+
+    def Connected(self) -> bool:  # pylint:disable=invalid-name
+        """Connection.Connected"""
+        return self._connected
+
+    def Connecting(self) -> bool:  # pylint:disable=invalid-name
+        """Connection.Connecting"""
+        return False
+
+    def Disconnect(self) -> None:  # pylint:disable=invalid-name
+        """Connection.Disconnect"""
+        self._connected = False
+
+    def Send(self, message: Dict[str, Any]) -> None:  # pylint:disable=invalid-name
+        """Connection.Send"""
+        self.sent.append(message)
+
+
+class Device:
+    """Domoticz.Device; created devices are kept in `DEVICES`, by unit"""
+    _last_id = 0
+
+    def __init__(self, **kwargs: Any) -> None:
+        """initialisation de la classe"""
+        Device._last_id += 1
+        self.ID = Device._last_id  # pylint:disable=invalid-name
+        self.nValue = 0  # pylint:disable=invalid-name
+        self.sValue = ''  # pylint:disable=invalid-name
+        self.Options: Dict[str, str] = {}  # pylint:disable=invalid-name
+        self.updates = 0
+        self.__dict__.update(kwargs)
+
+    def Create(self) -> None:  # pylint:disable=invalid-name
+        """Device.Create"""
+        DEVICES[self.Unit] = self
+
+    def Update(self, **kwargs: Any) -> None:  # pylint:disable=invalid-name
+        """Device.Update"""
+        self.updates += 1
+        self.__dict__.update(kwargs)
+
+    def Delete(self) -> None:  # pylint:disable=invalid-name
+        """Device.Delete"""
+        DEVICES.pop(self.Unit, None)
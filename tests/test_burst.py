@@ -0,0 +1,72 @@
+# -*- coding: UTF-8 -*-
+"""MQTT retained messages burst"""
+
+# standard libs
+from typing import Any, List
+
+# pytest
+import pytest
+
+# plugin libs
+import Domoticz
+from app.mqtt import burst
+from app.mqtt.burst import RetainedBurst
+from conftest import Broker, discover, identify
+
+
+class Clock:
+    """`time()` of the burst module, moved by hand"""
+
+    def __init__(self) -> None:
+        """initialisation de la classe"""
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        """time() wrapper"""
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: Any) -> Clock:
+    """a patched clock"""
+    patched = Clock()
+    monkeypatch.setattr(burst, 'time', patched)
+    return patched
+
+
+def test_last_item_per_key_after_idle(clock: Clock) -> None:
+    """applied once, 0.5s after the last retained message"""
+    applied: List[List[Any]] = []
+    retained = RetainedBurst(applied.append)
+    for value in (10, 20, 30):
+        retained.hold((2, 1), value)
+        clock.now += 0.3
+    retained.hold((3, 1), 5)
+    clock.now += 0.4
+    retained.check()
+    assert not applied  # within the idle window
+    clock.now += 0.2
+    retained.check()
+    assert applied == [[30, 5]]
+    retained.check()
+    assert len(applied) == 1
+    assert str(retained) == 'retained bursts: 1, 4 messages'
+
+
+def test_burst_gives_one_device_update(broker: Broker, clock: Clock) -> None:
+    """the retained values of an endpoint at resubscription: one update, the last value"""
+    broker.start_gateway()
+    identify(broker)
+    discover(broker, 3)
+    volume = next(device for device in Domoticz.DEVICES.values() if device.DeviceID == '2_1_volume')
+    updates = volume.updates
+    for value in (10, 20, 30):
+        broker.value('zwave/2/121/1/volume', value)
+        clock.now += 0.1
+    broker.app2.on_heartbeat()
+    assert volume.updates == updates  # the burst goes on
+    clock.now += 0.5
+    broker.app2.on_heartbeat()  # burst applied: staged
+    broker.app2.on_heartbeat()  # written
+    assert volume.updates == updates + 1
+    assert volume.sValue == '30'
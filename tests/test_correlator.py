@@ -0,0 +1,117 @@
+# -*- coding: UTF-8 -*-
+"""Gateway `sendCommand` correlator"""
+
+# standard libs
+from typing import Any, List
+
+# pytest
+import pytest
+
+# plugin libs
+from app.zwave import correlator
+from app.zwave.correlator import CommandCorrelator, GatewayCall
+from app.zwave.zwave import SendCommandResult, send_command_payload
+
+
+class Clock:
+    """`time()` of the correlator module, moved by hand"""
+
+    def __init__(self) -> None:
+        """initialisation de la classe"""
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        """time() wrapper"""
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: Any) -> Clock:
+    """a patched clock"""
+    patched = Clock()
+    monkeypatch.setattr(correlator, 'time', patched)
+    return patched
+
+
+def result(call: GatewayCall, value: Any, origin: Any = None, success: bool = True) -> SendCommandResult:
+    """the gateway result of `call`; `origin` echoed as is"""
+    return SendCommandResult(
+        args=call.payload['args'], message='OK', success=success, result=value,
+        origin=call.payload if origin is None else origin
+    )
+
+
+def test_timeout_retry_then_failed(clock: Clock) -> None:
+    """no reply: sent again `max_retries` times, then `on_error`"""
+    sent: List[GatewayCall] = []
+    failed: List[GatewayCall] = []
+    commands = CommandCorrelator(sent.append, timeout=10.0, max_retries=2)
+    call = commands.call(send_command_payload(2, 'getToneCount', []), on_error=failed.append)
+    clock.now += 5.0
+    commands.check_timeouts()
+    assert len(sent) == 1
+    for retries in (1, 2):
+        clock.now += 11.0
+        commands.check_timeouts()
+        assert (len(sent), call.retries) == (1 + retries, retries)
+    clock.now += 11.0
+    commands.check_timeouts()
+    assert failed == [call]
+    assert len(sent) == 3
+    assert len(commands) == 0
+    stats = commands.stats['getToneCount']
+    assert (stats.timeouts, stats.failures) == (3, 1)
+
+
+def test_untagged_reply_matched_on_args(clock: Clock) -> None:
+    """a result without `callId` resolves the call of the same node, command and args"""
+    replies: List[SendCommandResult] = []
+    commands = CommandCorrelator(lambda call: None)
+    first = commands.call(send_command_payload(2, 'getToneInfo', [1]), replies.append)
+    second = commands.call(send_command_payload(2, 'getToneInfo', [2]), replies.append)
+    clock.now += 0.2
+    assert commands.resolve(result(second, {'name': '02 Tone2'}, origin={}))
+    assert [reply.result for reply in replies] == [{'name': '02 Tone2'}]
+    assert len(commands) == 1
+    assert not commands.resolve(result(second, {'name': '02 Tone2'}, origin={}))
+    assert commands.resolve(result(first, {'name': '01 Tone1'}, origin={}))
+    assert commands.stats['getToneInfo'].worst == pytest.approx(0.2)
+
+
+def test_keyed_call_cancelled(clock: Clock) -> None:
+    """a play superseded by a `toneId/set` stop: its late result is not expected"""
+    replies: List[SendCommandResult] = []
+    commands = CommandCorrelator(lambda call: None)
+    play = commands.call(send_command_payload(2, 'play', [3, 40]), replies.append, key='2_1_tone')
+    commands.cancel('2_1_tone')
+    assert len(commands) == 0
+    assert not commands.resolve(result(play, None))
+    clock.now += 11.0
+    commands.check_timeouts()  # no retry of a cancelled call
+    assert not replies
+    assert commands.stats == {}
+
+
+def test_keyed_call_superseded(clock: Clock) -> None:
+    """a newer play of the endpoint replaces the pending one"""
+    sent: List[GatewayCall] = []
+    commands = CommandCorrelator(sent.append)
+    first = commands.call(send_command_payload(2, 'play', [3, 40]), key='2_1_tone')
+    second = commands.call(send_command_payload(2, 'play', [4, 40]), key='2_1_tone')
+    assert len(commands) == 1
+    assert not commands.resolve(result(first, None))
+    assert commands.resolve(result(second, None))
+    assert len(sent) == 2
+
+
+def test_unknown_result_keys_ignored(clock: Clock) -> None:
+    """a newer gateway adds keys to the result: still resolved"""
+    replies: List[SendCommandResult] = []
+    commands = CommandCorrelator(lambda call: None)
+    call = commands.call(send_command_payload(2, 'getToneCount', []), replies.append)
+    results = SendCommandResult.from_data({
+        'success': True, 'message': 'OK', 'result': 3, 'args': call.payload['args'],
+        'origin': call.payload, 'time': 1700000000000
+    })
+    assert commands.resolve(results)
+    assert [reply.result for reply in replies] == [3]
@@ -0,0 +1,53 @@
+# -*- coding: UTF-8 -*-
+"""Domoticz devices manager"""
+
+# standard libs
+import json
+import os
+from typing import Any
+
+# plugin libs
+import Domoticz
+from app.config import ZW164Config
+from app.devices.devices import DzDevices
+from app.devices.sharding import ShardRegistry
+from helpers.app_config import DeviceMappingDatas
+
+TOPICS = ('defaultVolume', 'volume', 'toneId')
+
+
+def test_moved_endpoints_devices_removed(tmp_path: Any) -> None:
+    """the endpoints now on shard 2 lose their shard 1 devices"""
+    endpoints = [f'{node_id}_1' for node_id in range(2, 102)]  # 100 endpoints
+    with open(os.path.join(tmp_path, ShardRegistry.FILE_NAME), 'w', encoding='utf-8') as file:
+        json.dump({'version': 1, 'endpoints': endpoints}, file)
+    mapping = {}
+    for unit, (node_id, topic) in enumerate(
+            ((node_id, topic) for node_id in (2, 90) for topic in TOPICS), start=1):
+        device_id = f'{node_id}_1_{topic}'
+        mapping[device_id] = DeviceMappingDatas(1, node_id, topic, unit)
+        Domoticz.Device(Unit=unit, DeviceID=device_id).Create()
+    with ZW164Config() as pcf:
+        pcf.device_mapping = mapping
+
+    dz_devices = DzDevices()
+    dz_devices.on_start({'HomeFolder': str(tmp_path), 'Mode3': '1'}, Domoticz.DEVICES)
+
+    # node 90 is at position 88: shard 2 with 84 endpoints per shard
+    assert sorted(device.DeviceID for device in Domoticz.DEVICES.values()) == sorted(
+        f'2_1_{topic}' for topic in TOPICS
+    )
+    with ZW164Config() as pcf:
+        assert sorted(pcf.device_mapping) == sorted(f'2_1_{topic}' for topic in TOPICS)
+    assert dz_devices.get_next_unit_id() == 4
+
+
+def test_staged_updates_saved() -> None:
+    """30, 40 then back to the written 0: 3 writes without staging, none done"""
+    dz_devices = DzDevices()
+    device = Domoticz.Device(Unit=1, DeviceID='2_1_volume', nValue=0, sValue='0')
+    assert dz_devices._stage(device, {'nValue': 2, 'sValue': '30'})  # pylint:disable=protected-access
+    assert dz_devices._stage(device, {'nValue': 2, 'sValue': '40'})  # pylint:disable=protected-access
+    assert not dz_devices._stage(device, {'nValue': 0, 'sValue': '0'})  # pylint:disable=protected-access
+    dz_devices.flush_updates(force=True)
+    assert (dz_devices.updates_saved, dz_devices.updates_written, device.updates) == (3, 0, 0)
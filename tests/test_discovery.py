@@ -0,0 +1,152 @@
+# -*- coding: UTF-8 -*-
+"""Per node discovery state machine"""
+
+# standard libs
+import random
+from typing import Any, Callable, Dict, List
+
+# plugin libs
+import Domoticz
+from app import app2
+from app.zwave import correlator, soundswitch
+from app.zwave.soundswitch import CCSSNodes, NodeState
+from conftest import Broker
+
+NODES = range(2, 52)  # 50 synthetic nodes
+ENDPOINTS = (1, 2)
+
+
+def tones_count(node_id: int) -> int:
+    """every node model has its own catalogue"""
+    return 3 + node_id % 5
+
+
+def node_traffic(broker: Broker, node_id: int) -> List[Callable[[], None]]:
+    """the retained messages of a node, in the order zwave-js-ui sends them"""
+    traffic = []
+    for endpoint_id in ENDPOINTS:
+        for property_, value in (('defaultVolume', 50), ('toneId', 0), ('volume', 0)):
+            topic = f'zwave/{node_id}/121/{endpoint_id}/{property_}'
+            traffic.append(lambda topic=topic, value=value: broker.value(topic, value))
+    for property_, value in (
+            ('114/0/manufacturerId', 881), ('114/0/productType', 3),
+            ('114/0/productId', 164), ('134/0/firmwareVersions', [f'1.{node_id}'])):
+        topic = f'zwave/{node_id}/{property_}'
+        traffic.append(lambda topic=topic, value=value: broker.value(topic, value))
+    traffic.append(lambda: broker.publish(
+        f'zwave/{node_id}/status',
+        {'time': 1, 'value': True, 'status': 'Alive', 'nodeId': node_id}
+    ))
+    return traffic
+
+
+def answer(broker: Broker, request: Dict[str, Any]) -> None:
+    """reply to a discovery request"""
+    node_id = request['args'][0]['nodeId']
+    command, args = request['args'][1:]
+    if command == 'getToneCount':
+        broker.reply(request, tones_count(node_id))
+    elif command == 'getToneInfo':
+        broker.reply(request, {'name': f'{args[0]:02d} N{node_id}T{args[0]}', 'duration': args[0]})
+
+
+def test_interleaved_discovery_of_50_nodes(broker: Broker) -> None:
+    """the traffic of 50 nodes, interleaved with the gateway replies"""
+    rand = random.Random(164)
+    broker.start_gateway()
+    pending = {node_id: node_traffic(broker, node_id) for node_id in NODES}
+    requests: List[Dict[str, Any]] = []
+    answered = 0
+    while pending or requests:
+        requests.extend(broker.commands())
+        if requests and (not pending or rand.random() < 0.3):
+            # replies come back out of order
+            answer(broker, requests.pop(rand.randrange(len(requests))))
+            answered += 1
+            continue
+        node_id = rand.choice(list(pending))
+        pending[node_id].pop(0)()
+        if not pending[node_id]:
+            del pending[node_id]
+        requests.extend(broker.commands())
+
+    # every model is new: one getToneCount and one getToneInfo per tone
+    assert answered == sum(1 + tones_count(node_id) for node_id in NODES)
+    nodes = broker.app2._soundswitches  # pylint:disable=protected-access
+    assert len(nodes) == len(NODES)
+    assert nodes.is_complete()
+    for node_id in NODES:
+        cur_node = nodes.get_node(node_id)
+        assert cur_node.state is NodeState.COMPLETE
+        assert cur_node.tones_count == tones_count(node_id)
+        assert [tone.name for tone_id, tone in cur_node.tones.items() if 0 < tone_id < 255] == [
+            f'N{node_id}T{tone_id}' for tone_id in range(1, tones_count(node_id) + 1)
+        ]
+        assert sorted(cur_node.endpoints) == list(ENDPOINTS)
+        for endpoint in cur_node.endpoints.values():
+            assert endpoint.tones is cur_node.tones
+            assert endpoint.defaultVolume == 50
+
+
+def test_nodes_managers_share_nothing() -> None:
+    """two managers don't see each other nodes"""
+    first, second = CCSSNodes(), CCSSNodes()
+    assert first.get_node(2) is None
+    first._nodes[2] = object()  # pylint:disable=protected-access
+    assert second.get_node(2) is None
+    assert len(second) == 0
+
+
+def test_status_before_the_first_value(broker: Broker) -> None:
+    """the node status comes before its soundswitch values: kept for the node"""
+    broker.start_gateway()
+    traffic = node_traffic(broker, 2)
+    traffic.insert(0, traffic.pop())  # status first
+    for message in traffic:
+        message()
+    while True:
+        requests = broker.commands()
+        if not requests:
+            break
+        for request in requests:
+            answer(broker, request)
+    cur_node = broker.app2._soundswitches.get_node(2)  # pylint:disable=protected-access
+    assert cur_node.state is NodeState.COMPLETE
+    assert sorted(
+        device.DeviceID for device in Domoticz.DEVICES.values() if device.DeviceID != '0_0_group'
+    ) == sorted(
+        f'2_{endpoint_id}_{topic}' for endpoint_id in ENDPOINTS
+        for topic in ('defaultVolume', 'toneId', 'volume')
+    )
+
+
+def test_given_up_discovery_is_retried(broker: Broker, monkeypatch: Any) -> None:
+    """no reply after the retries: the node is identified again, then discovered"""
+    now = [1000.0]
+    for module in (app2, correlator, soundswitch):
+        monkeypatch.setattr(module, 'time', lambda: now[0])
+    broker.start_gateway()
+    for message in node_traffic(broker, 2):
+        message()
+    commands = broker.app2._commands  # pylint:disable=protected-access
+    cur_node = broker.app2._soundswitches.get_node(2)  # pylint:disable=protected-access
+    assert [request['args'][1] for request in broker.commands()] == ['getToneCount']
+    for _retry in range(commands.max_retries):
+        now[0] += commands.timeout + 1
+        broker.app2.on_heartbeat()
+        assert [request['args'][1] for request in broker.commands()] == ['getToneCount']
+    now[0] += commands.timeout + 1
+    broker.app2.on_heartbeat()
+    assert cur_node.state is NodeState.IDENTIFYING
+    assert not broker.commands()
+
+    now[0] += app2.IDENTIFICATION_TIMEOUT + 1
+    broker.app2.on_heartbeat()
+    assert cur_node.state is NodeState.DISCOVERING
+    requests = broker.commands()
+    while requests:
+        for request in requests:
+            answer(broker, request)
+        requests = broker.commands()
+    assert cur_node.state is NodeState.COMPLETE
+    assert cur_node.tones_count == tones_count(2)
@@ -0,0 +1,83 @@
+# -*- coding: UTF-8 -*-
+"""`All sirens`: gateway multicast, per node fallback"""
+
+# standard libs
+import json
+from typing import Any, Dict, List
+
+# plugin libs
+import Domoticz
+from app.devices.devices import GROUP_DEVICE_ID
+from conftest import GATEWAY, Broker
+from domoticz.responses import OnCommandResponse
+
+NODES = (2, 3)
+
+
+def complete_nodes(broker: Broker) -> None:
+    """two nodes of the same model, one endpoint each, discovered"""
+    broker.start_gateway()
+    for node_id in NODES:
+        broker.value(f'zwave/{node_id}/121/1/toneId', 0)
+        for property_, value in (
+                ('114/0/manufacturerId', 881), ('114/0/productType', 3),
+                ('114/0/productId', 164), ('134/0/firmwareVersions', ['1.6'])):
+            broker.value(f'zwave/{node_id}/{property_}', value)
+        broker.publish(
+            f'zwave/{node_id}/status', {'time': 1, 'value': True, 'status': 'Alive', 'nodeId': node_id}
+        )
+        requests = broker.commands()
+        while requests:
+            for request in requests:
+                command, args = request['args'][1:]
+                if command == 'getToneCount':
+                    broker.reply(request, 2)
+                else:
+                    broker.reply(request, {'name': f'{args[0]:02d} Tone{args[0]}', 'duration': 1})
+            requests = broker.commands()
+    assert broker.app2._soundswitches.is_complete()  # pylint:disable=protected-access
+    broker.sent()
+
+
+def all_sirens(broker: Broker, command: str) -> List[Dict[str, Any]]:
+    """switch `All sirens`; @return its publishes"""
+    unit = next(
+        device.Unit for device in Domoticz.DEVICES.values() if device.DeviceID == GROUP_DEVICE_ID
+    )
+    broker.app2.on_command(OnCommandResponse(unit, command))
+    return broker.sent()
+
+
+def test_multicast_then_unicast_fallback(broker: Broker) -> None:
+    """the gateway refuses the multicast: one publish per node, then unicast only"""
+    complete_nodes(broker)
+    sent = all_sirens(broker, 'On')
+    assert [message['Topic'] for message in sent] == [GATEWAY + '/api/writeMulticast/set']
+    request = json.loads(sent[0]['Payload'])
+    assert request == {'args': [[2, 3], {'commandClass': 121, 'endpoint': 1, 'property': 'toneId'}, 255]}
+
+    broker.publish(GATEWAY + '/api/writeMulticast', {
+        'success': False, 'message': 'Unknown Api writeMulticast',
+        'args': request['args'], 'origin': request
+    }, retain=False)
+    assert [(message['Topic'], json.loads(message['Payload'])) for message in broker.sent()] == [
+        ('zwave/2/121/1/toneId/set', 255), ('zwave/3/121/1/toneId/set', 255)
+    ]
+
+    assert [message['Topic'] for message in all_sirens(broker, 'Off')] == [
+        'zwave/2/121/1/toneId/set', 'zwave/3/121/1/toneId/set'
+    ]
+
+
+def test_multicast_success(broker: Broker) -> None:
+    """an answered multicast: no fallback, the next one multicast too"""
+    complete_nodes(broker)
+    request = json.loads(all_sirens(broker, 'On')[0]['Payload'])
+    broker.publish(GATEWAY + '/api/writeMulticast', {
+        'success': True, 'message': 'Success zwave api call', 'result': True,
+        'args': request['args'], 'origin': request
+    }, retain=False)
+    assert not broker.sent()
+    assert [message['Topic'] for message in all_sirens(broker, 'Off')] == [
+        GATEWAY + '/api/writeMulticast/set'
+    ]
@@ -0,0 +1,33 @@
+# -*- coding: UTF-8 -*-
+"""JSON/API answers decoding"""
+
+# standard libs
+import gzip
+import json
+from typing import Any
+
+# plugin libs
+from app.jsonapi import http
+from app.plan.plan import GetPlanDevicesData
+
+BODY = json.dumps({
+    'result': [
+        {'DevSceneRowID': str(index), 'Name': 'x', 'devidx': str(index),
+         'idx': str(100 + index), 'order': '1', 'type': 0 if index % 3 else 1}
+        for index in range(300)
+    ],
+    'status': 'OK', 'title': 'GetPlanDevices'
+}, indent=1).encode()
+
+
+def test_streamed_above_the_threshold(monkeypatch: Any) -> None:
+    """one call below the threshold, streamed above: the same result"""
+    raw_data = gzip.compress(BODY)
+    expected = [
+        (index, 100 + index) for index in range(300) if index % 3
+    ]
+    assert http.HData(raw_data, 'gzip', GetPlanDevicesData.from_result).result == expected
+    monkeypatch.setattr(http, 'STREAM_THRESHOLD', len(BODY) - 1)
+    monkeypatch.setattr(http._StreamDecoder, 'CHUNK_SIZE', 64)  # pylint:disable=protected-access
+    assert http.HData(raw_data, 'gzip', GetPlanDevicesData.from_result).result == expected
+    assert http.HData(BODY, '', GetPlanDevicesData.from_result).result == expected
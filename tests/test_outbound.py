@@ -0,0 +1,129 @@
+# -*- coding: UTF-8 -*-
+"""MQTT outbound queue and scheduler"""
+
+# standard libs
+from typing import Any
+
+# pytest
+import pytest
+
+# plugin libs
+from app.mqtt import outbound
+from app.mqtt.outbound import CoalescingQueue, Priority, PublishScheduler
+
+
+class Clock:
+    """`time()` of the outbound module, moved by hand"""
+
+    def __init__(self) -> None:
+        """initialisation de la classe"""
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        """time() wrapper"""
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: Any) -> Clock:
+    """a patched clock"""
+    patched = Clock()
+    monkeypatch.setattr(outbound, 'time', patched)
+    return patched
+
+
+def test_newer_payload_replaces_the_pending_one(clock: Clock) -> None:
+    """a volume drag: the first value at once, only the last one of the burst next"""
+    queue = CoalescingQueue(latency=0.5)
+    queue.put('zwave/2/121/1/defaultVolume/set', 10)
+    assert queue.pop_due() == [('zwave/2/121/1/defaultVolume/set', 10, clock.now)]
+    for value in (20, 30, 40):
+        clock.now += 0.1
+        queue.put('zwave/2/121/1/defaultVolume/set', value)
+    assert queue.pop_due() == []  # within the latency budget
+    clock.now += 0.2
+    assert queue.pop_due() == [('zwave/2/121/1/defaultVolume/set', 40, 1000.1)]
+    assert (queue.sent, queue.coalesced) == (2, 2)
+
+
+def test_coalescing_by_key(clock: Clock) -> None:
+    """the key groups different topics; other keys are not coalesced"""
+    queue = CoalescingQueue(latency=0.5)
+    queue.put('gateway/sendCommand/set', 'play 3', key='2_1_tone')
+    queue.put('zwave/2/121/1/toneId/set', 'stop', key='2_1_tone')
+    queue.put('gateway/sendCommand/set', 'play 4', key='3_1_tone')
+    assert sorted(queue.pop_due()) == [
+        ('gateway/sendCommand/set', 'play 4', clock.now),
+        ('zwave/2/121/1/toneId/set', 'stop', clock.now),
+    ]
+    assert queue.coalesced == 1
+
+
+def test_flush_all(clock: Clock) -> None:
+    """at stop, the pending publishes go out before their due time"""
+    queue = CoalescingQueue(latency=0.5)
+    queue.put('topic', 1)
+    queue.pop_due()
+    queue.put('topic', 2)
+    assert queue.pop_due() == []
+    assert queue.pop_due(flush_all=True) == [('topic', 2, clock.now)]
+    assert len(queue) == 0
+
+
+def test_interactive_before_background(clock: Clock) -> None:
+    """the user commands go out ahead of the discovery traffic queued before them"""
+    scheduler = PublishScheduler()
+    for tone_id in range(1, 4):
+        scheduler.put('gateway/sendCommand/set', f'getToneInfo {tone_id}', Priority.BACKGROUND)
+    scheduler.put('zwave/2/121/1/toneId/set', 3)
+    assert scheduler.pop_ready() == [
+        ('zwave/2/121/1/toneId/set', 3),
+        ('gateway/sendCommand/set', 'getToneInfo 1'),
+        ('gateway/sendCommand/set', 'getToneInfo 2'),
+        ('gateway/sendCommand/set', 'getToneInfo 3'),
+    ]
+
+
+def test_background_burst_then_rate(clock: Clock) -> None:
+    """8 background publishes at once, then 10 per second"""
+    scheduler = PublishScheduler(background_rate=10.0, background_burst=8)
+    for index in range(30):
+        scheduler.put('gateway/sendCommand/set', index, Priority.BACKGROUND)
+    assert len(scheduler.pop_ready()) == 8
+    assert scheduler.pop_ready() == []
+    clock.now += 0.1
+    assert scheduler.pop_ready() == [('gateway/sendCommand/set', 8)]
+    clock.now += 1.0
+    assert [payload for _topic, payload in scheduler.pop_ready()] == list(range(9, 17))  # capped
+    clock.now += 0.5
+    assert len(scheduler.pop_ready()) == 5
+    assert len(scheduler) == 30 - 22
+
+
+def test_wait_stats(clock: Clock) -> None:
+    """the queue waits, per priority class"""
+    scheduler = PublishScheduler(latency=0.5, background_rate=10.0, background_burst=1)
+    scheduler.put('a', 1, Priority.BACKGROUND)
+    scheduler.put('b', 2, Priority.BACKGROUND)
+    scheduler.pop_ready()
+    clock.now += 0.3
+    scheduler.pop_ready()
+    background = scheduler.stats[Priority.BACKGROUND]
+    assert (background.count, background.worst) == (2, pytest.approx(0.3))
+    assert background.total == pytest.approx(0.3)
+    scheduler.send_now()
+    assert scheduler.stats[Priority.INTERACTIVE].count == 1
+    assert 'background: 2 sent, wait mean 150ms max 300ms' in str(scheduler)
+
+
+def test_coalesced_publish_bound(clock: Clock) -> None:
+    """on a quiet bus the heartbeat flushes: at most latency + 1s"""
+    scheduler = PublishScheduler(latency=0.5)
+    scheduler.put('zwave/2/121/1/defaultVolume/set', 10)
+    scheduler.pop_ready()
+    clock.now += 0.01
+    scheduler.put('zwave/2/121/1/defaultVolume/set', 40)
+    clock.now += 0.98  # no message until the next heartbeat
+    assert scheduler.pop_ready() == [('zwave/2/121/1/defaultVolume/set', 40)]
+    assert scheduler.stats[Priority.INTERACTIVE].worst == pytest.approx(0.98)
+    assert scheduler.stats[Priority.INTERACTIVE].worst < 0.5 + 1.0
@@ -0,0 +1,114 @@
+# -*- coding: UTF-8 -*-
+"""Plan synchronisation and the cached plan id"""
+
+# standard libs
+import json
+import re
+from typing import Any, Dict, List
+
+# plugin libs
+import Domoticz
+from app.config import ZW164Config
+from app.plan.plan import PlanAutomation
+from domoticz.responses import OnConnectResponse, OnMessageResponse
+
+HEADERS = {'Content-Type': 'application/json', 'Connection': 'Keep-Alive'}
+
+
+class Server:
+    """Plays the Domoticz JSON/API for a `PlanAutomation`"""
+
+    def __init__(self, plans: Dict[int, str], members: Dict[int, List[int]]) -> None:
+        """initialisation de la classe"""
+        self.plans = plans  # idx: name
+        self.members = members  # plan idx: devidx
+        self.urls: List[str] = []
+
+    def serve(self, plan: PlanAutomation) -> None:
+        """answer the requests until the plan stops calling"""
+        con = plan._api._con  # pylint:disable=protected-access
+        plan.on_connect(OnConnectResponse(con, 0, ''))
+        while con.sent:
+            url = con.sent.pop(0)['URL']
+            self.urls.append(url)
+            query = dict(re.findall(r'(\w+)=([^&]*)', url))
+            body: Dict[str, Any] = {'status': 'OK'}
+            if query.get('type') == 'plans':
+                body['result'] = [
+                    {'Devices': len(self.members.get(idx, [])), 'Name': name, 'Order': '1', 'idx': str(idx)}
+                    for idx, name in self.plans.items()
+                ]
+            elif query['param'] == 'getplandevices' and self.members.get(int(query['idx'])):
+                # no `result` for an empty plan
+                body['result'] = [
+                    {'DevSceneRowID': str(devidx), 'Name': 'x', 'devidx': str(devidx),
+                     'idx': str(1000 + devidx), 'order': '1', 'type': 0}
+                    for devidx in self.members[int(query['idx'])]
+                ]
+            elif query.get('param') == 'addplanactivedevice':
+                self.members.setdefault(int(query['idx']), []).append(int(query['activeidx']))
+            plan.on_message(OnMessageResponse(
+                con, {'Status': '200', 'Headers': HEADERS, 'Data': json.dumps(body).encode()}
+            ))
+
+    def listed(self) -> bool:
+        """the plans list has been requested"""
+        return any('type=plans' in url for url in self.urls)
+
+
+def started(server: Server, cached_id: int, devices: List[int]) -> PlanAutomation:
+    """a plan started with `cached_id` in the configuration"""
+    with ZW164Config() as pcf:
+        pcf.plan_id = cached_id
+        pcf.plan_name = 'Sirens'
+    plan = PlanAutomation()
+    plan.on_start({'Mode1': 'Sirens'}, devices)
+    server.serve(plan)
+    return plan
+
+
+def test_cached_id_holding_our_devices() -> None:
+    """the plan holds our devices: trusted without the plans list"""
+    server = Server({3: 'Kitchen', 7: 'Sirens'}, {7: [21, 22]})
+    plan = started(server, 7, [21, 22, 23])
+    assert not server.listed()
+    assert plan._plan_id == 7  # pylint:disable=protected-access
+    assert server.members[7] == [21, 22, 23]
+
+
+def test_cached_id_reused_by_another_room() -> None:
+    """the cached id is now another room with devices: the plan is looked up by name"""
+    server = Server({7: 'Kitchen', 9: 'Sirens'}, {7: [40], 9: [21]})
+    plan = started(server, 7, [21, 22])
+    assert server.listed()
+    assert plan._plan_id == 9  # pylint:disable=protected-access
+    assert server.members == {7: [40], 9: [21, 22]}
+    assert Domoticz.Configuration()['plan_id'] == 9
+
+
+def test_cached_id_of_an_empty_plan() -> None:
+    """our plan is empty: checked by name, kept, and not created again"""
+    server = Server({3: 'Kitchen', 7: 'Sirens'}, {})
+    plan = started(server, 7, [])
+    assert server.listed()
+    assert not any('addplan&' in url for url in server.urls)
+    assert plan._plan_id == 7  # pylint:disable=protected-access
+    plan.add_device([21])
+    server.serve(plan)
+    assert server.members == {7: [21]}
+    # next start: the plan holds our device
+    server.urls.clear()
+    started(server, 7, [21])
+    assert not server.listed()
+
+
+def test_api_endpoint() -> None:
+    """the JSON/API client connects to `Mode4`; the default if invalid"""
+    for mode4, endpoint in (
+            ('192.168.1.10:8443', ('192.168.1.10', '8443')),
+            ('', ('127.0.0.1', '8080')),
+            ('domoticz', ('127.0.0.1', '8080'))):
+        plan = PlanAutomation()
+        plan.on_start({'Mode1': 'Sirens', 'Mode4': mode4})
+        con = plan._api._con  # pylint:disable=protected-access
+        assert (con.kwargs['Address'], con.kwargs['Port']) == endpoint
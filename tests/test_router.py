@@ -0,0 +1,37 @@
+# -*- coding: UTF-8 -*-
+"""MQTT topic router"""
+
+# standard libs
+from typing import Any, List
+
+# plugin libs
+import Domoticz
+from app.mqtt.router import TopicRouter
+from app.zwave.zwave import ZwaveTopic
+
+
+def new_router(calls: List[Any]) -> TopicRouter:
+    """a router with the node status pattern"""
+    router = TopicRouter(ZwaveTopic.from_levels)
+    router.register('zwave/+/status', lambda record, message: calls.append((record, message)))
+    return router
+
+
+def test_unexpected_topic_logged_once() -> None:
+    """a topic the parser refuses: one error, then no route"""
+    calls: List[Any] = []
+    router = new_router(calls)
+    assert not router.route('zwave/kitchen/status', 1)
+    assert not router.route('zwave/kitchen/status', 2)
+    assert not calls
+    assert len([message for _level, message in Domoticz.LOG if 'Unexpected topic' in message]) == 1
+
+
+def test_prepared_topics() -> None:
+    """the routes of the known topics are compiled before their first message"""
+    calls: List[Any] = []
+    router = new_router(calls)
+    router.prepare(['zwave/2/status'])
+    router._compile_route = None  # pylint:disable=protected-access
+    assert router.route('zwave/2/status', 'alive')
+    assert calls == [(ZwaveTopic('zwave/2/status', node_id=2, property='status'), 'alive')]
@@ -0,0 +1,73 @@
+# -*- coding: UTF-8 -*-
+"""Endpoints sharding between hardware instances"""
+
+# standard libs
+import json
+import os
+import random
+from threading import Thread
+from typing import Any, List, Tuple
+
+# plugin libs
+from app.devices.sharding import ShardRegistry
+
+ENDPOINTS: List[Tuple[int, int]] = [(node_id, endpoint_id) for node_id in range(2, 22) for endpoint_id in (1, 2)]
+
+
+def new_registry(home: str, shard: int) -> ShardRegistry:
+    """a started hardware instance"""
+    registry = ShardRegistry(capacity=8)
+    registry.on_start({'HomeFolder': home, 'Mode3': str(shard)})
+    return registry
+
+
+def test_instances_agree_whatever_the_order(tmp_path: Any) -> None:
+    """the instances discover the endpoints in their own order"""
+    registries = [new_registry(str(tmp_path), shard) for shard in (1, 2, 3, 4, 5)]
+    for seed, registry in enumerate(registries):
+        order = list(ENDPOINTS)
+        random.Random(seed).shuffle(order)
+        for node_id, endpoint_id in order[:len(order) // 2]:
+            registry.shard_of(node_id, endpoint_id)
+    for seed, registry in enumerate(registries):
+        order = list(ENDPOINTS)
+        random.Random(seed).shuffle(order)
+        for node_id, endpoint_id in order[len(order) // 2:]:
+            registry.shard_of(node_id, endpoint_id)
+    for endpoint in ENDPOINTS:
+        owners = [registry.shard for registry in registries if registry.is_local(*endpoint)]
+        assert len(owners) == 1, endpoint
+
+
+def test_stale_instance_keeps_the_other_registrations(tmp_path: Any) -> None:
+    """an instance registering from an outdated registry loses nothing"""
+    first, second = new_registry(str(tmp_path), 1), new_registry(str(tmp_path), 2)
+    first.shard_of(2, 1)
+    second.shard_of(3, 1)  # `second` had not seen (2, 1)
+    with open(os.path.join(tmp_path, ShardRegistry.FILE_NAME), encoding='utf-8') as file:
+        assert json.load(file)['endpoints'] == ['2_1', '3_1']
+    assert new_registry(str(tmp_path), 1).shard_of(3, 1) == first.shard_of(3, 1)
+
+
+def test_concurrent_registrations(tmp_path: Any) -> None:
+    """instances registering at the same time: each endpoint once, same positions"""
+    registries = [new_registry(str(tmp_path), shard) for shard in (1, 2, 3, 4)]
+
+    def discover(registry: ShardRegistry, seed: int) -> None:
+        order = list(ENDPOINTS)
+        random.Random(seed).shuffle(order)
+        for endpoint in order:
+            registry.shard_of(*endpoint)
+
+    threads = [Thread(target=discover, args=(registry, seed)) for seed, registry in enumerate(registries)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    with open(os.path.join(tmp_path, ShardRegistry.FILE_NAME), encoding='utf-8') as file:
+        stored = json.load(file)['endpoints']
+    assert sorted(stored) == sorted(f'{node_id}_{endpoint_id}' for node_id, endpoint_id in ENDPOINTS)
+    for position, key in enumerate(stored):
+        node_id, endpoint_id = map(int, key.split('_'))
+        for registry in registries:
+            assert registry.shard_of(node_id, endpoint_id) == position // 8 + 1
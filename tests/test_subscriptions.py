@@ -0,0 +1,72 @@
+# -*- coding: UTF-8 -*-
+"""MQTT subscriptions manager"""
+
+# standard libs
+from typing import Any, List, Tuple
+
+# plugin libs
+from app.app2 import SOUNDSWITCH_WILDCARD
+from app.mqtt.subscriptions import SubscriptionManager
+from conftest import GATEWAY, Broker
+
+
+def new_manager(packets: List[Tuple[str, List[str]]]) -> SubscriptionManager:
+    """a manager recording its SUBSCRIBE/UNSUBSCRIBE packets"""
+    return SubscriptionManager(
+        lambda topics: packets.append(('SUBSCRIBE', topics)),
+        lambda topics: packets.append(('UNSUBSCRIBE', topics))
+    )
+
+
+def test_changes_batched_in_one_packet_each() -> None:
+    """only the difference is sent, subscribe first"""
+    packets: List[Tuple[str, List[str]]] = []
+    subscriptions = new_manager(packets)
+    subscriptions.add('zwave/+/status', 'zwave/+/121/+/+')
+    subscriptions.apply()
+    assert packets == [('SUBSCRIBE', ['zwave/+/121/+/+', 'zwave/+/status'])]
+
+    packets.clear()
+    subscriptions.discard('zwave/+/121/+/+')
+    subscriptions.add('zwave/2/121/1/toneId', 'zwave/2/121/1/volume')
+    subscriptions.discard('zwave/2/121/1/volume')  # never sent
+    subscriptions.apply()
+    assert packets == [
+        ('SUBSCRIBE', ['zwave/2/121/1/toneId']),
+        ('UNSUBSCRIBE', ['zwave/+/121/+/+'])
+    ]
+
+    packets.clear()
+    subscriptions.add('zwave/+/status')
+    subscriptions.apply()
+    assert not packets
+
+
+def test_reset_subscribes_again() -> None:
+    """a new broker session: every wanted topic is subscribed again"""
+    packets: List[Tuple[str, List[str]]] = []
+    subscriptions = new_manager(packets)
+    subscriptions.add('zwave/+/status')
+    subscriptions.apply()
+    subscriptions.reset()
+    subscriptions.apply()
+    assert packets == [('SUBSCRIBE', ['zwave/+/status'])] * 2
+
+
+def subscribed(broker: Broker) -> List[Any]:
+    """pop the topics of the SUBSCRIBE packets sent by the plugin"""
+    packets = [message for message in broker.conn.sent if message.get('Verb') == 'SUBSCRIBE']
+    broker.conn.sent.clear()
+    return [topic['Topic'] for packet in packets for topic in packet['Topics']]
+
+
+def test_subscriptions_restored_on_connack(broker: Broker) -> None:
+    """after a reconnection, the gateway and node topics are subscribed again"""
+    assert subscribed(broker) == ['zwave/_CLIENTS/#']
+    broker.start_gateway()
+    assert 'zwave/+/status' in subscribed(broker)
+    broker.receive({'Verb': 'CONNACK', 'Description': 'Connection Accepted', 'Status': 0})
+    assert sorted(subscribed(broker)) == sorted([
+        GATEWAY + '/api/sendCommand', GATEWAY + '/api/writeMulticast',
+        SOUNDSWITCH_WILDCARD, 'zwave/+/status'
+    ])
@@ -0,0 +1,133 @@
+# -*- coding: UTF-8 -*-
+"""Tones catalogue cache"""
+
+# standard libs
+import json
+import os
+from typing import Any, Dict
+
+# plugin libs
+import Domoticz
+from app.zwave.soundswitch import NodeState, SoundSwitchToneValues
+from app.zwave.tones_cache import ToneCatalogueCache
+from conftest import Broker, discover, identify
+from domoticz.responses import OnDeviceRemovedResponse
+
+KEY = '0371-0003-00a4-1.6'
+
+
+def new_cache(home: str) -> ToneCatalogueCache:
+    """a started cache"""
+    cache = ToneCatalogueCache()
+    cache.on_start({'HomeFolder': home})
+    return cache
+
+
+def tones(count: int) -> Dict[int, SoundSwitchToneValues]:
+    """`count` discovered tones"""
+    return {
+        tone_id: SoundSwitchToneValues(f'Tone{tone_id}', tone_id, tone_id)
+        for tone_id in range(1, count + 1)
+    }
+
+
+def test_round_trip(tmp_path: Any) -> None:
+    """a complete catalogue is served after a restart"""
+    new_cache(str(tmp_path)).put(KEY, tones(3), 3)
+    assert new_cache(str(tmp_path)).get(KEY) == tones(3)
+
+
+def test_incomplete_catalogue_not_stored(tmp_path: Any) -> None:
+    """the last tone is missing: not cached"""
+    cache = new_cache(str(tmp_path))
+    cache.put(KEY, tones(2), 3)
+    assert cache.get(KEY) is None
+
+
+def test_version_1_ignored(tmp_path: Any) -> None:
+    """version 1 catalogues may be truncated: never served"""
+    with open(os.path.join(tmp_path, ToneCatalogueCache.FILE_NAME), 'w', encoding='utf-8') as file:
+        json.dump({'version': 1, 'catalogues': {KEY: [[1, 'Tone1', 1]]}}, file)
+    assert new_cache(str(tmp_path)).get(KEY) is None
+
+
+def test_incomplete_entry_dropped(tmp_path: Any) -> None:
+    """an entry without all its tones is a miss, and is removed"""
+    with open(os.path.join(tmp_path, ToneCatalogueCache.FILE_NAME), 'w', encoding='utf-8') as file:
+        json.dump({'version': 2, 'catalogues': {
+            KEY: {'count': 3, 'tones': [[1, 'Tone1', 1], [2, 'Tone2', 2]]}
+        }}, file)
+    assert new_cache(str(tmp_path)).get(KEY) is None
+    with open(os.path.join(tmp_path, ToneCatalogueCache.FILE_NAME), encoding='utf-8') as file:
+        assert json.load(file)['catalogues'] == {}
+
+
+def test_deleted_tone_device_rebuilds_the_catalogue(broker: Broker) -> None:
+    """the node is discovered again and its selector recreated with the new tones"""
+    broker.start_gateway()
+    identify(broker)
+    discover(broker, 3)
+    cur_node = broker.app2._soundswitches.get_node(2)  # pylint:disable=protected-access
+    assert cur_node.state is NodeState.COMPLETE
+
+    selector = next(
+        device for device in Domoticz.DEVICES.values() if device.DeviceID == '2_1_toneId'
+    )
+    del Domoticz.DEVICES[selector.Unit]
+    broker.app2.on_device_removed(OnDeviceRemovedResponse(selector.Unit))
+    assert cur_node.state is NodeState.DISCOVERING
+    discover(broker, 4, prefix='New')
+
+    assert cur_node.state is NodeState.COMPLETE
+    assert cur_node.tones_count == 4
+    selector = next(
+        device for device in Domoticz.DEVICES.values() if device.DeviceID == '2_1_toneId'
+    )
+    assert selector.Options['LevelNames'].split('|') == [
+        'Off', 'New1 (1s)', 'New2 (1s)', 'New3 (1s)', 'New4 (1s)', 'Default'
+    ]
+
+
+def test_instances_merge_their_catalogues(tmp_path: Any) -> None:
+    """two hardware instances store their catalogues in the same file"""
+    first, second = new_cache(str(tmp_path)), new_cache(str(tmp_path))
+    first.put(KEY, tones(3), 3)
+    second.put('0371-0003-00a4-2.0', tones(4), 4)
+    third = new_cache(str(tmp_path))
+    assert third.get(KEY) == tones(3)
+    assert third.get('0371-0003-00a4-2.0') == tones(4)
+    # stored by `first` after the start of `second`: re-read on the miss
+    assert second.get(KEY) == tones(3)
+
+
+def test_claimed_model(tmp_path: Any, monkeypatch: Any) -> None:
+    """one instance discovers a model, the others wait for it"""
+    first, second = new_cache(str(tmp_path)), new_cache(str(tmp_path))
+    assert first.claim(KEY)
+    assert not second.claim(KEY)
+    monkeypatch.setattr(ToneCatalogueCache, 'CLAIM_TIMEOUT', -1.0)
+    assert second.claim(KEY)  # expired
+    monkeypatch.undo()
+    first.put(KEY, tones(3), 3)
+    assert not second.claim(KEY)  # stored meanwhile
+    assert second.get(KEY) == tones(3)
+
+
+def test_model_discovered_by_another_instance(broker: Broker, tmp_path: Any) -> None:
+    """the node waits for the catalogue of the instance discovering its model"""
+    other = new_cache(str(tmp_path))
+    assert other.claim(KEY)
+    broker.start_gateway()
+    identify(broker)
+    assert not broker.commands()
+    cur_node = broker.app2._soundswitches.get_node(2)  # pylint:disable=protected-access
+    assert cur_node.state is NodeState.IDENTIFYING
+
+    other.put(KEY, tones(3), 3)
+    cur_node.identification_time = 0.0  # the identification timeout is over
+    broker.app2.on_heartbeat()
+    assert not broker.commands()
+    assert cur_node.state is NodeState.COMPLETE
+    assert [tone.name for tone_id, tone in cur_node.tones.items() if 0 < tone_id < 255] == [
+        'Tone1', 'Tone2', 'Tone3'
+    ]